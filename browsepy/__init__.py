@@ -4,23 +4,39 @@
 import logging
 import os
 import os.path
+import re
+import glob
 import json
+import time
 import base64
+import datetime
 
 from flask import Response, request, render_template, redirect, \
-    url_for, send_from_directory, stream_with_context, \
+    url_for, stream_with_context, \
     make_response, g
 from flask_httpauth import HTTPBasicAuth
 import os
 
-from werkzeug.exceptions import NotFound
+from werkzeug.exceptions import NotFound, BadRequest
 
 from .appconfig import Flask
 from .manager import PluginManager
-from .file import Node, secure_filename
+from .logindex import LogIndex
+from .listing import ListingCache
+from .archivecache import ArchiveCache
+from .follow import FollowManager, parse_event_id
+from .nameindex import FilenameIndex
+from .file import Node, Directory, secure_filename, abspath_to_urlpath
+from .stream import WalkFilter, archive_formats
+from .health import iter_health, iter_json, iter_csv
+from .compress import decompress_errors
+from .textview import iter_file, read_tail
+from .grep import Matcher, GrepSearch, iter_text as iter_grep_text, \
+    iter_json as iter_grep_json
 from .exceptions import OutsideRemovableBase, OutsideDirectoryBase, \
     InvalidFilenameError, InvalidPathError
 from . import compat
+from . import sorting
 from . import __meta__ as meta
 
 __app__ = meta.app  # noqa
@@ -43,6 +59,18 @@ app.config.update(
     directory_remove=None,
     directory_upload=None,
     directory_tar_buffsize=262144,
+    file_serve_buffsize=262144,
+    text_view_buffsize=65536,
+    text_view_max_bytes=1024 * 1024,
+    tail_interval=1,
+    tail_heartbeat=15,
+    tail_buffer_bytes=1024 * 1024,
+    directory_tar_workers=0,
+    directory_archive_level=None,
+    archive_cache_dir=None,
+    archive_cache_bytes=1024 * 1024 * 1024,
+    archive_cache_min_age=60,
+    archive_cache_max_entries=50000,
     directory_downloadable=True,
     use_binary_multiples=True,
     plugin_modules=[],
@@ -52,6 +80,25 @@ app.config.update(
         '',
     ),
     exclude_fnc=None,
+    log_index_ttl=30,
+    log_index_size=65536,
+    log_rules=None,
+    health_workers=8,
+    grep_workers=4,
+    grep_timeout=30,
+    grep_cpu_time=30,
+    grep_max_matches=10000,
+    grep_buffsize=1024 * 1024,
+    filename_index_ttl=300,
+    filename_index_wait=10,
+    search_max_results=1000,
+    listing_cache_size=256,
+    listing_cache_bytes=32 * 1024 * 1024,
+    listing_cache_ttl=30,
+    browse_page_size=1000,
+    mimetype_file_command=False,
+    mimetype_cache_size=65536,
+    mimetype_cache_dir=None,
 )
 app.jinja_env.add_extension('browsepy.transform.htmlcompress.HTMLCompress')
 auth = HTTPBasicAuth()
@@ -61,6 +108,11 @@ if 'BROWSEPY_SETTINGS' in os.environ:
     app.config.from_envvar('BROWSEPY_SETTINGS')
 
 plugin_manager = PluginManager(app)
+log_index = LogIndex(app)
+listing_cache = ListingCache(app)
+archive_cache = ArchiveCache(app)
+follow_manager = FollowManager(app)
+filename_index = FilenameIndex(app)
 
 
 users = {
@@ -111,41 +163,202 @@ def browse_sortkey_reverse(prop):
     * If *name* is given, link widget lowercase text will be used istead.
     * If *size* is given, bytesize will be used.
 
+    Nodes with scan snapshots (as listed by
+    :meth:`browsepy.file.Directory.listdir`) are sorted by precomputed raw
+    values instead, see :func:`browsepy.sorting.snapshot_keyfunc`.
+
     :param prop: file attribute name
     :returns: tuple with sorting gunction and reverse bool
     :rtype: tuple of a dict and a bool
     '''
-    if prop.startswith('-'):
-        prop = prop[1:]
-        reverse = True
-    else:
-        reverse = False
+    prop, reverse = sorting.parse_property(prop)
+    keyfunc = sorting.snapshot_keyfunc(prop, app.extensions['plugin_manager'])
 
     if prop == 'text':
+        def fallback(x):
+            return x.link.text.lower() if x.link and x.link.text else x.name
+    elif prop == 'size':
+        def fallback(x):
+            return x.stats.st_size
+    else:
+        def fallback(x):
+            return getattr(x, prop, None)
+
+    if keyfunc:
         return (
             lambda x: (
                 x.is_directory == reverse,
-                x.link.text.lower() if x.link and x.link.text else x.name
-            ),
-            reverse
-        )
-    if prop == 'size':
-        return (
-            lambda x: (
-                x.is_directory == reverse,
-                x.stats.st_size
+                keyfunc(x.snapshot) if x.snapshot else fallback(x)
             ),
             reverse
         )
     return (
         lambda x: (
             x.is_directory == reverse,
-            getattr(x, prop, None)
+            fallback(x)
         ),
         reverse
     )
 
 
+def browse_snapshot_sortkey_reverse(prop, directory):
+    '''
+    Get sorting function for directory entry snapshots (see
+    :meth:`browsepy.file.Directory.snapshots`), consistent with
+    :func:`browse_sortkey_reverse`, so only rendered entries need to be
+    materialized as nodes.
+
+    Raw values are computed from snapshots (see
+    :func:`browsepy.sorting.snapshot_keyfunc`), while any other attribute
+    is taken from a temporary node.
+
+    :param prop: file attribute name
+    :type prop: str
+    :param directory: directory being listed
+    :type directory: browsepy.file.Directory
+    :returns: tuple with sorting function and reverse bool
+    :rtype: tuple of a callable and a bool
+    '''
+    prop, reverse = sorting.parse_property(prop)
+    keyfunc = sorting.snapshot_keyfunc(
+        prop, directory.plugin_manager, directory.snapshots())
+    if keyfunc is None:
+        def keyfunc(x):
+            return getattr(directory.snapshot_node(x), prop, None)
+    return (
+        lambda x: (x.is_dir == reverse, keyfunc(x)),
+        reverse
+    )
+
+
+def get_browse_window(total, default_limit):
+    '''
+    Get listing window for current request, based on either `page` or
+    `offset` and `limit` query parameters, with limit defaulting to given
+    one (falsy meaning unlimited).
+
+    :param total: total number of entries
+    :type total: int
+    :param default_limit: default page size
+    :type default_limit: int or None
+    :returns: tuple with page number (starting with 1), page count, offset
+              and limit (or None if unlimited)
+    :rtype: tuple of int, int, int and int or None
+    '''
+    limit = request.args.get('limit', default_limit, type=int)
+    if not limit or limit < 0:
+        return 1, 1, 0, None
+    pages = max((total + limit - 1) // limit, 1)
+    if 'offset' in request.args:
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        page = offset // limit + 1
+    else:
+        page = min(max(request.args.get('page', 1, type=int), 1), pages)
+        offset = (page - 1) * limit
+    return page, pages, offset, limit
+
+
+timestamp_formats = (
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M',
+    '%Y-%m-%d',
+    '%Y%m%d',
+    )
+
+
+def parse_timestamp(value, formats=timestamp_formats):
+    '''
+    Parse timestamp from either epoch seconds or local date and time.
+
+    :param value: timestamp, date or date and time
+    :type value: str
+    :param formats: accepted :func:`datetime.datetime.strptime` formats
+    :type formats: iterable of str
+    :returns: epoch timestamp
+    :rtype: float
+    :raises ValueError: if value cannot be parsed
+    '''
+    for date_format in formats:
+        try:
+            dt = datetime.datetime.strptime(value, date_format)
+            return time.mktime(dt.timetuple())
+        except ValueError:
+            pass
+    return float(value)
+
+
+def get_walk_filter():
+    '''
+    Get archive member selection for current request, based on `include`
+    (glob, can be repeated), `since` and `until` (modification time range,
+    see :func:`parse_timestamp`) and `depth` query parameters.
+
+    :returns: walk filter
+    :rtype: browsepy.stream.WalkFilter
+    :raises ValueError: on invalid parameters
+    '''
+    args = request.args
+    depth = args.get('depth')
+    return WalkFilter(
+        include=[pattern for pattern in args.getlist('include') if pattern],
+        since=parse_timestamp(args['since']) if args.get('since') else None,
+        until=parse_timestamp(args['until']) if args.get('until') else None,
+        max_depth=max(int(depth), 0) if depth else None,
+        )
+
+
+def get_text_window(max_bytes):
+    '''
+    Get text view selection for current request, based on either `lines`
+    (number of last lines) or `offset` (negative meaning from the end) and
+    `length` (bytes) query parameters, the window being limited to
+    max_bytes.
+
+    :param max_bytes: maximum window size
+    :type max_bytes: int
+    :returns: number of lines (or None), byte offset and length (or None)
+    :rtype: tuple
+    :raises ValueError: on invalid parameters
+    '''
+    args = request.args
+    lines, offset, length = (
+        int(args[name]) if args.get(name) else None
+        for name in ('lines', 'offset', 'length')
+        )
+    if lines is not None:
+        if lines < 1 or offset is not None or length is not None:
+            raise ValueError('lines cannot be combined with byte window')
+        return lines, 0, None
+    if offset is None and length is None:
+        return None, 0, None
+    if length is not None and length < 0:
+        raise ValueError('length cannot be negative')
+    return (
+        None,
+        max(offset or 0, -max_bytes),
+        max_bytes if length is None else min(length, max_bytes),
+        )
+
+
+def get_tail_position():
+    '''
+    Get live tail starting position for current request, based on either
+    `Last-Event-ID` header (sent by reconnecting clients) or `offset`
+    query parameter (negative meaning from the end).
+
+    :returns: byte offset (or None, meaning file end) and file inode (or
+              None, meaning current one)
+    :rtype: tuple
+    :raises ValueError: on invalid parameters
+    '''
+    last_event_id = request.headers.get('Last-Event-ID')
+    if last_event_id:
+        inode, offset = parse_event_id(last_event_id)
+        return offset, inode
+    offset = request.args.get('offset')
+    return (int(offset) if offset else None), None
+
+
 def stream_template(template_name, **context):
     '''
     Some templates can be huge, this function returns an streaming response,
@@ -204,17 +417,26 @@ def sort(property, path):
 @auth.login_required
 def browse(path):
     sort_property = get_cookie_browse_sorting(path, 'text')
-    sort_fnc, sort_reverse = browse_sortkey_reverse(sort_property)
 
     try:
         directory = Node.from_urlpath(path)
         if directory.is_directory and not directory.is_excluded:
+            sort_fnc, sort_reverse = browse_snapshot_sortkey_reverse(
+                sort_property, directory)
+            page, pages, offset, limit = get_browse_window(
+                directory.entries_count,
+                app.config['browse_page_size']
+                )
             return stream_template(
                 'browse.html',
                 file=directory,
                 sort_property=sort_property,
                 sort_fnc=sort_fnc,
-                sort_reverse=sort_reverse
+                sort_reverse=sort_reverse,
+                page=page,
+                pages=pages,
+                offset=offset,
+                limit=limit,
             )
     except OutsideDirectoryBase:
         pass
@@ -227,7 +449,62 @@ def open_file(path):
     try:
         file = Node.from_urlpath(path)
         if file.is_file and not file.is_excluded:
-            return send_from_directory(file.parent.path, file.name)
+            return file.serve()
+    except OutsideDirectoryBase:
+        pass
+    return NotFound()
+
+
+@app.route('/text/<path:path>', endpoint='text')
+@auth.login_required
+def view_text(path):
+    buffsize = app.config['text_view_buffsize']
+    max_bytes = app.config['text_view_max_bytes']
+    try:
+        lines, offset, length = get_text_window(max_bytes)
+    except ValueError:
+        return BadRequest()
+    try:
+        file = Node.from_urlpath(path)
+        if file.is_file and not file.is_excluded:
+            try:
+                body = (
+                    read_tail(file.path, lines, buffsize, max_bytes)
+                    if lines else
+                    iter_file(file.path, offset, length, buffsize)
+                    )
+            except decompress_errors as e:
+                logger.debug('Cannot read %s: %s', file.path, e)
+                return NotFound()
+            return Response(
+                body,
+                mimetype='text/plain',
+                headers={'X-Content-Type-Options': 'nosniff'},
+                )
+    except OutsideDirectoryBase:
+        pass
+    return NotFound()
+
+
+@app.route('/tail/<path:path>', endpoint='tail')
+@auth.login_required
+def tail_file(path):
+    try:
+        offset, inode = get_tail_position()
+    except ValueError:
+        return BadRequest()
+    try:
+        file = Node.from_urlpath(path)
+        if file.is_file and not file.is_excluded:
+            return Response(
+                follow_manager.subscribe(file.path, offset, inode),
+                mimetype='text/event-stream',
+                headers={
+                    'Cache-Control': 'no-cache',
+                    'X-Accel-Buffering': 'no',
+                    },
+                direct_passthrough=True,
+                )
     except OutsideDirectoryBase:
         pass
     return NotFound()
@@ -245,16 +522,231 @@ def download_file(path):
     return NotFound()
 
 
-@app.route("/download/directory/<path:path>.tgz")
+@app.route(
+    "/download/directory/<path:path>.tgz", defaults={'extension': 'tgz'})
+@app.route("/download/directory/<path:path>.<any(%s):extension>" % ', '.join(
+    extension for extension in archive_formats if extension != 'tgz'))
 @auth.login_required
-def download_directory(path):
+def download_directory(path, extension='tgz'):
     try:
         directory = Node.from_urlpath(path)
-        if directory.is_directory and not directory.is_excluded:
-            return directory.download()
     except OutsideDirectoryBase:
-        pass
-    return NotFound()
+        return NotFound()
+    if not directory.is_directory or directory.is_excluded:
+        return NotFound()
+    extension = request.args.get('format', extension)
+    if extension not in archive_formats:
+        return NotFound()
+    try:
+        walk_filter = get_walk_filter()
+    except ValueError:
+        return BadRequest()
+    return directory.download(
+        extension,
+        request.args.get('level', type=int),
+        request.environ,
+        walk_filter,
+        )
+
+
+def is_available(node):
+    '''
+    Get whether given node is neither excluded nor inside an excluded
+    directory.
+
+    :param node: node
+    :type node: browsepy.file.Node
+    :rtype: bool
+    '''
+    return not any(
+        item.is_excluded
+        for item in [node] + node.ancestors
+        )
+
+
+def get_batch_directories():
+    '''
+    Get directories to archive for current request, based on `path` (url
+    path, can be repeated) and `glob` (pattern relative to directory base,
+    can be repeated) query parameters.
+
+    Explicit paths must point to existing directories which are neither
+    excluded nor inside an excluded one, while glob matches which are not
+    are just ignored.
+
+    :returns: directory nodes
+    :rtype: list of browsepy.file.Directory
+    :raises OutsideDirectoryBase: if any explicit path is not valid
+    '''
+    def available(directory):
+        return directory.is_directory and is_available(directory)
+
+    base = app.config['directory_base']
+    directories = []
+    for path in request.args.getlist('path'):
+        directory = Node.from_urlpath(path)
+        if not available(directory):
+            raise OutsideDirectoryBase('%r is not available' % path)
+        directories.append(directory)
+    for pattern in request.args.getlist('glob'):
+        if not pattern or '..' in pattern.split('/'):
+            continue
+        for match in sorted(glob.glob(os.path.join(base, pattern))):
+            try:
+                directory = Node.from_urlpath(abspath_to_urlpath(match, base))
+            except OutsideDirectoryBase:
+                continue
+            if available(directory):
+                directories.append(directory)
+    return directories
+
+
+@app.route('/download/batch.tgz', defaults={'extension': 'tgz'})
+@app.route('/download/batch.<any(%s):extension>' % ', '.join(
+    extension for extension in archive_formats if extension != 'tgz'))
+@auth.login_required
+def download_batch(extension):
+    if not app.config['directory_downloadable']:
+        return NotFound()
+    extension = request.args.get('format', extension)
+    if extension not in archive_formats:
+        return NotFound()
+    try:
+        walk_filter = get_walk_filter()
+    except ValueError:
+        return BadRequest()
+    try:
+        directories = get_batch_directories()
+    except OutsideDirectoryBase:
+        return NotFound()
+    if not directories:
+        return NotFound()
+    return Directory.download_many(
+        directories,
+        extension,
+        request.args.get('level', type=int),
+        request.environ,
+        walk_filter,
+        )
+
+
+@app.route('/health', defaults={'extension': 'json'})
+@app.route('/health.<any(json, csv):extension>')
+@auth.login_required
+def health_report(extension):
+    base = app.config['directory_base']
+    failing = request.args.get('failing', '').lower() in compat.TRUE_VALUES
+    results = iter_health(
+        base, app,
+        workers=app.config['health_workers'],
+        failing=failing
+        )
+    if extension == 'csv':
+        names = [
+            rule.name
+            for rule in app.extensions['plugin_manager'].get_log_rules()
+            ]
+        return Response(
+            stream_with_context(iter_csv(results, names)),
+            mimetype='text/csv'
+            )
+    return Response(
+        stream_with_context(iter_json(results)),
+        mimetype='application/json'
+        )
+
+
+def get_grep_matcher():
+    '''
+    Get line matcher for current request, based on `pattern` (regular
+    expression, or literal if `literal` is true) and `ignore_case` query
+    parameters.
+
+    :returns: line matcher
+    :rtype: browsepy.grep.Matcher
+    :raises ValueError: on missing or invalid pattern
+    '''
+    args = request.args
+    pattern = args.get('pattern')
+    if not pattern:
+        raise ValueError('pattern is required')
+    try:
+        return Matcher(
+            pattern,
+            literal=args.get('literal', '').lower() in compat.TRUE_VALUES,
+            ignore_case=(
+                args.get('ignore_case', '').lower() in compat.TRUE_VALUES),
+            )
+    except re.error as e:
+        raise ValueError('invalid pattern: %s' % e)
+
+
+@app.route('/grep', defaults={'path': '', 'extension': 'txt'})
+@app.route('/grep/<path:path>', defaults={'extension': 'txt'})
+@app.route('/grep.<any(txt, json):extension>', defaults={'path': ''})
+@app.route('/grep.<any(txt, json):extension>/<path:path>')
+@auth.login_required
+def grep_files(path, extension):
+    try:
+        matcher = get_grep_matcher()
+        walk_filter = get_walk_filter()
+    except ValueError:
+        return BadRequest()
+    try:
+        node = Node.from_urlpath(path)
+    except OutsideDirectoryBase:
+        return NotFound()
+    if not (node.is_directory or node.is_file) or not is_available(node):
+        return NotFound()
+    base = app.config['directory_base']
+    search = GrepSearch(
+        node.path,
+        matcher,
+        base=base,
+        exclude=app.config['exclude_fnc'],
+        walk_filter=walk_filter,
+        workers=app.config['grep_workers'],
+        timeout=app.config['grep_timeout'],
+        cpu_time=app.config['grep_cpu_time'],
+        max_matches=app.config['grep_max_matches'],
+        buffsize=app.config['grep_buffsize'],
+        )
+    if extension == 'json':
+        return Response(
+            stream_with_context(iter_grep_json(search, base)),
+            mimetype='application/json'
+            )
+    return Response(
+        stream_with_context(iter_grep_text(search, base)),
+        mimetype='text/plain',
+        headers={'X-Content-Type-Options': 'nosniff'},
+        )
+
+
+@app.route('/search', endpoint='search')
+@auth.login_required
+def search_files():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return BadRequest()
+    limit = app.config['search_max_results']
+    results = filename_index.search(
+        query,
+        limit + 1,
+        app.config['filename_index_wait'],
+        )
+    return Response(
+        json.dumps({
+            'query': query,
+            'complete': filename_index.ready,
+            'truncated': len(results) > limit,
+            'results': [
+                {'path': path, 'directory': is_dir}
+                for path, is_dir in results[:limit]
+                ],
+            }),
+        mimetype='application/json'
+        )
 
 
 @app.route("/remove/<path:path>", methods=("GET", "POST"))
@@ -272,6 +764,8 @@ def remove(path):
         return render_template('remove.html', file=file)
 
     file.remove()
+    listing_cache.invalidate(file.path)
+    listing_cache.invalidate(file.parent.path)
     return redirect(url_for(".browse", path=file.parent.urlpath))
 
 
@@ -303,6 +797,7 @@ def upload(path):
                     path=directory.path,
                     filename=f.filename
                 )
+    listing_cache.invalidate(directory.path)
     return redirect(url_for(".browse", path=directory.urlpath))
 
 
@@ -0,0 +1,465 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import os.path
+import time
+import stat
+import hashlib
+import logging
+import threading
+
+from . import compat
+
+logger = logging.getLogger(__name__)
+
+
+def stat_signature(stats):
+    '''
+    Get signature of given stat result, made of its modification time in
+    nanoseconds, inode, size and mode.
+
+    :param stats: stat result
+    :type stats: os.stat_result
+    :rtype: bytes
+    '''
+    mtime_ns = getattr(stats, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(stats.st_mtime * 1e9)
+    return ('%d:%d:%d:%o' % (
+        mtime_ns, stats.st_ino, stats.st_size, stats.st_mode
+        )).encode('ascii')
+
+
+def tree_signature(path, exclude=None, max_entries=None,
+                   follow_symlinks=False):
+    '''
+    Get recursive signature of given directory, made of the relative path,
+    modification time in nanoseconds, inode and size of every entry not
+    excluded, along with the newest modification time found.
+
+    Symlinks are never descended into. Their targets are only part of the
+    signature when `follow_symlinks` is true, for archive formats storing
+    them instead of the symlinks themselves.
+
+    :param path: directory path
+    :type path: str
+    :param exclude: path filter function, defaults to None
+    :type exclude: callable or None
+    :param max_entries: maximum number of entries to walk, defaults to None
+                        (no limit)
+    :type max_entries: int or None
+    :param follow_symlinks: whether symlink targets are signed too,
+                            defaults to False
+    :type follow_symlinks: bool
+    :returns: hex digest and newest modification time, in seconds, or None
+              if there are more than max_entries entries
+    :rtype: tuple of str and float, or None
+    :raises OSError: if directory cannot be scanned
+    '''
+    digest = hashlib.sha1()
+    stats = os.stat(path)
+    newest = stats.st_mtime
+    pending = [(path, '')]
+    walked = 0
+    while pending:
+        dirpath, relpath = pending.pop()
+        entries = sorted(
+            compat.scandir(dirpath),
+            key=lambda entry: entry.name
+            )
+        walked += len(entries)
+        if max_entries is not None and walked > max_entries:
+            return None
+        for entry in entries:
+            if exclude and exclude(entry.path):
+                continue
+            try:
+                stats = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            name = relpath + entry.name
+            digest.update(compat.fsencode(name))
+            digest.update(b'\0' + stat_signature(stats) + b'\0')
+            newest = max(newest, stats.st_mtime)
+            if follow_symlinks and stat.S_ISLNK(stats.st_mode):
+                try:
+                    stats = entry.stat()
+                except OSError:  # broken symlink
+                    continue
+                digest.update(b'>' + stat_signature(stats) + b'\0')
+                newest = max(newest, stats.st_mtime)
+            elif stat.S_ISDIR(stats.st_mode):
+                pending.append((entry.path, name + '/'))
+    return digest.hexdigest(), newest
+
+
+class ArchiveBuild(object):
+    '''
+    Archive being written to a cache temporary file on a thread, whose
+    progress can be waited for by any number of readers.
+    '''
+    condition_class = threading.Condition
+
+    def __init__(self, path, target):
+        '''
+        :param path: temporary file path
+        :type path: str
+        :param target: cache file path, archive is renamed to once finished
+        :type target: str
+        '''
+        self.path = path
+        self.target = target
+        self.size = 0
+        self.finished = False
+        self.error = None
+        self.condition = self.condition_class()
+
+    def open(self):
+        '''
+        Open archive file for reading, either the temporary one while
+        building or the cache one once finished.
+
+        :returns: file object
+        :rtype: file
+        :raises IOError: if build failed or cache file got evicted
+        '''
+        with self.condition:
+            if self.error is not None:
+                raise IOError('Archive build failed: %s' % self.error)
+            return open(self.target if self.finished else self.path, 'rb')
+
+    def wait(self, offset):
+        '''
+        Wait until archive grows beyond given offset or gets finished.
+
+        :param offset: number of bytes already read
+        :type offset: int
+        :returns: True if there is more data to read, False otherwise
+        :rtype: bool
+        :raises IOError: if build failed
+        '''
+        with self.condition:
+            while not self.finished and self.size <= offset:
+                self.condition.wait()
+            if self.error is not None:
+                raise IOError('Archive build failed: %s' % self.error)
+            return self.size > offset
+
+    def progress(self, size):
+        '''
+        Account written bytes, waking up readers.
+
+        :param size: number of bytes written
+        :type size: int
+        '''
+        with self.condition:
+            self.size += size
+            self.condition.notify_all()
+
+    def finish(self, error=None):
+        '''
+        Mark build as finished, renaming temporary file to its cache path
+        on success, removing it otherwise.
+
+        :param error: build error, if any
+        :type error: Exception or None
+        '''
+        with self.condition:
+            try:
+                if error is None:
+                    os.rename(self.path, self.target)
+                else:
+                    os.remove(self.path)
+            except OSError as e:
+                error = error or e
+            self.error = error
+            self.finished = True
+            self.condition.notify_all()
+
+
+class ArchiveBuildReader(object):
+    '''
+    WSGI iterable following an :class:`ArchiveBuild` as it gets written,
+    so clients can be served while archive is still being generated.
+
+    Closing this object (ie. on client disconnection) does not affect
+    the build, which keeps going in background.
+    '''
+
+    def __init__(self, build, buffsize=10240):
+        '''
+        :param build: archive build
+        :type build: ArchiveBuild
+        :param buffsize: read block size on bytes, defaults to 10KiB
+        :type buffsize: int
+        :raises IOError: if archive file cannot be opened
+        '''
+        self.build = build
+        self.buffsize = buffsize
+        self._file = build.open()
+
+    def close(self):
+        '''
+        Close archive file, aborting iteration.
+        '''
+        self._file.close()
+
+    def __iter__(self):
+        '''
+        Iterate through archive data, waiting for it to be written.
+
+        :yields: data chunks
+        :ytype: bytes
+        '''
+        offset = 0
+        while not self._file.closed:
+            data = self._file.read(self.buffsize)
+            if data:
+                offset += len(data)
+                yield data
+            elif not self.build.wait(offset):
+                break
+
+
+class ArchiveCache(object):
+    '''
+    Persistent cache of directory archives, keyed by archive options and
+    directory recursive signature (see :func:`tree_signature`), so archives
+    of unchanged directories are served as files instead of being
+    compressed again.
+
+    Only directories whose entries were not modified for
+    `archive_cache_min_age` seconds are cached, and only those with up to
+    `archive_cache_max_entries` entries, as their signature is computed on
+    every download request. Archives are generated on a
+    background thread into `archive_cache_dir`, while being streamed to
+    clients requesting them meanwhile, and the least recently used ones are
+    removed when total size exceeds `archive_cache_bytes`.
+
+    This class is a Flask extension, available at
+    `app.extensions['archive_cache']` after :meth:`init_app`.
+    '''
+    lock_class = threading.Lock
+    thread_class = threading.Thread
+    build_class = ArchiveBuild
+    reader_class = ArchiveBuildReader
+    clock = staticmethod(time.time)
+    default_bytes = 1024 * 1024 * 1024
+    default_min_age = 60
+    default_max_entries = 50000
+    temp_prefix = '.tmp-'
+    stale_seconds = 3600  # orphan temporary files, see :meth:`evict`
+
+    @property
+    def config(self):
+        '''
+        App config, or an empty dict if not initialized for any app.
+        '''
+        return self.app.config if self.app else {}
+
+    @property
+    def directory(self):
+        '''
+        Cache directory, from app config.
+        '''
+        return self.config.get('archive_cache_dir')
+
+    @property
+    def enabled(self):
+        '''
+        Whether archives are being cached, based on app config.
+        '''
+        return bool(
+            self.directory and
+            self.config.get('archive_cache_bytes', self.default_bytes)
+            )
+
+    def __init__(self, app=None):
+        '''
+        :param app: optional flask application
+        :type app: flask.Flask
+        '''
+        self.app = None
+        self._lock = self.lock_class()
+        self._builds = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        '''
+        Initialize this Flask extension for given app.
+        '''
+        self.app = app
+        if not hasattr(app, 'extensions'):
+            app.extensions = {}
+        app.extensions['archive_cache'] = self
+
+    def key(self, path, extension, level=None, follow_symlinks=False):
+        '''
+        Get cache key for an archive of given directory, or None if it
+        cannot be cached (cache disabled, directory modified too recently,
+        too big or not readable).
+
+        :param path: directory path
+        :type path: str
+        :param extension: archive format
+        :type extension: str
+        :param level: compression level
+        :type level: int or None
+        :param follow_symlinks: whether archive format stores symlink
+                                targets, see :func:`tree_signature`
+        :type follow_symlinks: bool
+        :returns: cache key
+        :rtype: str or None
+        '''
+        if not self.enabled:
+            return None
+        try:
+            result = tree_signature(
+                path,
+                self.config.get('exclude_fnc'),
+                self.config.get('archive_cache_max_entries',
+                                self.default_max_entries),
+                follow_symlinks,
+                )
+        except OSError:
+            return None
+        if result is None:
+            return None
+        signature, newest = result
+        min_age = self.config.get('archive_cache_min_age',
+                                  self.default_min_age)
+        if self.clock() - newest < min_age:
+            return None
+        options = '%s\0%s\0%s\0%s' % (path, extension, level, signature)
+        digest = hashlib.sha1(compat.fsencode(options)).hexdigest()
+        return '%s.%s' % (digest, extension)
+
+    def open(self, key):
+        '''
+        Open cached archive file for given key, marking it as recently
+        used.
+
+        :param key: cache key, as returned by :meth:`key`
+        :type key: str
+        :returns: file object or None if not cached
+        :rtype: file or None
+        '''
+        path = os.path.join(self.directory, key)
+        try:
+            f = open(path, 'rb')
+        except (IOError, OSError):
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return f
+
+    def store(self, key, stream, buffsize=10240):
+        '''
+        Get WSGI iterable for given archive stream, which gets written to
+        cache on a background thread.
+
+        Concurrent requests for the same key share the same build, so the
+        given stream is closed if a build is already running.
+
+        :param key: cache key, as returned by :meth:`key`
+        :type key: str
+        :param stream: archive stream
+        :type stream: iterable
+        :param buffsize: read block size on bytes, defaults to 10KiB
+        :type buffsize: int
+        :returns: WSGI iterable or None if cache cannot be written
+        :rtype: ArchiveBuildReader or None
+        '''
+        with self._lock:
+            build = self._builds.get(key)
+            try:
+                if build is None:
+                    build = self._create(key)
+                    reader = self.reader_class(build, buffsize)
+                    self._builds[key] = build
+                    self.thread_class(
+                        target=self._build, args=(key, build, stream)
+                        ).start()
+                else:
+                    reader = self.reader_class(build, buffsize)
+                    stream.close()
+            except (IOError, OSError) as e:
+                logger.warning('Cannot write archive cache: %s', e)
+                return None
+        return reader
+
+    def _create(self, key):
+        directory = self.directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        build = self.build_class(
+            os.path.join(directory, self.temp_prefix + key),
+            os.path.join(directory, key),
+            )
+        open(build.path, 'wb').close()
+        return build
+
+    def _build(self, key, build, stream):
+        error = None
+        try:
+            with open(build.path, 'ab') as f:
+                for chunk in stream:
+                    f.write(chunk)
+                    f.flush()
+                    build.progress(len(chunk))
+        except BaseException as e:
+            logger.warning('Cannot write archive cache: %s', e)
+            error = e
+        with self._lock:
+            build.finish(error)
+            del self._builds[key]
+        self.evict()
+
+    def evict(self):
+        '''
+        Remove least recently used archives until cache size fits into
+        `archive_cache_bytes` app config, along with temporary files left
+        by interrupted builds.
+        '''
+        directory = self.directory
+        maxbytes = self.config.get('archive_cache_bytes', self.default_bytes)
+        now = self.clock()
+        entries = []
+        with self._lock:
+            building = frozenset(
+                os.path.basename(build.path)
+                for build in self._builds.values()
+                )
+        try:
+            for entry in compat.scandir(directory):
+                try:
+                    stats = entry.stat()
+                except OSError:
+                    continue
+                if not entry.name.startswith(self.temp_prefix):
+                    entries.append((stats.st_mtime, stats.st_size, entry))
+                elif entry.name not in building and \
+                        now - stats.st_mtime > self.stale_seconds:
+                    entries.append((0, stats.st_size, entry))
+        except OSError as e:
+            logger.warning('Cannot read archive cache: %s', e)
+            return
+        entries.sort(key=lambda item: item[0])
+        total = sum(
+            size
+            for mtime, size, entry in entries
+            if mtime  # stale temporary files are always removed
+            )
+        for mtime, size, entry in entries:
+            if mtime and total <= maxbytes:
+                break
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
+            if mtime:
+                total -= size
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import time
+import threading
+import collections
+
+
+class LRUCache(object):
+    '''
+    Thread-safe mapping-like cache, discarding least recently used items
+    when holding more than `maxsize` items or, if `maxbytes` is given, more
+    than `maxbytes` bytes (as given on :meth:`set`).
+
+    If `ttl` is given, items older than `ttl` seconds are discarded on
+    access.
+    '''
+    lock_class = threading.Lock
+    clock = staticmethod(time.time)
+
+    def __init__(self, maxsize=1024, maxbytes=None, ttl=None):
+        '''
+        :param maxsize: maximum number of items
+        :type maxsize: int
+        :param maxbytes: optional maximum size of all items, in bytes
+        :type maxbytes: int or None
+        :param ttl: optional item lifetime, in seconds
+        :type ttl: int, float or None
+        '''
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.bytes = 0
+        self._lock = self.lock_class()
+        self._data = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def _expired(self, created):
+        return self.ttl is not None and self.clock() - created >= self.ttl
+
+    def _evict(self):
+        while self._data and (
+          len(self._data) > self.maxsize or
+          self.maxbytes is not None and self.bytes > self.maxbytes):
+            self.bytes -= self._data.popitem(last=False)[1][1]
+
+    def get(self, key, default=None):
+        '''
+        Get cached value for key, marking it as recently used.
+
+        :param key: cache key
+        :type key: hashable
+        :param default: value returned when key is not cached
+        :type default: any
+        :returns: cached value or default
+        :rtype: any
+        '''
+        with self._lock:
+            try:
+                item = self._data.pop(key)
+            except KeyError:
+                return default
+            if self._expired(item[2]):
+                self.bytes -= item[1]
+                return default
+            self._data[key] = item
+            return item[0]
+
+    def set(self, key, value, size=0):
+        '''
+        Cache value for key, evicting least recently used items if needed.
+
+        Values bigger than `maxbytes` are not cached.
+
+        :param key: cache key
+        :type key: hashable
+        :param value: value
+        :type value: any
+        :param size: value size in bytes, accounted against `maxbytes`
+        :type size: int
+        '''
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item:
+                self.bytes -= item[1]
+            if self.maxbytes is not None and size > self.maxbytes:
+                return
+            self._data[key] = (value, size, self.clock())
+            self.bytes += size
+            self._evict()
+
+    def items(self):
+        '''
+        Get cached key and value pairs, from least to most recently used,
+        without marking them as used.
+
+        :returns: key and value pairs
+        :rtype: list of tuple
+        '''
+        with self._lock:
+            return [
+                (key, item[0])
+                for key, item in self._data.items()
+                if not self._expired(item[2])
+                ]
+
+    def pop(self, key, default=None):
+        '''
+        Remove key from cache.
+
+        :param key: cache key
+        :type key: hashable
+        :param default: value returned when key is not cached
+        :type default: any
+        :returns: removed value or default
+        :rtype: any
+        '''
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return default
+            self.bytes -= item[1]
+            return item[0]
+
+    def clear(self):
+        '''
+        Remove all items from cache.
+        '''
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
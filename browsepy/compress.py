@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import zlib
+import time
+import struct
+import threading
+import collections
+import multiprocessing.pool
+
+try:
+    import bz2
+except ImportError:  # pragma: no cover
+    bz2 = None
+
+try:
+    import lzma
+except ImportError:  # pragma: no cover
+    lzma = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+pools_lock = threading.Lock()
+pools = {}
+
+# compression name: (default, minimum and maximum levels, compressor factory)
+compressors = {
+    'gz': (6, 0, 9, lambda level: zlib.compressobj(
+        level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)),
+    }
+if bz2:
+    compressors['bz2'] = (9, 1, 9, lambda level: bz2.BZ2Compressor(level))
+if lzma:
+    compressors['xz'] = (
+        6, 0, 9, lambda level: lzma.LZMACompressor(preset=level))
+if zstandard:
+    compressors['zst'] = (3, 1, 22, lambda level: zstandard.ZstdCompressor(
+        level=level).compressobj())
+
+# compression name: decompressor factory
+decompressors = {
+    'gz': lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+    }
+if bz2:
+    decompressors['bz2'] = bz2.BZ2Decompressor
+if lzma:
+    decompressors['xz'] = lzma.LZMADecompressor
+
+# exceptions raised when reading corrupt or mislabeled compressed data
+decompress_errors = (zlib.error, EOFError, EnvironmentError, ValueError)
+if lzma:
+    decompress_errors += (lzma.LZMAError,)
+
+
+def get_level(name, level=None):
+    '''
+    Get valid compression level for given compression name, see
+    :data:`compressors`.
+
+    :param name: compression name (gz, bz2, xz or zst)
+    :type name: str
+    :param level: desired level, defaults to None (compression default)
+    :type level: int or None
+    :returns: given level, clamped to compression's valid range, or default
+    :rtype: int
+    :raises KeyError: if compression is unknown or unavailable
+    '''
+    default, minimum, maximum, factory = compressors[name]
+    return default if level is None else max(minimum, min(level, maximum))
+
+
+def get_compressor(name, level=None):
+    '''
+    Get incremental compressor object (providing `compress` and `flush`
+    methods) for given compression name, see :data:`compressors`.
+
+    :param name: compression name (gz, bz2, xz or zst)
+    :type name: str
+    :param level: compression level, defaults to None (compression default)
+    :type level: int or None
+    :returns: compressor object
+    :raises KeyError: if compression is unknown or unavailable
+    '''
+    return compressors[name][-1](get_level(name, level))
+
+
+def iter_decompress(fileobj, name, buffsize=65536):
+    '''
+    Iterate through decompressed data of given compressed file object,
+    read in blocks, see :data:`decompressors`.
+
+    Concatenated streams (like those written by
+    :class:`ParallelGzipWriter`, or by appending to compressed logs) are
+    decompressed as a single one, while truncated ones (like files still
+    being written) yield as much data as available.
+
+    :param fileobj: compressed file object
+    :type fileobj: file
+    :param name: compression name (gz, bz2 or xz)
+    :type name: str
+    :param buffsize: read block size on bytes, defaults to 64KiB
+    :type buffsize: int
+    :yields: decompressed data chunks
+    :ytype: bytes
+    :raises KeyError: if compression is unknown or unavailable
+    :raises Exception: on read errors or corrupt data, see
+                       :data:`decompress_errors`
+    '''
+    factory = decompressors[name]
+    decompressor = factory()
+    data = fileobj.read(buffsize)
+    while data:
+        chunk = decompressor.decompress(data)
+        if chunk:
+            yield chunk
+        data = decompressor.unused_data
+        if data or getattr(decompressor, 'eof', False):
+            decompressor = factory()  # next concatenated stream
+        if not data:
+            data = fileobj.read(buffsize)
+    flush = getattr(decompressor, 'flush', None)  # only zlib has it
+    chunk = flush() if flush else None
+    if chunk:
+        yield chunk
+
+
+def get_pool(workers):
+    '''
+    Get shared thread pool of given size, created on first use.
+
+    Threads are enough as zlib releases the GIL while compressing.
+
+    :param workers: number of threads
+    :type workers: int
+    :returns: thread pool
+    :rtype: multiprocessing.pool.ThreadPool
+    '''
+    with pools_lock:
+        pool = pools.get(workers)
+        if pool is None:
+            pool = pools[workers] = multiprocessing.pool.ThreadPool(workers)
+        return pool
+
+
+def deflate_block(data, level, dictionary=None, last=False):
+    '''
+    Compress data as raw deflate block, independently from any other block
+    so it can run in parallel, ending on a byte boundary (sync flush) so
+    blocks can be concatenated.
+
+    :param data: uncompressed data
+    :type data: bytes or bytearray
+    :param level: compression level
+    :type level: int
+    :param dictionary: optional preset dictionary (previous data tail)
+    :type dictionary: bytes, bytearray or None
+    :param last: whether this is the final block of the deflate stream
+    :type last: bool
+    :returns: compressed data
+    :rtype: bytes
+    '''
+    args = (level, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL, 0)
+    try:
+        compressor = (
+            zlib.compressobj(*args, zdict=dictionary)
+            if dictionary else
+            zlib.compressobj(*args)
+            )
+    except TypeError:  # python < 3.3 lacks preset dictionaries
+        compressor = zlib.compressobj(*args)
+    return compressor.compress(data) + compressor.flush(
+        zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+        )
+
+
+class ParallelGzipWriter(object):
+    '''
+    File-like object writing a single gzip member, pigz-style: data is
+    split into fixed-size blocks which are deflated concurrently on a thread
+    pool (see :func:`deflate_block`), each one primed with the tail of the
+    previous block as dictionary, and written in order to given file object.
+
+    Memory is bounded by the number of blocks being compressed at once
+    (twice the number of workers).
+    '''
+    block_size = 131072  # 128 KiB, as pigz
+    dictionary_size = 32768  # deflate window size
+    pool_fnc = staticmethod(get_pool)
+
+    def __init__(self, fileobj, level=6, workers=4, block_size=None):
+        '''
+        :param fileobj: file-like object compressed data will be written to
+        :type fileobj: file-like object with `write` method
+        :param level: compression level, from 1 to 9
+        :type level: int
+        :param workers: number of compression threads
+        :type workers: int
+        :param block_size: uncompressed block size, defaults to 128 KiB
+        :type block_size: int or None
+        '''
+        self.fileobj = fileobj
+        self.level = level
+        self.workers = workers
+        self.block_size = block_size or self.block_size
+        self.closed = False
+        self._pool = self.pool_fnc(workers)
+        self._pending = collections.deque()
+        self._buffer = bytearray()
+        self._dictionary = None
+        self._crc = 0
+        self._size = 0
+        self.fileobj.write(
+            b'\x1f\x8b\x08\x00' +  # magic, deflate, no flags
+            struct.pack('<I', int(time.time()) & 0xffffffff) +
+            (b'\x02' if level == 9 else b'\x04' if level == 1 else b'\x00') +
+            b'\xff'  # unknown os
+            )
+
+    def _submit(self, data, last=False):
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._pending.append(self._pool.apply_async(
+            deflate_block,
+            (data, self.level, self._dictionary, last)
+            ))
+        self._dictionary = data[-self.dictionary_size:]
+        while len(self._pending) > self.workers * 2:
+            self.fileobj.write(self._pending.popleft().get())
+
+    def write(self, data):
+        '''
+        Buffer given data, submitting every full block for compression.
+
+        :param data: uncompressed data
+        :type data: bytes
+        :returns: number of bytes written
+        :rtype: int
+        '''
+        self._buffer += data
+        block_size = self.block_size
+        if len(self._buffer) >= block_size:
+            end = len(self._buffer) - len(self._buffer) % block_size
+            for start in range(0, end, block_size):
+                self._submit(self._buffer[start:start + block_size])
+            del self._buffer[:end]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        '''
+        Compress remaining data, wait for all blocks being written and write
+        gzip trailer (crc32 and size). Given file object is not closed.
+        '''
+        if self.closed:
+            return
+        self.closed = True
+        self._submit(self._buffer, last=True)
+        self._buffer = bytearray()
+        while self._pending:
+            self.fileobj.write(self._pending.popleft().get())
+        self.fileobj.write(struct.pack(
+            '<II',
+            self._crc & 0xffffffff,
+            self._size & 0xffffffff
+            ))
+
+
+class CompressorWriter(object):
+    '''
+    File-like object compressing written data, using a compressor object
+    (see :func:`get_compressor`), to given file object.
+    '''
+    def __init__(self, fileobj, compressor):
+        '''
+        :param fileobj: file-like object compressed data will be written to
+        :type fileobj: file-like object with `write` method
+        :param compressor: compressor object
+        :type compressor: object with `compress` and `flush` methods
+        '''
+        self.fileobj = fileobj
+        self.closed = False
+        self._compressor = compressor
+
+    def write(self, data):
+        '''
+        Compress given data, writing any compressor output.
+
+        :param data: uncompressed data
+        :type data: bytes
+        :returns: number of bytes written
+        :rtype: int
+        '''
+        compressed = self._compressor.compress(data)
+        if compressed:
+            self.fileobj.write(compressed)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        '''
+        Flush compressor, writing remaining output. Given file object is not
+        closed.
+        '''
+        if self.closed:
+            return
+        self.closed = True
+        compressed = self._compressor.flush()
+        if compressed:
+            self.fileobj.write(compressed)
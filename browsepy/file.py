@@ -8,16 +8,18 @@ import shutil
 import codecs
 import string
 import random
+import heapq
 import datetime
 import logging
-import time
-from datetime import timedelta
-from flask import current_app, send_from_directory
+from flask import current_app, request
 from werkzeug.utils import cached_property
+from werkzeug.wsgi import wrap_file
 
 from . import compat
+from . import scan
 from .compat import range
-from .stream import TarFileStream
+from .stream import ArchiveStream, TarFileStream, archive_formats
+from .serve import serve_file
 from .exceptions import OutsideDirectoryBase, OutsideRemovableBase, \
     PathTooLongError, FilenameTooLongError
 
@@ -63,6 +65,7 @@ class Node(object):
     re_charset = re.compile('; charset=(?P<charset>[^;]+)')
     can_download = False
     is_root = False
+    snapshot = None  # set by Directory._listdir, see browsepy.scan
 
     @cached_property
     def is_excluded(self):
@@ -84,6 +87,18 @@ class Node(object):
         '''
         return self.app.extensions['plugin_manager']
 
+    @cached_property
+    def log_index(self):
+        '''
+        Get current app's log index, if any.
+
+        :returns: log index instance or None
+        :rtype: browsepy.logindex.LogIndex or None
+        '''
+        if self.app:
+            return self.app.extensions.get('log_index')
+        return None
+
     @cached_property
     def widgets(self):
         '''
@@ -154,59 +169,94 @@ class Node(object):
         '''
         return compat.pathconf(self.path)
 
-    def has_file(self, path, perfix, include):
-        print(path, perfix, include)
-        if not os.path.isdir(path):
-            return False
-        for name in os.listdir(path):
-            print(os.path.join(path,name),name.startswith(perfix),name.find(include))
-            if name.startswith(perfix) and name.find(include) != -1:
-                return True
-        return False
+    @cached_property
+    def listing_cache(self):
+        '''
+        Get app's directory listing cache, if any.
+
+        :returns: listing cache or None
+        :rtype: browsepy.listing.ListingCache or None
+        '''
+        if self.app:
+            return self.app.extensions.get('listing_cache')
+        return None
+
+    @cached_property
+    def archive_cache(self):
+        '''
+        Get app's directory archive cache, if any.
+
+        :returns: archive cache or None
+        :rtype: browsepy.archivecache.ArchiveCache or None
+        '''
+        if self.app:
+            return self.app.extensions.get('archive_cache')
+        return None
+
+    @cached_property
+    def logs(self):
+        '''
+        Get names of log families with files inside their rule's lookback
+        window (see :func:`browsepy.scan.lookback_dates`) under this node,
+        using app's log index if available (see
+        :meth:`browsepy.logindex.LogIndex.check`).
+
+        :returns: log family names
+        :rtype: frozenset of str
+        '''
+        if self.snapshot:
+            return self.snapshot.logs
+        if self.log_index:
+            return self.log_index.check(self.path)
+        return scan.check_logs(self.path)
 
     @cached_property
     def has_http_logs(self):
-        gopath = os.path.join(self.path, "data/goprobe")
-        d = datetime.datetime.now() - timedelta(days=1)
-        date = d.strftime("%Y-%m-%d")
-        return self.has_file(gopath, "httplog_", date)
+        return 'http' in self.logs
 
     @cached_property
     def has_pppauth_logs(self):
-        gopath = os.path.join(self.path, "data/goprobe")
-        d = datetime.datetime.now() - timedelta(days=1)
-        date = d.strftime("%Y-%m-%d")
-        return  self.has_file(gopath, "pppauth_", date)
+        return 'pppauth' in self.logs
 
     @cached_property
     def has_master_logs(self):
-        vmaster = os.path.join(self.path, "vpnserver/master/server_log")
-
-        d = datetime.datetime.now() - timedelta(days=1)
-
-        date = d.strftime("%Y%m%d")
-        return self.has_file(vmaster, "vpn_", date)
+        return 'master' in self.logs
 
     @cached_property
     def has_cluster_logs(self):
-
-        vcluster = os.path.join(self.path, "vpnserver/cluster/0/server_log")
-        d = datetime.datetime.now() - timedelta(days=1)
-
-        date = d.strftime("%Y%m%d")
-        return self.has_file(vcluster, "vpn_", date)
-
+        return 'cluster' in self.logs
 
     @cached_property
     def subdirs(self):
-        if not os.path.isdir(self.path):
+        '''
+        Get names of subdirectories, based on scandir entries' cached type
+        info.
+
+        :returns: subdirectory names
+        :rtype: list of str
+        '''
+        try:
+            return [
+                entry.name
+                for entry in compat.scandir(self.path)
+                if entry.is_dir(follow_symlinks=True)
+                ]
+        except OSError:
             return []
-        chdirs = [name for name in os.listdir(self.path) if os.path.isdir(os.path.join(self.path, name))]
-        return chdirs
 
     @cached_property
     def subdirs_count(self):
-        return len(self.subdirs)
+        '''
+        Get number of subdirectories, taken from :attr:`snapshot` if
+        available, or from the application-wide count cache otherwise (see
+        :func:`browsepy.scan.count_subdirs`).
+
+        :returns: number of subdirectories
+        :rtype: int
+        '''
+        if self.snapshot:
+            return self.snapshot.subdirs
+        return scan.count_subdirs(self.path)[0]
 
     @cached_property
     def parent(self):
@@ -245,7 +295,14 @@ class Node(object):
         :rtype: str
         '''
         try:
-            dt = datetime.datetime.fromtimestamp(self.stats.st_mtime)
+            mtime = (
+                self.snapshot.mtime
+                if self.snapshot else
+                self.stats.st_mtime
+                )
+            if mtime is None:
+                return None
+            dt = datetime.datetime.fromtimestamp(mtime)
             return dt.strftime('%Y.%m.%d %H:%M:%S')
         except OSError:
             return None
@@ -459,12 +516,15 @@ class File(Node):
         :rtype: str
         '''
         try:
-            size, unit = fmt_size(
-                self.stats.st_size,
-                self.app.config['use_binary_multiples'] if self.app else False
-            )
+            size = self.snapshot.size if self.snapshot else self.stats.st_size
         except OSError:
             return None
+        if size is None:
+            return None
+        size, unit = fmt_size(
+            size,
+            self.app.config['use_binary_multiples'] if self.app else False
+            )
         if unit == binary_units[0]:
             return "%d %s" % (size, unit)
         return "%.2f %s" % (size, unit)
@@ -491,15 +551,27 @@ class File(Node):
         super(File, self).remove()
         os.unlink(self.path)
 
+    def serve(self, as_attachment=False):
+        '''
+        Get a Flask Response object serving this file for current request,
+        honoring its conditional and range headers (see
+        :func:`browsepy.serve.serve_file`).
+
+        :param as_attachment: whether file should be downloaded
+        :type as_attachment: bool
+        :returns: Response object
+        :rtype: flask.Response
+        '''
+        return serve_file(self.app, request, self.path, as_attachment)
+
     def download(self):
         '''
-        Get a Flask's send_file Response object pointing to this file.
+        Get a Flask Response object serving this file as attachment.
 
-        :returns: Response object as returned by flask's send_file
+        :returns: Response object
         :rtype: flask.Response
         '''
-        directory, name = os.path.split(self.path)
-        return send_from_directory(directory, name, as_attachment=True)
+        return self.serve(as_attachment=True)
 
 
 @Node.register_directory_class
@@ -518,6 +590,7 @@ class Directory(Node):
       will always return instances of this class.
     '''
     _listdir_cache = None
+    _snapshots_cache = None
     mimetype = 'inode/directory'
     is_file = False
     size = None
@@ -645,19 +718,33 @@ class Directory(Node):
         '''
         return self.parent and super(Directory, self).can_remove
 
+    @cached_property
+    def subdirs_count(self):
+        '''
+        Get number of subdirectories, taken from :attr:`snapshot` if
+        available, or from listed (not excluded) entries otherwise, so
+        rendering a directory does not require listing it twice.
+
+        :returns: number of subdirectories
+        :rtype: int
+        '''
+        if self.snapshot:
+            return self.snapshot.subdirs
+        return sum(1 for snapshot in self.snapshots() if snapshot.is_dir)
+
     @cached_property
     def is_empty(self):
         '''
-        Get if directory is empty (based on :meth:`_listdir`).
+        Get if directory is empty (based on :meth:`snapshots`).
 
         :returns: True if this directory has no entries, False otherwise.
         :rtype: bool
         '''
-        if self._listdir_cache is not None:
-            return not bool(self._listdir_cache)
-        for entry in self._listdir():
-            return False
-        return True
+        if self._snapshots_cache is None:
+            for entry in scandir(self.path, self.app):
+                return False
+            return True
+        return not self._snapshots_cache
 
     def remove(self):
         '''
@@ -668,21 +755,77 @@ class Directory(Node):
         super(Directory, self).remove()
         shutil.rmtree(self.path)
 
-    def download(self):
+    def download(self, extension='tgz', level=None, environ=None,
+                 walk_filter=None):
+        '''
+        Get a Flask Response object streaming an archive of this directory.
+
+        :param extension: archive format (see
+                          :data:`browsepy.stream.archive_formats`),
+                          defaults to tgz
+        :type extension: str
+        :param level: compression level, defaults to app's
+                      `directory_archive_level` config
+        :type level: int or None
+        :param environ: optional WSGI environ, so cached archives can use
+                        server's `wsgi.file_wrapper`
+        :type environ: dict or None
+        :param walk_filter: optional archive member selection, archives
+                            being cached (see :attr:`archive_cache`) only
+                            without it
+        :type walk_filter: browsepy.stream.WalkFilter or None
+        :returns: Response object
+        :rtype: flask.Response
+        :raises KeyError: if archive format is not available
         '''
-        Get a Flask Response object streaming a tarball of this directory.
+        return archive_response(
+            self.app, self.path, None, None,
+            extension, level, environ, walk_filter,
+            None if walk_filter else self.archive_cache)
 
+    @classmethod
+    def download_many(cls, directories, extension='tgz', level=None,
+                      environ=None, walk_filter=None, name='batch', app=None):
+        '''
+        Get a Flask Response object streaming a single archive containing
+        given directories, each one under its own url path, so names from
+        different directories cannot collide.
+
+        Repeated directories, or those found inside another given one, are
+        skipped as their content is already archived.
+
+        :param directories: directory nodes
+        :type directories: iterable of Directory
+        :param extension: archive format, defaults to tgz
+        :type extension: str
+        :param level: compression level, defaults to app's
+                      `directory_archive_level` config
+        :type level: int or None
+        :param environ: optional WSGI environ
+        :type environ: dict or None
+        :param walk_filter: optional archive member selection, applied to
+                            every directory
+        :type walk_filter: browsepy.stream.WalkFilter or None
+        :param name: archive name, without extension, defaults to batch
+        :type name: str
+        :param app: optional, flask application
         :returns: Response object
         :rtype: flask.Response
+        :raises KeyError: if archive format is not available
         '''
-        return self.app.response_class(
-            TarFileStream(
-                self.path,
-                self.app.config['directory_tar_buffsize'],
-                self.app.config['exclude_fnc'],
-            ),
-            mimetype="application/octet-stream"
-        )
+        app = app or current_app
+        sources = []
+        for directory in sorted(directories, key=lambda d: d.path):
+            if any(check_base(directory.path, path)
+                   for path, prefix in sources):
+                continue
+            sources.append((
+                directory.path,
+                directory.urlpath or os.path.basename(directory.path),
+                ))
+        return archive_response(
+            app, app.config['directory_base'], sources, name,
+            extension, level, environ, walk_filter)
 
     def contains(self, filename):
         '''
@@ -731,45 +874,288 @@ class Directory(Node):
 
         return new_filename
 
-    def _listdir(self, precomputed_stats=(os.name == 'nt')):
+    def _listdir(self, precomputed_stats=True):
         '''
         Iter unsorted entries on this directory.
 
+        :param precomputed_stats: ignored, kept for backwards compatibility
+        :type precomputed_stats: bool
         :yields: Directory or File instance for each entry in directory
         :ytype: Node
         '''
-        for entry in scandir(self.path, self.app):
-            kwargs = {
-                'path': entry.path,
-                'app': self.app,
-                'parent': self,
-                'is_excluded': False
-            }
-            try:
-                if precomputed_stats and not entry.is_symlink():
-                    kwargs['stats'] = entry.stat()
-                if entry.is_dir(follow_symlinks=True):
-                    yield self.directory_class(**kwargs)
-                else:
-                    yield self.file_class(**kwargs)
-            except OSError as e:
-                logger.exception(e)
+        for snapshot in self._snapshots():
+            yield self.snapshot_node(snapshot)
+
+    def _snapshots(self):
+        '''
+        Get unsorted entry snapshots from app's listing cache when available
+        (see :class:`browsepy.listing.ListingCache`), or by scanning this
+        directory otherwise.
 
-    def listdir(self, sortkey=None, reverse=False):
+        :returns: entry snapshots
+        :rtype: tuple of browsepy.scan.EntrySnapshot
         '''
-        Get sorted list (by given sortkey and reverse params) of File objects.
+        cache = self.listing_cache
+        snapshots = cache.get(self.path) if cache else None
+        if snapshots is None:
+            stats = os.stat(self.path)
+            snapshots = tuple(self._scandir())
+            if cache:
+                cache.set(self.path, snapshots, stats)
+        return snapshots
 
+    def _scandir(self):
+        '''
+        Iter snapshots of non-excluded entries on this directory.
+
+        Every entry is scanned once (see :func:`browsepy.scan.snapshot`), so
+        size, modification time, subdirectory count and log checks won't
+        need further syscalls.
+
+        :yields: entry snapshot
+        :ytype: browsepy.scan.EntrySnapshot
+        '''
+        logs_fnc = self.log_index.check if self.log_index else scan.check_logs
+        for entry in scandir(self.path, self.app):
+            yield scan.snapshot(entry, logs_fnc, self.path)
+
+    def snapshots(self, sortkey=None, reverse=False, offset=0, limit=None):
+        '''
+        Get sorted list (by given sortkey and reverse params) of compact
+        entry snapshots (see :meth:`_snapshots`), optionally windowed by
+        offset and limit (see :func:`sorted_window`).
+
+        Unlike :meth:`listdir`, no :class:`Node` is created, so this is
+        suitable for sorting big directories.
+
+        :param sortkey: optional sorting function receiving snapshots
+        :type sortkey: callable
+        :param reverse: whether sorting should be reversed
+        :type reverse: bool
+        :param offset: number of leading entries to skip
+        :type offset: int
+        :param limit: optional maximum number of entries
+        :type limit: int or None
+        :returns: sorted list of entry snapshots
+        :rtype: list of browsepy.scan.EntrySnapshot
+        '''
+        if self._snapshots_cache is None:
+            self._snapshots_cache = self._snapshots()
+        return sorted_window(
+            self._snapshots_cache, sortkey, reverse, offset, limit)
+
+    def snapshot_node(self, snapshot, **defaults):
+        '''
+        Create node for given entry snapshot of this directory.
+
+        :param snapshot: entry snapshot, as returned by :meth:`snapshots`
+        :type snapshot: browsepy.scan.EntrySnapshot
+        :param **defaults: attributes will be set to node
+        :returns: file or directory node
+        :rtype: File or Directory
+        '''
+        kwargs = {
+            'path': snapshot.path,
+            'app': self.app,
+            'parent': self,
+            'is_excluded': False,
+            'snapshot': snapshot,
+            }
+        kwargs.update(defaults)
+        if snapshot.is_dir:
+            return self.directory_class(is_directory=True, **kwargs)
+        return self.file_class(**kwargs)
+
+    def iter_listdir(self, sortkey=None, reverse=False, offset=0,
+                     limit=None):
+        '''
+        Iter nodes for sorted entry snapshots (see :meth:`snapshots`),
+        creating each one only when reached, so only rendered entries get
+        materialized and they can be released right after.
+
+        Mimetypes of all iterated files are resolved at once (see
+        :meth:`browsepy.manager.MimetypePluginManager.get_mimetypes`).
+
+        :param sortkey: optional sorting function receiving snapshots
+        :type sortkey: callable
+        :param reverse: whether sorting should be reversed
+        :type reverse: bool
+        :param offset: number of leading entries to skip
+        :type offset: int
+        :param limit: optional maximum number of entries
+        :type limit: int or None
+        :yields: Directory or File instance for each entry in directory
+        :ytype: Node
+        '''
+        snapshots = self.snapshots(sortkey, reverse, offset, limit)
+        files = [snapshot for snapshot in snapshots if not snapshot.is_dir]
+        mimetypes = dict(zip(
+            files,
+            self.plugin_manager.get_mimetypes(
+                snapshot.path for snapshot in files)
+            ))
+        for snapshot in snapshots:
+            if snapshot.is_dir:
+                yield self.snapshot_node(snapshot)
+            else:
+                yield self.snapshot_node(
+                    snapshot, mimetype=mimetypes[snapshot])
+
+    def listdir(self, sortkey=None, reverse=False, offset=0, limit=None):
+        '''
+        Get sorted list (by given sortkey and reverse params) of File objects,
+        optionally windowed by offset and limit (see :func:`sorted_window`).
+
+        :param sortkey: optional sorting function receiving nodes
+        :type sortkey: callable
+        :param reverse: whether sorting should be reversed
+        :type reverse: bool
+        :param offset: number of leading entries to skip
+        :type offset: int
+        :param limit: optional maximum number of entries
+        :type limit: int or None
         :return: sorted list of File instances
         :rtype: list of File instances
         '''
         if self._listdir_cache is None:
-            self._listdir_cache = tuple(self._listdir())
-        if sortkey:
-            return sorted(self._listdir_cache, key=sortkey, reverse=reverse)
-        data = list(self._listdir_cache)
+            self._listdir_cache = tuple(
+                map(self.snapshot_node, self.snapshots()))
+        return sorted_window(
+            self._listdir_cache, sortkey, reverse, offset, limit)
+
+    @cached_property
+    def entries_count(self):
+        '''
+        Get number of listed (not excluded) entries.
+
+        :returns: number of entries
+        :rtype: int
+        '''
+        if self._snapshots_cache is None:
+            self._snapshots_cache = self._snapshots()
+        return len(self._snapshots_cache)
+
+
+def archive_response(app, path, sources, name, extension='tgz',
+                     level=None, environ=None, walk_filter=None, cache=None):
+    '''
+    Get a Flask Response object streaming an archive of given directories,
+    honoring app's archive and exclude_fnc config.
+
+    When an archive cache is given, archive is served from cache if
+    available, or stored there while being streamed otherwise (see
+    :class:`browsepy.archivecache.ArchiveCache`).
+
+    :param app: flask application
+    :param path: directory path, naming archive if no name is given
+    :type path: str
+    :param sources: directory and archive path tuples, defaults to path
+    :type sources: iterable of tuple of str and str, or None
+    :param name: archive name without extension, defaults to path basename
+    :type name: str or None
+    :param extension: archive format (see
+                      :data:`browsepy.stream.archive_formats`)
+    :type extension: str
+    :param level: compression level, defaults to app's
+                  `directory_archive_level` config
+    :type level: int or None
+    :param environ: optional WSGI environ
+    :type environ: dict or None
+    :param walk_filter: optional archive member selection
+    :type walk_filter: browsepy.stream.WalkFilter or None
+    :param cache: optional archive cache, only for single directories
+    :type cache: browsepy.archivecache.ArchiveCache or None
+    :returns: Response object
+    :rtype: flask.Response
+    :raises KeyError: if archive format is not available
+    '''
+    config = app.config
+    archive_format = archive_formats[extension]
+    options = dict(archive_format.options)
+    options['level'] = (
+        config.get('directory_archive_level')
+        if level is None else
+        level
+        )
+    options['walk_filter'] = walk_filter
+    options['sources'] = sources
+    if issubclass(archive_format.stream_class, TarFileStream):
+        options['workers'] = config.get('directory_tar_workers', 0)
+    buffsize = config['directory_tar_buffsize']
+    environ = environ or {}
+    key = (
+        cache.key(
+            path,
+            extension,
+            options['level'],
+            archive_format.stream_class.follow_symlinks,
+            )
+        if cache and issubclass(archive_format.stream_class, ArchiveStream)
+        else None
+        )
+    cached = cache.open(key) if key else None
+    if cached:
+        body = wrap_file(environ, cached, buffsize)
+        length = os.fstat(cached.fileno()).st_size
+    else:
+        stream = archive_format.stream_class(
+            path,
+            buffsize,
+            config['exclude_fnc'],
+            **options
+            )
+        body = cache.store(key, stream, buffsize) if key else None
+        if body is None:
+            body = stream.wsgi_iterable(environ)
+        length = None if key else stream.length
+    response = app.response_class(
+        body,
+        mimetype=archive_format.mimetype,
+        direct_passthrough=True
+    )
+    if length is not None:
+        response.content_length = length
+    response.headers.add(
+        'Content-Disposition', 'attachment',
+        filename='%s.%s' % (name or os.path.basename(path), extension)
+        )
+    return response
+
+
+def sorted_window(items, key=None, reverse=False, offset=0, limit=None):
+    '''
+    Get a window of given items as if they were fully sorted, but only
+    sorting the first `offset + limit` ones via partial sort
+    (see :func:`heapq.nsmallest` and :func:`heapq.nlargest`), which is
+    stable and consistent with :func:`sorted`.
+
+    Without key, items are kept on their original order (or reversed).
+
+    :param items: sequence of items
+    :type items: collections.abc.Sequence
+    :param key: optional sorting function
+    :type key: callable or None
+    :param reverse: whether sorting should be reversed
+    :type reverse: bool
+    :param offset: number of leading items to skip
+    :type offset: int
+    :param limit: optional maximum number of items
+    :type limit: int or None
+    :returns: sorted items
+    :rtype: list
+    '''
+    stop = None if limit is None else offset + limit
+    if not key:
+        data = list(items)
         if reverse:
             data.reverse()
-        return data
+        return data[offset:stop]
+    if stop is None or stop >= len(items):
+        data = sorted(items, key=key, reverse=reverse)
+    else:
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        data = select(stop, items, key=key)
+    return data[offset:stop]
 
 
 def fmt_size(size, binary=True):
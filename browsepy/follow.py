@@ -0,0 +1,440 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import codecs
+import logging
+import threading
+import collections
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(data, event=None, ident=None):
+    '''
+    Format Server-Sent Event with given text data, whose line breaks are
+    sent as separate data lines, so clients get it back as it is.
+
+    :param data: event data
+    :type data: str
+    :param event: optional event name
+    :type event: str or None
+    :param ident: optional event id
+    :type ident: str or None
+    :returns: event text
+    :rtype: str
+    '''
+    lines = []
+    if event:
+        lines.append('event: %s' % event)
+    if ident:
+        lines.append('id: %s' % ident)
+    data = data.replace('\r\n', '\n').replace('\r', '\n')
+    lines.extend('data: %s' % line for line in data.split('\n'))
+    return '\n'.join(lines) + '\n\n'
+
+
+def parse_event_id(value):
+    '''
+    Parse event id, as sent by :class:`Subscription` and received back on
+    `Last-Event-ID` header by reconnecting clients.
+
+    :param value: event id
+    :type value: str
+    :returns: file inode and offset
+    :rtype: tuple of int
+    :raises ValueError: if value is not valid
+    '''
+    inode, offset = value.split(':')
+    return int(inode), int(offset)
+
+
+class Subscription(object):
+    '''
+    Single client subscription to a :class:`FileFollower`, iterable as a
+    Server-Sent Events stream.
+
+    Events are queued up to `max_bytes` of data, older data being
+    discarded (and a **skip** event sent with the number of skipped bytes)
+    when client cannot keep up. Comments are sent every `heartbeat`
+    seconds without data, so disconnected clients are noticed.
+    '''
+    condition_class = threading.Condition
+    retry = 3000  # client reconnection delay, in milliseconds
+
+    def __init__(self, follower, offset=None, inode=None, max_bytes=1048576,
+                 heartbeat=15):
+        '''
+        :param follower: file follower
+        :type follower: FileFollower
+        :param offset: starting offset, negative meaning from file end,
+                       defaults to None (current end)
+        :type offset: int or None
+        :param inode: file inode offset refers to, offset being ignored if
+                      file got rotated
+        :type inode: int or None
+        :param max_bytes: maximum data queued, in bytes
+        :type max_bytes: int
+        :param heartbeat: seconds between keep-alive comments
+        :type heartbeat: int or float
+        '''
+        self.follower = follower
+        self.offset = offset  # next offset to send, updated by follower
+        self.inode = inode
+        self.max_bytes = max_bytes
+        self.heartbeat = heartbeat
+        self.closed = False
+        self._queue = collections.deque()
+        self._queued = 0
+        self._condition = self.condition_class()
+
+    def push(self, event, ident, data=b''):
+        '''
+        Queue event, as called by follower.
+
+        :param event: event name, None for file data
+        :type event: str or None
+        :param ident: event id
+        :type ident: str
+        :param data: event data
+        :type data: bytes
+        '''
+        with self._condition:
+            if event is None and self._queued + len(data) > self.max_bytes:
+                skipped = self._queued + len(data)
+                self._queue = collections.deque(
+                    item for item in self._queue if item[0] is not None)
+                self._queue.append(('skip', ident, b'%d' % skipped))
+                self._queued = 0
+            else:
+                self._queue.append((event, ident, data))
+                if event is None:
+                    self._queued += len(data)
+            self._condition.notify_all()
+
+    def pop(self, timeout=None):
+        '''
+        Take queued events, waiting for them up to given timeout.
+
+        :param timeout: seconds to wait, defaults to None (no limit)
+        :type timeout: int, float or None
+        :returns: list of event name, id and data tuples, empty on timeout
+        :rtype: list of tuple
+        '''
+        with self._condition:
+            if not self._queue and not self.closed:
+                self._condition.wait(timeout)
+            items = list(self._queue)
+            self._queue.clear()
+            self._queued = 0
+        return items
+
+    def close(self):
+        '''
+        Close subscription, unsubscribing from follower.
+        '''
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+        self.follower.unsubscribe(self)
+
+    def __iter__(self):
+        '''
+        Iterate through Server-Sent Events.
+
+        :yields: UTF-8 encoded event text
+        :ytype: bytes
+        '''
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        try:
+            yield ('retry: %d\n\n' % self.retry).encode('utf-8')
+            while not self.closed:
+                items = self.pop(self.heartbeat)
+                if not items:
+                    yield b':\n\n'
+                for event, ident, data in items:
+                    if event is None:
+                        text = decoder.decode(data)
+                    else:
+                        decoder.reset()
+                        text = data.decode('utf-8')
+                    yield format_event(text, event, ident).encode('utf-8')
+        finally:
+            self.close()
+
+
+class FileFollower(object):
+    '''
+    Shared reader of a growing file, sending appended data to all its
+    subscriptions from a single thread and file descriptor.
+
+    File is polled every `interval` seconds. Rotation (file path pointing
+    to a different inode) and truncation are detected, sending a
+    **rotate** event and following the new file from its start, once
+    the old one is fully read.
+
+    Follower stops once it has no subscriptions left.
+    '''
+    thread_class = threading.Thread
+    condition_class = threading.Condition
+    subscription_class = Subscription
+
+    def __init__(self, path, interval=1, buffsize=65536, on_stop=None):
+        '''
+        :param path: file path
+        :type path: str
+        :param interval: seconds between file polls
+        :type interval: int or float
+        :param buffsize: read block size on bytes, defaults to 64KiB
+        :type buffsize: int
+        :param on_stop: optional function called with follower on stop
+        :type on_stop: callable or None
+        '''
+        self.path = path
+        self.interval = interval
+        self.buffsize = buffsize
+        self.on_stop = on_stop
+        self.alive = True
+        self.inode = None
+        self.offset = 0
+        self._fd = None
+        self._subscriptions = []
+        self._condition = self.condition_class()
+        self._thread = None
+
+    def subscribe(self, offset=None, inode=None, **kwargs):
+        '''
+        Create subscription, starting follower thread if needed.
+
+        :param offset: starting offset, see :class:`Subscription`
+        :type offset: int or None
+        :param inode: file inode offset refers to
+        :type inode: int or None
+        :param **kwargs: other :class:`Subscription` options
+        :returns: subscription or None if follower already stopped
+        :rtype: Subscription or None
+        '''
+        with self._condition:
+            if not self.alive:
+                return None
+            subscription = self.subscription_class(
+                self, offset, inode, **kwargs)
+            self._subscriptions.append(subscription)
+            if self._thread is None:
+                self._thread = self.thread_class(target=self.run)
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify_all()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        '''
+        Remove subscription, follower stopping if it was the last one.
+
+        :param subscription: subscription
+        :type subscription: Subscription
+        '''
+        with self._condition:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+            self._condition.notify_all()
+
+    def run(self):
+        '''
+        Poll file, sending data to subscriptions until there is none
+        left, waiting `interval` seconds between polls once they are up
+        to date or polling failed (ie. file not created yet).
+
+        As this method is blocking, it is used inside a thread, started
+        by :meth:`subscribe`.
+        '''
+        try:
+            while True:
+                with self._condition:
+                    if not self._subscriptions:
+                        self.alive = False
+                        break
+                    subscriptions = list(self._subscriptions)
+                failed = False
+                try:
+                    self.poll(subscriptions)
+                except (IOError, OSError) as e:
+                    logger.debug('Cannot follow %s: %s', self.path, e)
+                    failed = True
+                with self._condition:
+                    if self._subscriptions and (failed or all(
+                            subscription.offset == self.offset
+                            for subscription in self._subscriptions)):
+                        self._condition.wait(self.interval)
+        finally:
+            self.alive = False
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            if self.on_stop:
+                self.on_stop(self)
+
+    def _ident(self):
+        return '%d:%d' % (self.inode, self.offset)
+
+    def _open(self):
+        fd = os.open(self.path, os.O_RDONLY)
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = fd
+        self.inode = os.fstat(fd).st_ino
+        self.offset = 0
+
+    def _read(self, offset, size):
+        os.lseek(self._fd, offset, os.SEEK_SET)
+        return os.read(self._fd, size)
+
+    def poll(self, subscriptions):
+        '''
+        Send pending data to given subscriptions: data before current
+        offset to newly started ones (up to their queue size), data
+        appended since last poll to everybody, and rotation events.
+
+        :param subscriptions: subscriptions
+        :type subscriptions: list of Subscription
+        '''
+        if self._fd is None:
+            self._open()
+            self.offset = os.fstat(self._fd).st_size
+        for subscription in subscriptions:
+            self._backfill(subscription)
+        self._follow(subscriptions)
+        try:
+            stats = os.stat(self.path)
+        except OSError:  # removed, keep reading old file until replaced
+            return
+        if stats.st_ino != self.inode or stats.st_size < self.offset:
+            self._open()
+            for subscription in subscriptions:
+                subscription.offset = 0
+                subscription.push('rotate', self._ident())
+            self._follow(subscriptions)
+
+    def _backfill(self, subscription):
+        if subscription.inode is not None:
+            if subscription.inode != self.inode:
+                subscription.offset = 0
+            subscription.inode = None
+        if subscription.offset is None:
+            subscription.offset = self.offset
+        elif subscription.offset < 0:
+            subscription.offset = max(self.offset + subscription.offset, 0)
+        elif subscription.offset > self.offset:
+            subscription.offset = self.offset
+        start = max(subscription.offset, self.offset - subscription.max_bytes)
+        if start > subscription.offset:
+            subscription.push(
+                'skip',
+                '%d:%d' % (self.inode, start),
+                b'%d' % (start - subscription.offset),
+                )
+        while start < self.offset:
+            data = self._read(start, min(self.buffsize, self.offset - start))
+            if not data:
+                break
+            start += len(data)
+            subscription.push(None, '%d:%d' % (self.inode, start), data)
+        subscription.offset = self.offset
+
+    def _follow(self, subscriptions):
+        while True:
+            data = self._read(self.offset, self.buffsize)
+            if not data:
+                break
+            self.offset += len(data)
+            ident = self._ident()
+            for subscription in subscriptions:
+                subscription.push(None, ident, data)
+                subscription.offset = self.offset
+
+
+class FollowManager(object):
+    '''
+    Application-wide registry of :class:`FileFollower` instances, so all
+    subscriptions to the same file share a single follower.
+
+    Followers poll every `tail_interval` seconds, subscriptions queue up
+    to `tail_buffer_bytes` and send keep-alive comments every
+    `tail_heartbeat` seconds, based on app config.
+
+    This class is a Flask extension, available at
+    `app.extensions['follow_manager']` after :meth:`init_app`.
+    '''
+    follower_class = FileFollower
+    lock_class = threading.Lock
+    default_interval = 1
+    default_heartbeat = 15
+    default_buffer_bytes = 1048576
+    default_buffsize = 65536
+
+    @property
+    def config(self):
+        '''
+        App config, or an empty dict if not initialized for any app.
+        '''
+        return self.app.config if self.app else {}
+
+    def __init__(self, app=None):
+        '''
+        :param app: optional flask application
+        :type app: flask.Flask
+        '''
+        self.app = None
+        self.followers = {}
+        self._lock = self.lock_class()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        '''
+        Initialize this Flask extension for given app.
+        '''
+        self.app = app
+        if not hasattr(app, 'extensions'):
+            app.extensions = {}
+        app.extensions['follow_manager'] = self
+
+    def subscribe(self, path, offset=None, inode=None):
+        '''
+        Subscribe to given file, sharing its follower if any.
+
+        :param path: file path
+        :type path: str
+        :param offset: starting offset, negative meaning from file end,
+                       defaults to None (current end)
+        :type offset: int or None
+        :param inode: file inode offset refers to
+        :type inode: int or None
+        :returns: subscription
+        :rtype: Subscription
+        '''
+        config = self.config
+        options = {
+            'max_bytes': config.get(
+                'tail_buffer_bytes', self.default_buffer_bytes),
+            'heartbeat': config.get('tail_heartbeat', self.default_heartbeat),
+            }
+        with self._lock:
+            follower = self.followers.get(path)
+            subscription = follower and follower.subscribe(
+                offset, inode, **options)
+            if subscription is None:
+                follower = self.follower_class(
+                    path,
+                    config.get('tail_interval', self.default_interval),
+                    self.default_buffsize,
+                    self._stopped,
+                    )
+                self.followers[path] = follower
+                subscription = follower.subscribe(offset, inode, **options)
+        return subscription
+
+    def _stopped(self, follower):
+        with self._lock:
+            if self.followers.get(follower.path) is follower:
+                del self.followers[follower.path]
@@ -0,0 +1,594 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import os.path
+import re
+import mmap
+import json
+import time
+import logging
+import functools
+import itertools
+import collections
+import multiprocessing
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+try:
+    import concurrent.futures as futures
+    from concurrent.futures.process import BrokenProcessPool
+except ImportError:  # pragma: no cover
+    futures = None
+
+try:
+    from re import _parser as sre_parse  # python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse
+
+from . import compat
+from . import compress
+from . import textview
+from .file import abspath_to_urlpath, check_under_base
+
+logger = logging.getLogger(__name__)
+
+GrepMatch = collections.namedtuple('GrepMatch', ('path', 'line', 'text'))
+
+
+def required_literal(pattern):
+    '''
+    Get the longest literal every match of given regular expression must
+    contain, so files and lines without it can be discarded without
+    running the expression, with a plain substring search.
+
+    :param pattern: regular expression
+    :type pattern: bytes
+    :returns: literal or None
+    :rtype: bytes or None
+    '''
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, TypeError, ValueError):
+        return None
+    best = current = bytearray()
+    for op, value in parsed:
+        if op == sre_parse.LITERAL:
+            current.append(value)
+            if len(current) > len(best):
+                best = current
+        else:
+            current = bytearray()
+    return bytes(best) or None
+
+
+class Matcher(object):
+    '''
+    Line matcher for either a regular expression or a literal, searched
+    for (when possible) with a plain substring prefilter, only candidate
+    lines being checked against the expression.
+
+    Matchers are picklable, so they can be sent to worker processes.
+    '''
+    def __init__(self, pattern, literal=False, ignore_case=False):
+        '''
+        :param pattern: regular expression or literal
+        :type pattern: str
+        :param literal: whether pattern is a literal
+        :type literal: bool
+        :param ignore_case: whether case is ignored
+        :type ignore_case: bool
+        :raises re.error: if pattern is not a valid regular expression
+        '''
+        data = pattern.encode('utf-8')
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        self.regex = re.compile(re.escape(data) if literal else data, flags)
+        self.literal = (
+            None if self.regex.flags & re.IGNORECASE else
+            data if literal else
+            required_literal(data)
+            )
+        if self.literal and b'\n' in self.literal:
+            self.literal = None  # matches span lines, prefilter would miss
+        if literal and self.literal:
+            self.regex = None  # literal is enough
+
+    def iter_lines(self, data, start, end):
+        '''
+        Iterate through matching lines of given data window, which must
+        start at a line start.
+
+        :param data: data buffer
+        :type data: bytes or mmap.mmap
+        :param start: window start
+        :type start: int
+        :param end: window end
+        :type end: int
+        :yields: line start and end (excluding newline) offsets
+        :ytype: tuple of int
+        '''
+        pos = start
+        while pos < end:
+            if self.literal:
+                found = data.find(self.literal, pos, end)
+            else:
+                match = self.regex.search(data, pos, end)
+                found = match.start() if match else -1
+            if found < 0:
+                break
+            line_start = data.rfind(b'\n', pos, found) + 1 or pos
+            line_end = data.find(b'\n', found, end)
+            if line_end < 0:
+                line_end = end
+            if (not self.literal or self.regex is None or
+                    self.regex.search(data, line_start, line_end)):
+                yield line_start, line_end
+            pos = line_end + 1
+
+
+def count_newlines(data, start, end, buffsize=1048576):
+    '''
+    Count newlines of given data window, in blocks so buffers not
+    supporting :meth:`bytes.count` (like mmap) are never fully copied.
+
+    :param data: data buffer
+    :type data: bytes or mmap.mmap
+    :param start: window start
+    :type start: int
+    :param end: window end
+    :type end: int
+    :param buffsize: block size on bytes, defaults to 1MiB
+    :type buffsize: int
+    :rtype: int
+    '''
+    count = 0
+    while start < end:
+        stop = min(start + buffsize, end)
+        count += data[start:stop].count(b'\n')
+        start = stop
+    return count
+
+
+def grep_buffer(data, matcher, buffsize=1048576, max_matches=None,
+                deadline=None, max_line=1024, clock=time.time):
+    '''
+    Get matching lines of given data buffer (like a mmap), searched in
+    windows of about `buffsize` bytes, so `deadline` is checked
+    periodically.
+
+    :param data: data buffer
+    :type data: bytes or mmap.mmap
+    :param matcher: line matcher
+    :type matcher: Matcher
+    :param buffsize: window size on bytes, defaults to 1MiB
+    :type buffsize: int
+    :param max_matches: maximum number of matches, defaults to None
+    :type max_matches: int or None
+    :param deadline: timestamp search must end by, defaults to None
+    :type deadline: float or None
+    :param max_line: maximum line size on bytes, defaults to 1KiB
+    :type max_line: int
+    :param clock: function returning current timestamp
+    :type clock: callable
+    :returns: list of line number and line tuples
+    :rtype: list of tuple
+    '''
+    matches = []
+    size = len(data)
+    lineno = 1
+    pos = counted = 0
+    while pos < size and (deadline is None or clock() < deadline):
+        end = min(pos + buffsize, size)
+        if end < size:
+            end = (
+                data.rfind(b'\n', pos, end) + 1 or
+                data.find(b'\n', end) + 1 or
+                size
+                )
+        for line_start, line_end in matcher.iter_lines(data, pos, end):
+            lineno += count_newlines(data, counted, line_start, buffsize)
+            counted = line_start
+            line_end = min(line_end, line_start + max_line)
+            matches.append((lineno, data[line_start:line_end]))
+            if len(matches) == max_matches:
+                return matches
+        pos = end
+    return matches
+
+
+def grep_chunks(chunks, matcher, max_matches=None, deadline=None,
+                max_line=1024, clock=time.time):
+    '''
+    Get matching lines of given data chunks (like decompressed ones),
+    searched as they come, keeping only their last incomplete line.
+
+    :param chunks: data chunks
+    :type chunks: iterable of bytes
+    :param matcher: line matcher
+    :type matcher: Matcher
+    :param max_matches: maximum number of matches, defaults to None
+    :type max_matches: int or None
+    :param deadline: timestamp search must end by, defaults to None
+    :type deadline: float or None
+    :param max_line: maximum line size on bytes, defaults to 1KiB
+    :type max_line: int
+    :param clock: function returning current timestamp
+    :type clock: callable
+    :returns: list of line number and line tuples
+    :rtype: list of tuple
+    '''
+    matches = []
+    lineno = 1
+    pending = b''
+    for chunk in itertools.chain(chunks, (None,)):
+        if deadline is not None and clock() >= deadline:
+            break
+        data = pending + chunk if chunk is not None else pending
+        end = data.rfind(b'\n') + 1 if chunk is not None else len(data)
+        counted = 0
+        for line_start, line_end in matcher.iter_lines(data, 0, end):
+            lineno += data.count(b'\n', counted, line_start)
+            counted = line_start
+            line_end = min(line_end, line_start + max_line)
+            matches.append((lineno, data[line_start:line_end]))
+            if len(matches) == max_matches:
+                return matches
+        lineno += data.count(b'\n', counted, end)
+        pending = data[end:]
+    return matches
+
+
+def grep_file(path, matcher, buffsize=1048576, max_matches=None,
+              deadline=None, max_line=1024):
+    '''
+    Get matching lines of given file, memory-mapped when possible, read
+    in blocks of `buffsize` bytes otherwise, and decompressed on the fly
+    when compressed (see :func:`browsepy.textview.get_compression`).
+
+    Unreadable files, and corrupt compressed ones, are ignored.
+
+    :param path: file path
+    :type path: str
+    :param matcher: line matcher
+    :type matcher: Matcher
+    :param buffsize: read block size on bytes, defaults to 1MiB
+    :type buffsize: int
+    :param max_matches: maximum number of matches, defaults to None
+    :type max_matches: int or None
+    :param deadline: timestamp search must end by, defaults to None
+    :type deadline: float or None
+    :param max_line: maximum line size on bytes, defaults to 1KiB
+    :type max_line: int
+    :returns: file path and list of line number and line tuples
+    :rtype: tuple
+    '''
+    options = {
+        'max_matches': max_matches,
+        'deadline': deadline,
+        'max_line': max_line,
+        }
+    try:
+        if textview.get_compression(path):
+            chunks = textview.iter_file(path, buffsize=buffsize)
+            return path, grep_chunks(chunks, matcher, **options)
+        with open(path, 'rb') as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (EnvironmentError, ValueError):  # empty or special
+                chunks = iter(functools.partial(f.read, buffsize), b'')
+                return path, grep_chunks(chunks, matcher, **options)
+            try:
+                return path, grep_buffer(data, matcher, buffsize, **options)
+            finally:
+                data.close()
+    except compress.decompress_errors as e:
+        logger.debug('Cannot search %s: %s', path, e)
+        return path, []
+
+
+def limit_cpu(seconds):
+    '''
+    Limit CPU time of current process, which gets killed when exceeded.
+
+    CPU time is accounted for the whole process life, so calling this
+    function again with the same value does not extend the limit.
+
+    :param seconds: CPU seconds
+    :type seconds: int or float or None
+    '''
+    if resource is None or not seconds:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    limit = int(seconds) + 1
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+
+
+def grep_task(path, cpu_time=None, **kwargs):
+    '''
+    Search given file (see :func:`grep_file`) from a :class:`GrepSearch`
+    worker process, whose CPU time gets limited (see :func:`limit_cpu`).
+
+    :param path: file path
+    :type path: str
+    :param cpu_time: maximum CPU seconds of current process
+    :type cpu_time: int or float or None
+    :param **kwargs: other :func:`grep_file` arguments
+    :returns: file path and list of line number and line tuples
+    :rtype: tuple
+    '''
+    limit_cpu(cpu_time)
+    return grep_file(path, **kwargs)
+
+
+def pool_context():
+    '''
+    Get a multiprocessing context safe to start processes from threaded
+    servers, as forking would copy locks held by other threads:
+    forkserver when available, spawn otherwise.
+
+    :returns: multiprocessing context
+    '''
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context(
+        'forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class GrepSearch(object):
+    '''
+    Search of matching lines across files of a directory tree (or a single
+    file), iterable as :class:`GrepMatch` tuples, yielded as files are
+    searched.
+
+    Files are searched on a pool of `workers` processes (in the current
+    one if zero), started for every search (see :func:`pool_context`).
+    Every worker process is limited to `cpu_time` CPU seconds for the
+    whole search, not per file, being killed once exceeded.
+
+    Search is stopped once `timeout` seconds are elapsed, `max_matches`
+    lines are found or a worker process dies (ie. killed by CPU limit),
+    :attr:`stopped` being set to **time**, **matches** or **cpu**
+    respectively. Files being searched by other workers meanwhile are
+    still bounded by `timeout`, `cpu_time` and `max_matches`.
+
+    Directory symlinks are never followed, and file symlinks only when
+    pointing inside `base`.
+    '''
+    pool_class = futures.ProcessPoolExecutor if futures else None
+    pool_context = staticmethod(pool_context)
+    clock = time.time
+
+    def __init__(self, path, matcher, base=None, exclude=None,
+                 walk_filter=None, workers=0, timeout=None, cpu_time=None,
+                 max_matches=None, buffsize=1048576):
+        '''
+        :param path: directory or file path
+        :type path: str
+        :param matcher: line matcher
+        :type matcher: Matcher
+        :param base: base directory symlinks must point into, defaults to
+                     None (path)
+        :type base: str or None
+        :param exclude: optional exclusion function, see `exclude_fnc`
+        :type exclude: callable or None
+        :param walk_filter: optional file selection (include globs,
+                            modification time and depth)
+        :type walk_filter: browsepy.stream.WalkFilter or None
+        :param workers: number of worker processes, defaults to 0 (none)
+        :type workers: int
+        :param timeout: maximum search seconds, defaults to None
+        :type timeout: int or float or None
+        :param cpu_time: maximum CPU seconds of every worker process for
+                         the whole search, defaults to None
+        :type cpu_time: int or float or None
+        :param max_matches: maximum number of matches, defaults to None
+        :type max_matches: int or None
+        :param buffsize: read block size on bytes, defaults to 1MiB
+        :type buffsize: int
+        '''
+        self.path = path
+        self.matcher = matcher
+        self.base = base or path
+        self.exclude = exclude
+        self.walk_filter = walk_filter
+        self.workers = workers
+        self.timeout = timeout
+        self.cpu_time = cpu_time
+        self.max_matches = max_matches
+        self.buffsize = buffsize
+        self.stopped = None
+
+    def _allowed(self, entry):
+        if self.exclude and self.exclude(entry.path):
+            return False
+        if entry.is_symlink():
+            if entry.is_dir():
+                return False
+            realpath = os.path.realpath(entry.path)
+            return check_under_base(realpath, os.path.realpath(self.base))
+        return True
+
+    def files(self):
+        '''
+        Iterate through files to search, honoring exclusion function and
+        walk filter.
+
+        :yields: file paths
+        :ytype: str
+        '''
+        if os.path.isfile(self.path):
+            yield self.path
+            return
+        walk_filter = self.walk_filter
+        mtime = bool(walk_filter) and not (
+            walk_filter.since is None and walk_filter.until is None)
+        stack = [(self.path, '', 0)]
+        while stack:
+            root, relroot, depth = stack.pop()
+            try:
+                entries = sorted(
+                    compat.scandir(root),
+                    key=lambda entry: entry.name,
+                    reverse=True,
+                    )
+            except OSError as e:
+                logger.debug('Cannot list %s: %s', root, e)
+                continue
+            for entry in entries:
+                if not self._allowed(entry):
+                    continue
+                relpath = relroot + entry.name
+                if entry.is_dir():
+                    if not walk_filter or walk_filter.descend(depth + 1):
+                        stack.append((entry.path, relpath + '/', depth + 1))
+                elif entry.is_file() and (not walk_filter or (
+                        walk_filter.match_file(
+                            relpath,
+                            entry.stat().st_mtime if mtime else 0,
+                            depth + 1,
+                            ))):
+                    yield entry.path
+
+    def _pool(self):
+        context = self.pool_context()
+        try:
+            return self.pool_class(self.workers, mp_context=context)
+        except TypeError:  # python < 3.7
+            return self.pool_class(self.workers)
+
+    def _results(self, deadline):
+        options = {
+            'matcher': self.matcher,
+            'buffsize': self.buffsize,
+            'max_matches': self.max_matches,
+            'deadline': deadline,
+            }
+        if not self.workers or self.pool_class is None:
+            for path in self.files():
+                yield grep_file(path, **options)
+            return
+        files = self.files()
+        pool = self._pool()
+        pending = set()
+        paths = {}
+        try:
+            while True:
+                for path in files:  # queue up to two files per worker
+                    future = pool.submit(
+                        grep_task, path, self.cpu_time, **options)
+                    paths[future] = path
+                    pending.add(future)
+                    if len(pending) >= self.workers * 2:
+                        break
+                if not pending:
+                    break
+                timeout = None if deadline is None else max(
+                    deadline - self.clock(), 0)
+                done, pending = futures.wait(
+                    pending, timeout, futures.FIRST_COMPLETED)
+                if not done:
+                    self.stopped = 'time'
+                    break
+                for future in done:
+                    path = paths.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        self.stopped = 'cpu'
+                        return
+                    except Exception as e:
+                        logger.warning('Cannot search %s: %s', path, e)
+                        continue
+                    yield result
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def __iter__(self):
+        '''
+        Iterate through matching lines.
+
+        :yields: matches
+        :ytype: GrepMatch
+        '''
+        deadline = self.clock() + self.timeout if self.timeout else None
+        found = 0
+        self.stopped = None
+        results = self._results(deadline)
+        try:
+            for path, matches in results:
+                for line, text in matches:
+                    yield GrepMatch(path, line, text)
+                    found += 1
+                    if found == self.max_matches:
+                        self.stopped = 'matches'
+                        return
+                if deadline is not None and self.clock() >= deadline:
+                    self.stopped = 'time'
+                    return
+        finally:
+            results.close()
+
+
+def line_text(data):
+    '''
+    Get matched line as text, without its carriage return if any.
+
+    :param data: line data
+    :type data: bytes
+    :rtype: str
+    '''
+    return data.rstrip(b'\r').decode('utf-8', 'replace')
+
+
+def iter_text(search, base):
+    '''
+    Serialize search results like `grep -n` does, one match per line,
+    followed by a line telling why search was stopped, if it was.
+
+    :param search: search
+    :type search: GrepSearch
+    :param base: base directory path, for url paths
+    :type base: str
+    :yields: text lines
+    :ytype: str
+    '''
+    for match in search:
+        yield '%s:%d:%s\n' % (
+            abspath_to_urlpath(match.path, base),
+            match.line,
+            line_text(match.text),
+            )
+    if search.stopped:
+        yield '--\nstopped: %s limit reached\n' % search.stopped
+
+
+def iter_json(search, base):
+    '''
+    Serialize search results as a JSON array, one match per line,
+    followed by an object telling why search was stopped, if it was.
+
+    :param search: search
+    :type search: GrepSearch
+    :param base: base directory path, for url paths
+    :type base: str
+    :yields: JSON chunks
+    :ytype: str
+    '''
+    yield '['
+    sep = '\n'
+    for match in search:
+        yield sep + json.dumps({
+            'path': abspath_to_urlpath(match.path, base),
+            'line': match.line,
+            'text': line_text(match.text),
+            })
+        sep = ',\n'
+    if search.stopped:
+        yield sep + json.dumps({'stopped': search.stopped})
+    yield '\n]\n'
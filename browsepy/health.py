@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import io
+import csv
+import json
+import functools
+import collections
+import multiprocessing.pool
+
+from . import compat
+from .file import Directory, scandir, abspath_to_urlpath
+
+
+HostHealth = collections.namedtuple(
+    'HostHealth',
+    ('path', 'urlpath', 'ok', 'logs')
+    )
+
+
+def iter_hosts(base, app):
+    '''
+    Iter host directories, those directly under given base, honoring app's
+    `exclude_fnc`.
+
+    :param base: base directory path
+    :type base: str
+    :param app: flask application
+    :type app: flask.Flask
+    :yields: host directory paths
+    :ytype: str
+    '''
+    for entry in scandir(base, app):
+        if entry.is_dir(follow_symlinks=True):
+            yield entry.path
+
+
+def check_host(path, app):
+    '''
+    Get log checks for given host directory, see
+    :attr:`browsepy.file.Node.logs`.
+
+    :param path: host directory path
+    :type path: str
+    :param app: flask application
+    :type app: flask.Flask
+    :returns: tuple of path and satisfied log rule names
+    :rtype: tuple of str and frozenset
+    '''
+    return path, Directory(path, app).logs
+
+
+def iter_health(base, app, workers=8, failing=False):
+    '''
+    Evaluate log checks of every host under base on a bounded thread pool,
+    yielding results as soon as they are available (in completion order).
+
+    :param base: base directory path
+    :type base: str
+    :param app: flask application
+    :type app: flask.Flask
+    :param workers: maximum number of concurrent host checks
+    :type workers: int
+    :param failing: whether only hosts failing any check are yielded
+    :type failing: bool
+    :yields: host health results
+    :ytype: HostHealth
+    '''
+    rules = app.extensions['plugin_manager'].get_log_rules()
+    names = [rule.name for rule in rules]
+    pool = multiprocessing.pool.ThreadPool(max(workers, 1))
+    try:
+        results = pool.imap_unordered(
+            functools.partial(check_host, app=app),
+            iter_hosts(base, app)
+            )
+        for path, logs in results:
+            ok = all(name in logs for name in names)
+            if failing and ok:
+                continue
+            yield HostHealth(
+                path,
+                abspath_to_urlpath(path, base),
+                ok,
+                collections.OrderedDict(
+                    (name, name in logs) for name in names)
+                )
+    finally:
+        pool.terminate()
+
+
+def iter_json(results):
+    '''
+    Serialize health results as a JSON array, one host per line.
+
+    :param results: iterable of health results
+    :type results: iterable of HostHealth
+    :yields: JSON chunks
+    :ytype: str
+    '''
+    yield '['
+    sep = '\n'
+    for result in results:
+        yield sep + json.dumps({
+            'path': result.urlpath,
+            'ok': result.ok,
+            'logs': result.logs,
+            })
+        sep = ',\n'
+    yield '\n]\n'
+
+
+def iter_csv(results, names):
+    '''
+    Serialize health results as CSV, one host per row.
+
+    :param results: iterable of health results
+    :type results: iterable of HostHealth
+    :param names: log rule names, used as columns
+    :type names: list of str
+    :yields: CSV lines
+    :ytype: str
+    '''
+    def row(values):
+        buffer = io.BytesIO() if compat.PY_LEGACY else io.StringIO()
+        csv.writer(buffer).writerow(values)
+        return buffer.getvalue()
+
+    yield row(['path', 'ok'] + list(names))
+    for result in results:
+        yield row(
+            [result.urlpath, int(result.ok)] +
+            [int(result.logs[name]) for name in names]
+            )
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+
+from . import scan
+from .cache import LRUCache
+
+
+def snapshots_size(snapshots, getsizeof=sys.getsizeof):
+    '''
+    Estimate memory used by given entry snapshots, in bytes.
+
+    :param snapshots: entry snapshots
+    :type snapshots: tuple of browsepy.scan.EntrySnapshot
+    :returns: estimated size in bytes
+    :rtype: int
+    '''
+    return getsizeof(snapshots) + sum(
+        getsizeof(snapshot) + getsizeof(snapshot.name)
+        for snapshot in snapshots
+        )
+
+
+class ListingCache(object):
+    '''
+    Application-wide cache of directory listings, as tuples of
+    :class:`browsepy.scan.EntrySnapshot`, shared by requests and threads.
+
+    Listings are discarded when their directory modification time or inode
+    changes, after `listing_cache_ttl` seconds (so changes deeper in the
+    tree, like new log files, are eventually seen), or when explicitly
+    invalidated (see :meth:`invalidate`).
+
+    Cache is bounded by both `listing_cache_size` (number of directories)
+    and `listing_cache_bytes` (estimated memory) app config, and disabled
+    if either is zero.
+
+    This class is a Flask extension, available at
+    `app.extensions['listing_cache']` after :meth:`init_app`.
+    '''
+    cache_class = LRUCache
+    default_size = 256
+    default_bytes = 32 * 1024 * 1024
+    default_ttl = 30
+    racy_seconds = 2  # mtime resolution margin, see :meth:`set`
+
+    @property
+    def config(self):
+        '''
+        App config, or an empty dict if not initialized for any app.
+        '''
+        return self.app.config if self.app else {}
+
+    @property
+    def enabled(self):
+        '''
+        Whether listings are being cached, based on app config limits.
+        '''
+        config = self.config
+        return bool(
+            config.get('listing_cache_size', self.default_size) and
+            config.get('listing_cache_bytes', self.default_bytes)
+            )
+
+    def __init__(self, app=None):
+        '''
+        :param app: optional flask application
+        :type app: flask.Flask
+        '''
+        self.app = None
+        self._cache = self.cache_class(
+            maxsize=self.default_size,
+            maxbytes=self.default_bytes,
+            ttl=self.default_ttl,
+            )
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        '''
+        Initialize this Flask extension for given app.
+        '''
+        self.app = app
+        if not hasattr(app, 'extensions'):
+            app.extensions = {}
+        app.extensions['listing_cache'] = self
+
+    def _configure(self):
+        config = self.config
+        cache = self._cache
+        cache.maxsize = config.get('listing_cache_size', self.default_size)
+        cache.maxbytes = config.get('listing_cache_bytes', self.default_bytes)
+        cache.ttl = config.get('listing_cache_ttl', self.default_ttl)
+
+    def get(self, path):
+        '''
+        Get cached listing of given directory, if still valid.
+
+        :param path: directory path
+        :type path: str
+        :returns: entry snapshots or None
+        :rtype: tuple of browsepy.scan.EntrySnapshot or None
+        '''
+        if not self.enabled:
+            return None
+        self._configure()
+        item = self._cache.get(path)
+        if item is None:
+            return None
+        try:
+            key = scan.stat_key(path, os.stat(path))
+        except OSError:
+            key = None
+        if item[0] != key:
+            self._cache.pop(path)
+            return None
+        return item[1]
+
+    def set(self, path, snapshots, stats):
+        '''
+        Cache listing of given directory.
+
+        Listings of directories modified too recently are not cached, as
+        entries could be added within filesystem's time resolution.
+
+        :param path: directory path
+        :type path: str
+        :param snapshots: entry snapshots
+        :type snapshots: tuple of browsepy.scan.EntrySnapshot
+        :param stats: directory stats taken before listing
+        :type stats: os.stat_result
+        '''
+        if not self.enabled:
+            return
+        self._configure()
+        if self._cache.clock() - stats.st_mtime < self.racy_seconds:
+            return
+        self._cache.set(
+            path,
+            (scan.stat_key(path, stats), snapshots),
+            snapshots_size(snapshots),
+            )
+
+    def invalidate(self, path):
+        '''
+        Discard cached listing of given directory.
+
+        :param path: directory path
+        :type path: str
+        '''
+        self._cache.pop(path)
+
+    def clear(self):
+        '''
+        Discard all cached listings.
+        '''
+        self._cache.clear()
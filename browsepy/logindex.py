@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import os.path
+import re
+import time
+import datetime
+import collections
+
+from . import scan
+from . import compat
+from .cache import LRUCache
+
+
+IndexState = collections.namedtuple(
+    'IndexState',
+    ('mtime', 'checked', 'dates')
+    )
+
+date_directives = {
+    'Y': r'\d{4}',
+    'y': r'\d{2}',
+    'm': r'\d{2}',
+    'd': r'\d{2}',
+    'j': r'\d{3}',
+    'H': r'\d{2}',
+    'M': r'\d{2}',
+    'S': r'\d{2}',
+    'b': r'[A-Za-z]{3}',
+    '%': '%',
+    }
+
+
+def date_regex(date_format, directives=date_directives):
+    '''
+    Get a regular expression matching strings generated by given
+    :func:`datetime.datetime.strftime` format.
+
+    :param date_format: strftime format
+    :type date_format: str
+    :param directives: mapping of directives to their regex
+    :type directives: dict
+    :returns: compiled regular expression
+    :rtype: re.RegexObject
+    '''
+    parts = re.split('(%.)', date_format)
+    return re.compile(''.join(
+        directives.get(part[1], re.escape(part))
+        if part.startswith('%') and len(part) == 2 else
+        re.escape(part)
+        for part in parts
+        ))
+
+
+def parse_dates(filenames, prefix, date_format):
+    '''
+    Get dates found on filenames starting with given prefix.
+
+    :param filenames: iterable of filenames
+    :type filenames: iterable of str
+    :param prefix: filename prefix
+    :type prefix: str
+    :param date_format: strftime format of dates in filenames
+    :type date_format: str
+    :returns: set of dates
+    :rtype: frozenset of datetime.date
+    '''
+    regex = date_regex(date_format)
+    strptime = datetime.datetime.strptime
+    dates = set()
+    for filename in filenames:
+        if not filename.startswith(prefix):
+            continue
+        for match in regex.finditer(filename, len(prefix)):
+            try:
+                dates.add(strptime(match.group(0), date_format).date())
+            except ValueError:
+                pass
+    return frozenset(dates)
+
+
+class LogIndex(object):
+    '''
+    Application-wide index of log file dates, per host directory and log
+    directory, kept across requests and shared by threads.
+
+    Log directory listings are parsed into sets of dates, keyed by log
+    rules' prefix and date format, so presence checks became set lookups.
+    Rules sharing the same log directory are parsed from a single listing.
+
+    Entries are validated against log directory modification time at most
+    once every `log_index_ttl` seconds (app config), and only relisted when
+    said modification time changes. Up to `log_index_size` entries (app
+    config) are kept, least recently used ones being discarded.
+
+    Log rules are taken from app's plugin manager (see
+    :meth:`browsepy.manager.LogRulePluginManager.get_log_rules`) when
+    available, or from :data:`browsepy.scan.default_log_rules` otherwise.
+
+    This class is a Flask extension, available at
+    `app.extensions['log_index']` after :meth:`init_app`.
+    '''
+    cache_class = LRUCache
+    clock = staticmethod(time.time)
+    default_ttl = 30
+    default_size = 65536
+    racy_seconds = 2  # mtime resolution margin, see :meth:`_refresh`
+
+    @property
+    def ttl(self):
+        '''
+        Seconds index entries are trusted without checking disk, taken from
+        app's `log_index_ttl` config.
+        '''
+        if self.app:
+            return self.app.config.get('log_index_ttl', self.default_ttl)
+        return self.default_ttl
+
+    @property
+    def size(self):
+        '''
+        Maximum number of index entries (one per host and log directory),
+        taken from app's `log_index_size` config.
+        '''
+        if self.app:
+            return self.app.config.get('log_index_size', self.default_size)
+        return self.default_size
+
+    @property
+    def rules(self):
+        '''
+        Log rules, as given on initialization or taken from app's plugin
+        manager.
+        '''
+        if self._rules is not None:
+            return self._rules
+        manager = self.app and self.app.extensions.get('plugin_manager')
+        if manager:
+            return manager.get_log_rules()
+        return scan.default_log_rules
+
+    def __init__(self, app=None, rules=None):
+        '''
+        :param app: optional flask application
+        :type app: flask.Flask
+        :param rules: optional log rules, overriding app ones
+        :type rules: iterable of browsepy.scan.LogRule
+        '''
+        self.app = None
+        self._rules = None if rules is None else tuple(rules)
+        self._state = self.cache_class(maxsize=self.default_size)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        '''
+        Initialize this Flask extension for given app.
+        '''
+        self.app = app
+        if not hasattr(app, 'extensions'):
+            app.extensions = {}
+        app.extensions['log_index'] = self
+
+    def clear(self):
+        '''
+        Clear index state.
+        '''
+        self._state.clear()
+
+    def _refresh(self, path, subpath, rules, names=None):
+        '''
+        Get index state for given host directory and log subpath, relisting
+        log directory only when its modification time changed or when given
+        rules are not indexed yet.
+
+        Modification times too close to listing time are not trusted, as
+        files could be added within filesystem's time resolution.
+
+        :param path: host directory path
+        :type path: str
+        :param subpath: log directory subpath, slash-separated
+        :type subpath: str
+        :param rules: log rules for given subpath
+        :type rules: iterable of browsepy.scan.LogRule
+        :param names: optional entry names of host directory
+        :type names: collections.abc.Container or None
+        :returns: index state
+        :rtype: IndexState
+        '''
+        key = (path, subpath)
+        now = self.clock()
+        state = self._state.get(key)
+        parsers = set((rule.prefix, rule.date_format) for rule in rules)
+        if state:
+            if not parsers.issubset(state.dates):
+                parsers.update(state.dates)
+                state = None
+            elif now - state.checked < self.ttl:
+                return state
+
+        components = subpath.split('/')
+        logpath = os.path.join(path, *components)
+        mtime = None
+        if names is None or components[0] in names:
+            try:
+                mtime = os.stat(logpath).st_mtime
+            except OSError:
+                pass
+
+        if state and mtime is not None and state.mtime == mtime:
+            state = state._replace(checked=now)
+        else:
+            filenames = () if mtime is None else scan.listdir(logpath)
+            dates = {
+                (prefix, date_format): parse_dates(
+                    filenames, prefix, date_format)
+                for prefix, date_format in parsers
+                }
+            if mtime is not None and now - mtime < self.racy_seconds:
+                mtime = -1  # force relisting on next check
+            state = IndexState(mtime, now, dates)
+
+        self._state.maxsize = self.size
+        self._state.set(key, state)
+        return state
+
+    def _rule(self, name):
+        for rule in self.rules:
+            if rule.name == name:
+                return rule
+        raise KeyError(name)
+
+    def dates(self, path, name):
+        '''
+        Get dates with logs matching given rule under given host directory.
+
+        :param path: host directory path
+        :type path: str
+        :param name: log rule name
+        :type name: str
+        :returns: dates
+        :rtype: frozenset of datetime.date
+        :raises KeyError: if there is no rule with given name
+        '''
+        rule = self._rule(name)
+        state = self._refresh(path, rule.subpath, (rule,))
+        return state.dates[(rule.prefix, rule.date_format)]
+
+    def has(self, path, name, date=None):
+        '''
+        Get if host directory contains logs matching given rule, for given
+        date or any date inside rule's lookback window.
+
+        :param path: host directory path
+        :type path: str
+        :param name: log rule name
+        :type name: str
+        :param date: date, defaults to rule's lookback window
+        :type date: datetime.date or None
+        :returns: True if logs are available, False otherwise
+        :rtype: bool
+        :raises KeyError: if there is no rule with given name
+        '''
+        dates = self.dates(path, name)
+        if date:
+            return date in dates
+        return any(d in dates for d in self.window(self._rule(name)))
+
+    def check(self, path, names=None, date=None):
+        '''
+        Get which log rules are satisfied under given host directory,
+        compatible with :func:`browsepy.scan.check_logs`.
+
+        Rules are grouped by subpath, so each distinct log directory is
+        checked once for all of them.
+
+        :param path: host directory path
+        :type path: str
+        :param names: optional entry names of host directory, log subpaths
+                      whose first component is not there won't be checked
+        :type names: collections.abc.Container or None
+        :param date: date, defaults to rules' lookback window
+        :type date: datetime.date or None
+        :returns: names of satisfied log rules
+        :rtype: frozenset of str
+        '''
+        groups = collections.OrderedDict()
+        for rule in self.rules:
+            groups.setdefault(rule.subpath, []).append(rule)
+        found = set()
+        for subpath, rules in groups.items():
+            state = self._refresh(path, subpath, rules, names)
+            for rule in rules:
+                dates = state.dates[(rule.prefix, rule.date_format)]
+                window = (date,) if date else self.window(rule)
+                if any(d in dates for d in window):
+                    found.add(rule.name)
+        return frozenset(found)
+
+    def update(self, base):
+        '''
+        Index every directory directly under given base, ie. all hosts.
+
+        :param base: base directory path
+        :type base: str
+        '''
+        exclude = self.app and self.app.config.get('exclude_fnc')
+        for entry in compat.scandir(base):
+            if exclude and exclude(entry.path):
+                continue
+            if entry.is_dir(follow_symlinks=True):
+                self.check(entry.path)
+
+    def missing(self, name, date=None):
+        '''
+        Get indexed host directories without logs matching given rule, for
+        given date or rule's lookback window, using index state only
+        (without touching disk), so hosts whose entries were discarded
+        (see :attr:`size`) are not included.
+
+        :param name: log rule name
+        :type name: str
+        :param date: date, defaults to rule's lookback window
+        :type date: datetime.date or None
+        :returns: sorted host directory paths
+        :rtype: list of str
+        :raises KeyError: if there is no rule with given name
+        '''
+        rule = self._rule(name)
+        key = (rule.prefix, rule.date_format)
+        window = (date,) if date else self.window(rule)
+        return sorted(
+            path
+            for (path, subpath), state in self._state.items()
+            if subpath == rule.subpath and key in state.dates and
+            not any(d in state.dates[key] for d in window)
+            )
+
+    def window(self, rule):
+        '''
+        Get dates inside rule's lookback window, as checked by default.
+
+        :param rule: log rule
+        :type rule: browsepy.scan.LogRule
+        :returns: dates, nearest first
+        :rtype: list of datetime.date
+        '''
+        now = datetime.datetime.fromtimestamp(self.clock())
+        return scan.lookback_dates(rule, now)
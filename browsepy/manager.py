@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
 
+import os.path
 import re
 import sys
+import zlib
 import argparse
 import warnings
 import collections
@@ -11,6 +13,8 @@ from flask import current_app
 from werkzeug.utils import cached_property
 
 from . import mimetype
+from . import mimecache
+from . import scan
 from . import compat
 from .compat import deprecated, usedoc
 
@@ -54,6 +58,7 @@ class PluginManagerBase(object):
     '''
     Base plugin manager for plugin module loading and Flask extension logic.
     '''
+    app = None
 
     @property
     def namespaces(self):
@@ -375,12 +380,23 @@ class WidgetPluginManager(RegistrablePluginManager):
 class MimetypePluginManager(RegistrablePluginManager):
     '''
     Plugin manager for mimetype-function registration.
+
+    Content is sniffed in-process by default (see
+    :func:`browsepy.mimetype.by_magic`), while `file` command is only used
+    if app's `mimetype_file_command` config is enabled.
+
+    Static extension maps registered via :meth:`register_mimetype_extensions`
+    are merged into a single suffix dictionary, looked up before calling any
+    mime function.
     '''
     _default_mimetype_functions = (
         mimetype.by_python,
-        mimetype.by_file,
+        mimetype.by_magic,
         mimetype.by_default,
     )
+    _file_mimetype_functions = (
+        mimetype.by_file,
+    )
 
     def clear(self):
         '''
@@ -389,36 +405,233 @@ class MimetypePluginManager(RegistrablePluginManager):
         Registered mimetype functions will be disposed after calling this
         method.
         '''
+        config = self.app.config if self.app else {}
         self._mimetype_functions = list(self._default_mimetype_functions)
+        if config.get('mimetype_file_command'):
+            self._mimetype_functions[1:1] = self._file_mimetype_functions
+        self._mimetype_extensions = {}
+        self._mimetype_extension_depth = 1
+        self._mimetype_cache = None
+        self._mimetype_cache_size = config.get('mimetype_cache_size', 0)
+        self._mimetype_cache_dir = config.get('mimetype_cache_dir')
         super(MimetypePluginManager, self).clear()
 
+    @property
+    def mimetype_cache(self):
+        '''
+        Mimetype cache (see :class:`browsepy.mimecache.MimetypeCache`) based
+        on app's `mimetype_cache_size` and `mimetype_cache_dir` config, or
+        None if disabled.
+
+        Cache keys are namespaced by current mime functions, so persisted
+        mimetypes are not reused when plugins change.
+        '''
+        if self._mimetype_cache is None and self._mimetype_cache_size:
+            namespace = '%08x' % (zlib.crc32(','.join(
+                '%s.%s' % (
+                    getattr(fnc, '__module__', None),
+                    getattr(fnc, '__name__', None),
+                    )
+                for fnc in self._mimetype_functions
+                ).encode('utf-8')) & 0xffffffff)
+            self._mimetype_cache = mimecache.MimetypeCache(
+                maxsize=self._mimetype_cache_size,
+                directory=self._mimetype_cache_dir,
+                namespace=namespace,
+                )
+        return self._mimetype_cache
+
+    def get_extension_mimetype(self, path):
+        '''
+        Get mimetype of given path from registered extension maps, trying
+        longer (multi-dot) suffixes first, case-insensitively.
+
+        :param path: filesystem path of file
+        :type path: str
+        :returns: mimetype or None if no extension matches
+        :rtype: str or None
+        '''
+        name = os.path.basename(path).lstrip('.').lower()
+        parts = name.split('.')
+        extensions = self._mimetype_extensions
+        for size in range(min(self._mimetype_extension_depth,
+                              len(parts) - 1), 0, -1):
+            mime = extensions.get('.'.join(parts[-size:]))
+            if mime:
+                return mime
+        return None
+
     def get_mimetype(self, path):
         '''
         Get mimetype of given path calling all registered mime functions (and
-        default ones).
+        default ones), see :meth:`get_mimetypes`.
 
         :param path: filesystem path of file
         :type path: str
         :returns: mimetype
         :rtype: str
         '''
+        return self.get_mimetypes((path,))[0]
+
+    def get_mimetypes(self, paths):
+        '''
+        Get mimetypes of given paths, looking at extension maps first (see
+        :meth:`get_extension_mimetype`), then calling every registered mime
+        function (and default ones) once for all paths still unresolved.
+
+        Mime functions providing a `batch` attribute (see
+        :func:`browsepy.mimetype.batch`) receive all those paths at once,
+        others are called once per path.
+
+        Results are taken from, and stored into, :attr:`mimetype_cache`
+        when enabled, except :func:`browsepy.mimetype.by_default`
+        fallbacks, as mime functions could fail for reasons not changing
+        cache keys (ie. file permissions).
+
+        :param paths: filesystem paths of files
+        :type paths: iterable of str
+        :returns: mimetypes, in the same order
+        :rtype: list of str
+        '''
+        paths = list(paths)
+        results = list(map(self.get_extension_mimetype, paths))
+        pending = [i for i, mime in enumerate(results) if mime is None]
+        cache = self.mimetype_cache
+        if cache and pending:
+            keys = cache.keys([paths[i] for i in pending])
+            remaining = []
+            for i, key, mime in zip(pending, keys, cache.get_many(keys)):
+                if mime:
+                    results[i] = mime
+                else:
+                    remaining.append((i, key))
+            pending = [i for i, key in remaining]
+            resolving = remaining
+        else:
+            cache = None
         for fnc in self._mimetype_functions:
-            mime = fnc(path)
-            if mime:
-                return mime
-        return mimetype.by_default(path)
+            if not pending or fnc is mimetype.by_default:
+                break
+            batch = getattr(fnc, 'batch', None)
+            unresolved = [paths[i] for i in pending]
+            mimes = batch(unresolved) if batch else map(fnc, unresolved)
+            remaining = []
+            for i, mime in zip(pending, mimes):
+                if mime:
+                    results[i] = mime
+                else:
+                    remaining.append(i)
+            pending = remaining
+        for i in pending:
+            results[i] = mimetype.by_default(paths[i])
+        if cache:
+            fallbacks = set(pending)
+            cache.set_many(
+                (key, results[i])
+                for i, key in resolving
+                if i not in fallbacks
+                )
+        return results
+
+    def register_mimetype_extensions(self, extensions):
+        '''
+        Register static extension-to-mimetype mapping, looked up before any
+        mime function (see :meth:`get_extension_mimetype`), overriding
+        previously registered extensions.
+
+        Extensions are case-insensitive, with or without leading dot, and
+        can span multiple dots (ie. `tar.gz`).
+
+        :param extensions: mapping of extensions to mimetypes
+        :type extensions: dict
+        '''
+        for extension, mime in extensions.items():
+            extension = extension.lstrip('.').lower()
+            self._mimetype_extensions[extension] = mime
+            self._mimetype_extension_depth = max(
+                self._mimetype_extension_depth,
+                extension.count('.') + 1,
+                )
 
     def register_mimetype_function(self, fnc):
         '''
         Register mimetype function.
 
         Given function must accept a filesystem path as string and return
-        a mimetype string or None.
+        a mimetype string or None, and can provide a batch implementation
+        (see :meth:`get_mimetypes`).
 
         :param fnc: callable accepting a path string
         :type fnc: callable
         '''
         self._mimetype_functions.insert(0, fnc)
+        self._mimetype_cache = None
+
+
+class LogRulePluginManager(RegistrablePluginManager):
+    '''
+    Plugin manager for log-check rule registration.
+
+    Rules are taken from app's `log_rules` config (defaulting to
+    :data:`browsepy.scan.default_log_rules`) and extended, or overridden
+    by name, by those registered via :meth:`register_log_rule`.
+    '''
+    def clear(self):
+        '''
+        Clear plugin manager state.
+
+        Registered log rules will be disposed after calling this method.
+        '''
+        self._log_rules = []
+        super(LogRulePluginManager, self).clear()
+
+    def get_log_rules(self):
+        '''
+        Get both configured and registered log rules.
+
+        :returns: log rules, sorted as defined
+        :rtype: tuple of browsepy.scan.LogRule
+        '''
+        config = self.app.config.get('log_rules') if self.app else None
+        rules = collections.OrderedDict(
+            (rule.name, rule)
+            for rule in (
+                scan.default_log_rules
+                if config is None else
+                map(scan.log_rule, config)
+                )
+            )
+        for rule in self._log_rules:
+            rules[rule.name] = rule
+        return tuple(rules.values())
+
+    def register_log_rule(self, name, subpath, prefix, date_format,
+                          lookback=1):
+        '''
+        Register log rule, describing a log family shown on LogCheck column.
+
+        Rule will be satisfied for a directory if, at given subpath, there
+        are files starting with given prefix and containing a date in
+        given format, for any of the last `lookback` days before today.
+
+        :param name: rule name, registering an existing one will replace it
+        :type name: str
+        :param subpath: log directory, slash-separated and relative
+        :type subpath: str
+        :param prefix: log filename prefix
+        :type prefix: str
+        :param date_format: :func:`datetime.datetime.strftime` format of
+                            dates inside log filenames
+        :type date_format: str
+        :param lookback: number of days before today will be checked,
+                         defaults to 1 (yesterday)
+        :type lookback: int
+        :returns: log rule
+        :rtype: browsepy.scan.LogRule
+        '''
+        rule = scan.LogRule(name, subpath, prefix, date_format, lookback)
+        self._log_rules.append(rule)
+        return rule
 
 
 class ArgumentPluginManager(PluginManagerBase):
@@ -679,7 +892,8 @@ class MimetypeActionPluginManager(WidgetPluginManager, MimetypePluginManager):
 
 class PluginManager(MimetypeActionPluginManager,
                     BlueprintPluginManager, WidgetPluginManager,
-                    MimetypePluginManager, ArgumentPluginManager):
+                    MimetypePluginManager, LogRulePluginManager,
+                    ArgumentPluginManager):
     '''
     Main plugin manager
 
@@ -691,6 +905,7 @@ class PluginManager(MimetypeActionPluginManager,
         * Widget registration via :meth:`register_widget` method.
         * Mimetype function registration via :meth:`register_mimetype_function`
           method.
+        * Log-check rule registration via :meth:`register_log_rule` method.
         * Command-line argument registration calling :func:`register_arguments`
           at plugin module level and providing :meth:`register_argument`
           method.
@@ -710,6 +925,8 @@ class PluginManager(MimetypeActionPluginManager,
         Registered mimetype functions will be disposed after calling this
         method.
 
+        Registered log rules will be disposed after calling this method.
+
         Registered command-line arguments will be disposed after calling this
         method.
         '''
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import os.path
+import logging
+import threading
+
+try:
+    import sqlite3
+except ImportError:  # pragma: no cover
+    sqlite3 = None
+
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def file_key(path, namespace=''):
+    '''
+    Get cache key identifying given file content by device, inode,
+    modification time in nanoseconds and size.
+
+    :param path: file path
+    :type path: str
+    :param namespace: key prefix
+    :type namespace: str
+    :returns: cache key or None if path cannot be stat'ed
+    :rtype: str or None
+    '''
+    try:
+        stats = os.stat(path)
+    except OSError:
+        return None
+    mtime_ns = getattr(stats, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(stats.st_mtime * 1e9)
+    return '%s:%d:%d:%d:%d' % (
+        namespace, stats.st_dev, stats.st_ino, mtime_ns, stats.st_size)
+
+
+class SQLiteStore(object):
+    '''
+    Thread-safe persistent key-value store of mimetypes, backed by a
+    sqlite database file.
+
+    Errors are logged and otherwise ignored, so an unusable database just
+    behaves as an empty one.
+    '''
+    lock_class = threading.Lock
+    chunk_size = 500  # below sqlite's default maximum number of parameters
+
+    def __init__(self, path):
+        '''
+        :param path: database file path
+        :type path: str
+        '''
+        self.path = path
+        self._lock = self.lock_class()
+        self._connection = None
+
+    @property
+    def connection(self):
+        '''
+        Database connection, created (along with its table) on first use.
+        '''
+        if self._connection is None:
+            dirname = os.path.dirname(self.path)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            connection = sqlite3.connect(
+                self.path, timeout=5, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS mimetypes '
+                '(key TEXT PRIMARY KEY, mimetype TEXT NOT NULL)'
+                )
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def get_many(self, keys):
+        '''
+        Get stored mimetypes for given keys.
+
+        :param keys: keys
+        :type keys: list of str
+        :returns: mapping of found keys to mimetypes
+        :rtype: dict
+        '''
+        found = {}
+        try:
+            with self._lock:
+                for start in range(0, len(keys), self.chunk_size):
+                    chunk = keys[start:start + self.chunk_size]
+                    found.update(self.connection.execute(
+                        'SELECT key, mimetype FROM mimetypes '
+                        'WHERE key IN (%s)' % ', '.join('?' * len(chunk)),
+                        chunk
+                        ))
+        except (sqlite3.Error, OSError) as e:
+            logger.warning('Cannot read mimetype cache %s: %s', self.path, e)
+        return found
+
+    def set_many(self, items):
+        '''
+        Store given key and mimetype pairs, in a single transaction.
+
+        :param items: key and mimetype pairs
+        :type items: list of tuple
+        '''
+        try:
+            with self._lock:
+                with self.connection:
+                    self.connection.executemany(
+                        'INSERT OR REPLACE INTO mimetypes (key, mimetype) '
+                        'VALUES (?, ?)',
+                        items
+                        )
+        except (sqlite3.Error, OSError) as e:
+            logger.warning('Cannot write mimetype cache %s: %s', self.path, e)
+
+
+class MimetypeCache(object):
+    '''
+    Mimetype cache, keyed by file device, inode, modification time and size
+    (see :func:`file_key`), made of an in-memory LRU and an optional
+    persistent store, so mimetypes survive restarts.
+    '''
+    store_class = SQLiteStore
+    store_filename = 'mimetypes.sqlite3'
+
+    def __init__(self, maxsize=65536, directory=None, namespace=''):
+        '''
+        :param maxsize: maximum number of mimetypes kept in memory
+        :type maxsize: int
+        :param directory: optional directory for persistent store
+        :type directory: str or None
+        :param namespace: key prefix, meant to identify mime functions
+        :type namespace: str
+        '''
+        self.namespace = namespace
+        self._memory = LRUCache(maxsize=maxsize)
+        self._store = (
+            self.store_class(os.path.join(directory, self.store_filename))
+            if directory and sqlite3 else
+            None
+            )
+
+    def keys(self, paths):
+        '''
+        Get cache keys for given paths.
+
+        :param paths: file paths
+        :type paths: list of str
+        :returns: list of keys, or None for paths which cannot be stat'ed
+        :rtype: list of str or None
+        '''
+        return [file_key(path, self.namespace) for path in paths]
+
+    def get_many(self, keys):
+        '''
+        Get cached mimetypes for given keys, looking at persistent store
+        for those not in memory.
+
+        :param keys: list of keys, as returned by :meth:`keys`
+        :type keys: list of str or None
+        :returns: list of mimetypes, or None if not cached
+        :rtype: list of str or None
+        '''
+        results = [
+            None if key is None else self._memory.get(key)
+            for key in keys
+            ]
+        if self._store:
+            missing = [
+                key
+                for key, result in zip(keys, results)
+                if key is not None and result is None
+                ]
+            if missing:
+                found = self._store.get_many(missing)
+                for key, mime in found.items():
+                    self._memory.set(key, mime)
+                results = [
+                    found.get(key) if result is None else result
+                    for key, result in zip(keys, results)
+                    ]
+        return results
+
+    def set_many(self, items):
+        '''
+        Cache given key and mimetype pairs.
+
+        :param items: key and mimetype pairs, keys being None are ignored
+        :type items: iterable of tuple
+        '''
+        items = [(key, mime) for key, mime in items if key is not None]
+        for key, mime in items:
+            self._memory.set(key, mime)
+        if self._store and items:
+            self._store.set_many(items)
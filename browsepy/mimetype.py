@@ -2,15 +2,121 @@
 # -*- coding: UTF-8 -*-
 
 import re
+import os
+import os.path
+import stat
+import threading
 import subprocess
 import mimetypes
+import multiprocessing.pool
+
+try:
+    import ctypes
+    import ctypes.util
+except ImportError:  # pragma: no cover
+    ctypes = None
 
 from .compat import FileNotFoundError, which  # noqa
 
 generic_mimetypes = frozenset(('application/octet-stream', None))
 re_mime_validate = re.compile('\w+/\w+(; \w+=[^;]+)*')
 
+magic_size = 4096  # bytes read from file head, see :func:`by_magic`
+magic_workers = 4  # threads sniffing batches, see :func:`by_magic_batch`
+file_batch_size = 256  # paths per `file` command, see :func:`by_file_batch`
+
+# (offset, magic bytes, mimetype), checked in order
+magic_signatures = (
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (0, b'BZh', 'application/x-bzip2'),
+    (0, b'\xfd7zXZ\x00', 'application/x-xz'),
+    (0, b'\x28\xb5\x2f\xfd', 'application/zstd'),
+    (0, b'\x04\x22\x4d\x18', 'application/x-lz4'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'PK\x05\x06', 'application/zip'),
+    (0, b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (257, b'ustar', 'application/x-tar'),
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'\x7fELF', 'application/x-executable'),
+    (0, b'SQLite format 3\x00', 'application/vnd.sqlite3'),
+    (0, b'\xd4\xc3\xb2\xa1', 'application/vnd.tcpdump.pcap'),
+    (0, b'\xa1\xb2\xc3\xd4', 'application/vnd.tcpdump.pcap'),
+    (0, b'\x4d\x3c\xb2\xa1', 'application/vnd.tcpdump.pcap'),
+    (0, b'\x0a\x0d\x0d\x0a', 'application/x-pcapng'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'fLaC', 'audio/flac'),
+    (0, b'ID3', 'audio/mpeg'),
+    (8, b'WAVE', 'audio/x-wav'),
+    (4, b'ftyp', 'video/mp4'),
+    (0, b'\x1a\x45\xdf\xa3', 'video/webm'),
+    )
+
+# (lowercase prefix, mimetype) for text files, see :func:`sniff_text`
+text_signatures = (
+    (b'<?xml', 'text/xml'),
+    (b'<!doctype html', 'text/html'),
+    (b'<html', 'text/html'),
+    (b'#!/bin/sh', 'text/x-shellscript'),
+    (b'#!/bin/bash', 'text/x-shellscript'),
+    (b'#!/usr/bin/env bash', 'text/x-shellscript'),
+    )
+
+# (stat mode test, mimetype) for non-regular files, as `file -ib` reports
+inode_signatures = (
+    (stat.S_ISFIFO, 'inode/fifo'),
+    (stat.S_ISCHR, 'inode/chardevice'),
+    (stat.S_ISBLK, 'inode/blockdevice'),
+    (stat.S_ISSOCK, 'inode/socket'),
+    )
+
+text_bytes = bytes(bytearray(
+    set((7, 8, 9, 10, 12, 13, 27)) | set(range(0x20, 0x100)) - set((0x7f,))
+    ))
+
+
+def batch(batch_fnc):
+    '''
+    Decorator attaching a batch implementation to a mimetype function, as
+    its `batch` attribute, to be used by
+    :meth:`browsepy.manager.MimetypePluginManager.get_mimetypes`.
 
+    :param batch_fnc: callable receiving a list of paths and returning a
+                      list of mimetypes (or None when unknown)
+    :type batch_fnc: callable
+    :returns: decorator
+    :rtype: callable
+    '''
+    def inner(fnc):
+        fnc.batch = batch_fnc
+        return fnc
+    return inner
+
+
+def by_python_batch(paths):
+    '''
+    Get mimetypes of given paths based on their extensions (see
+    :func:`by_python`), resolving every distinct extension only once.
+
+    :param paths: list of paths
+    :type paths: list of str
+    :returns: list of mimetypes or None
+    :rtype: list of str or None
+    '''
+    resolved = {}
+    results = []
+    for path in paths:
+        extension = os.path.basename(path).partition('.')[2]
+        if extension not in resolved:
+            resolved[extension] = by_python(path) if extension else None
+        results.append(resolved[extension])
+    return results
+
+
+@batch(by_python_batch)
 def by_python(path):
     mime, encoding = mimetypes.guess_type(path)
     if mime in generic_mimetypes:
@@ -22,26 +128,269 @@ def by_python(path):
         )
 
 
+def file_output(output):
+    '''
+    Validate mimetype as printed by `file -ib` command.
+
+    :param output: command output line
+    :type output: str
+    :returns: mimetype or None if invalid
+    :rtype: str or None
+    '''
+    output = output.strip()
+    if re_mime_validate.match(output) and output not in generic_mimetypes:
+        # 'file' command can return status zero with invalid output
+        return output
+    return None
+
+
 if which('file'):
+    def by_file_batch(paths, size=file_batch_size):
+        '''
+        Get mimetypes of given paths spawning `file` command once for every
+        `size` paths.
+
+        :param paths: list of paths
+        :type paths: list of str
+        :param size: maximum number of paths per command
+        :type size: int
+        :returns: list of mimetypes or None
+        :rtype: list of str or None
+        '''
+        results = []
+        for start in range(0, len(paths), size):
+            chunk = paths[start:start + size]
+            try:
+                lines = subprocess.check_output(
+                    ("file", "-ib", "--") + tuple(chunk),
+                    universal_newlines=True
+                    ).splitlines()
+            except (subprocess.CalledProcessError, FileNotFoundError):
+                lines = ()
+            if len(lines) != len(chunk):  # ie. newlines in filenames
+                results.extend(map(by_file, chunk))
+                continue
+            results.extend(map(file_output, lines))
+        return results
+
+    @batch(by_file_batch)
     def by_file(path):
         try:
-            output = subprocess.check_output(
+            return file_output(subprocess.check_output(
                 ("file", "-ib", path),
                 universal_newlines=True
-                ).strip()
-            if (
-              re_mime_validate.match(output) and
-              output not in generic_mimetypes
-              ):
-                # 'file' command can return status zero with invalid output
-                return output
+                ))
         except (subprocess.CalledProcessError, FileNotFoundError):
             pass
         return None
 else:
+    def by_file_batch(paths, size=file_batch_size):
+        return [None] * len(paths)
+
+    @batch(by_file_batch)
     def by_file(path):
         return None
 
 
+class LibMagic(object):
+    '''
+    Minimal ctypes binding of libmagic (the library behind `file` command),
+    detecting mimetypes of in-memory buffers.
+
+    Magic cookies are not thread-safe, so they're pooled: every call takes
+    an idle cookie (opening a new one if none is available) and returns it
+    afterwards.
+    '''
+    MAGIC_MIME = 0x000410  # MAGIC_MIME_TYPE | MAGIC_MIME_ENCODING
+    lock_class = threading.Lock
+
+    @classmethod
+    def load(cls, name='magic'):
+        '''
+        Load libmagic shared library, if available.
+
+        :param name: library name
+        :type name: str
+        :returns: LibMagic instance or None
+        :rtype: LibMagic or None
+        '''
+        if ctypes is None:
+            return None
+        path = ctypes.util.find_library(name)
+        if not path:
+            return None
+        try:
+            lib = ctypes.CDLL(path)
+            lib.magic_open.restype = ctypes.c_void_p
+            lib.magic_open.argtypes = (ctypes.c_int,)
+            lib.magic_load.restype = ctypes.c_int
+            lib.magic_load.argtypes = (ctypes.c_void_p, ctypes.c_char_p)
+            lib.magic_buffer.restype = ctypes.c_char_p
+            lib.magic_buffer.argtypes = (
+                ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t)
+            lib.magic_close.restype = None
+            lib.magic_close.argtypes = (ctypes.c_void_p,)
+        except (OSError, AttributeError):
+            return None
+        return cls(lib)
+
+    def __init__(self, lib):
+        '''
+        :param lib: loaded libmagic library
+        :type lib: ctypes.CDLL
+        '''
+        self._lib = lib
+        self._lock = self.lock_class()
+        self._idle = []
+
+    def _open(self):
+        cookie = self._lib.magic_open(self.MAGIC_MIME)
+        if cookie and self._lib.magic_load(cookie, None) != 0:
+            self._lib.magic_close(cookie)
+            cookie = None
+        return cookie
+
+    def buffer(self, data):
+        '''
+        Get mimetype (with encoding) of given data.
+
+        :param data: file content
+        :type data: bytes
+        :returns: mimetype or None if it cannot be detected
+        :rtype: str or None
+        '''
+        with self._lock:
+            cookie = self._idle.pop() if self._idle else None
+        if cookie is None:
+            cookie = self._open()
+            if cookie is None:
+                return None
+        try:
+            result = self._lib.magic_buffer(cookie, data, len(data))
+        finally:
+            with self._lock:
+                self._idle.append(cookie)
+        return result.decode('ascii', 'replace') if result else None
+
+
+libmagic = LibMagic.load()
+
+
+def sniff_signature(data, signatures=magic_signatures):
+    '''
+    Get mimetype of binary data based on given magic number signatures.
+
+    :param data: file head
+    :type data: bytes
+    :param signatures: iterable of offset, magic bytes and mimetype tuples
+    :type signatures: iterable of tuple
+    :returns: mimetype, or None if no signature matches
+    :rtype: str or None
+    '''
+    for offset, magic, mime in signatures:
+        if data.startswith(magic, offset):
+            return '%s; charset=binary' % mime
+    return None
+
+
+def sniff_text(data, signatures=text_signatures):
+    '''
+    Get mimetype of given data if it looks like text, with its charset
+    (us-ascii, utf-8 or iso-8859-1), like `file -ib` command does.
+
+    :param data: file head, which could end with truncated utf-8 sequences
+    :type data: bytes
+    :param signatures: iterable of lowercase prefix and mimetype tuples
+    :type signatures: iterable of tuple
+    :returns: mimetype or None if data is not text
+    :rtype: str or None
+    '''
+    if b'\0' in data or data.translate(None, text_bytes):
+        return None
+    try:
+        data.decode('ascii')
+        charset = 'us-ascii'
+    except UnicodeDecodeError:
+        try:
+            data.decode('utf-8')
+            charset = 'utf-8'
+        except UnicodeDecodeError as e:
+            truncated = e.reason == 'unexpected end of data'
+            charset = 'utf-8' if truncated else 'iso-8859-1'
+    head = data[:32].lstrip().lower()
+    for prefix, mime in signatures:
+        if head.startswith(prefix):
+            return '%s; charset=%s' % (mime, charset)
+    return 'text/plain; charset=%s' % charset
+
+
+magic_pool_lock = threading.Lock()
+magic_pool = None
+
+
+def by_magic_batch(paths, workers=magic_workers):
+    '''
+    Get mimetypes of given paths by sniffing their content (see
+    :func:`by_magic`), using a shared thread pool for big batches.
+
+    :param paths: list of paths
+    :type paths: list of str
+    :param workers: pool size
+    :type workers: int
+    :returns: list of mimetypes or None
+    :rtype: list of str or None
+    '''
+    global magic_pool
+    if len(paths) < workers * 2:
+        return list(map(by_magic, paths))
+    with magic_pool_lock:
+        if magic_pool is None:
+            magic_pool = multiprocessing.pool.ThreadPool(workers)
+    return magic_pool.map(by_magic, paths)
+
+
+@batch(by_magic_batch)
+def by_magic(path, size=magic_size):
+    '''
+    Get mimetype of given file by sniffing its first bytes, without
+    spawning any process: checking :data:`magic_signatures` first, then
+    libmagic if available, and text heuristics (see :func:`sniff_text`)
+    otherwise.
+
+    Only regular files are opened, as reading from fifos or devices could
+    block forever: those get their `inode/*` type (see
+    :data:`inode_signatures`) instead.
+
+    :param path: file path
+    :type path: str
+    :param size: number of bytes to read
+    :type size: int
+    :returns: mimetype, or None if unknown or not readable
+    :rtype: str or None
+    '''
+    try:
+        mode = os.stat(path).st_mode
+        if not stat.S_ISREG(mode):
+            for test, mime in inode_signatures:
+                if test(mode):
+                    return '%s; charset=binary' % mime
+            return None
+        with open(path, 'rb') as f:
+            data = f.read(size)
+    except (IOError, OSError):
+        return None
+    if not data:
+        return 'inode/x-empty; charset=binary'
+    mime = sniff_signature(data)
+    if mime:
+        return mime
+    if libmagic:
+        mime = libmagic.buffer(data)
+        if mime and mime.split(';', 1)[0] not in generic_mimetypes:
+            return mime
+        return None
+    return sniff_text(data)
+
+
 def by_default(path):
     return "application/octet-stream"
@@ -0,0 +1,563 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import os.path
+import re
+import time
+import array
+import bisect
+import fnmatch
+import logging
+import threading
+import collections
+
+from . import compat
+
+logger = logging.getLogger(__name__)
+
+DirectoryState = collections.namedtuple(
+    'DirectoryState',
+    ('mtime', 'children')
+    )
+
+glob_special = re.compile(r'\[[^\]]*\]?|[*?]')
+
+
+def trigrams(text):
+    '''
+    Get set of three-character substrings of given text.
+
+    :param text: text
+    :type text: str
+    :rtype: set of str
+    '''
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+def glob_literals(pattern):
+    '''
+    Get literal fragments of given glob pattern, those every matching
+    string must contain.
+
+    :param pattern: glob pattern
+    :type pattern: str
+    :rtype: list of str
+    '''
+    return [part for part in glob_special.split(pattern) if part]
+
+
+class NameIndex(object):
+    '''
+    Compact index of entry names, searchable by substring or glob pattern,
+    case-insensitively.
+
+    Entries are stored as name, parent entry id and kind, on flat lists
+    and arrays, their ids being positions. Every lowercase name trigram
+    maps to a sorted array of the ids of the entries containing it, so
+    only entries containing all query trigrams are checked, see
+    :meth:`indexed`.
+
+    Removed entries are just forgotten until :meth:`compact` is called,
+    which renumbers live entries, something worth doing once removed
+    entries outnumber live ones (see :attr:`sparse`).
+    '''
+    def __init__(self):
+        self.names = []
+        self.parents = array.array('l')
+        self.kinds = bytearray()
+        self.trigrams = {}
+        self.removed = 0
+
+    def __len__(self):
+        return len(self.names) - self.removed
+
+    @property
+    def sparse(self):
+        '''
+        Whether removed entries outnumber live ones.
+        '''
+        return self.removed > len(self)
+
+    def add(self, name, parent=-1, is_dir=False, is_link=False):
+        '''
+        Add entry.
+
+        :param name: entry name
+        :type name: str
+        :param parent: parent directory entry id, -1 meaning none
+        :type parent: int
+        :param is_dir: whether entry is (or links to) a directory
+        :type is_dir: bool
+        :param is_link: whether entry is a symlink
+        :type is_link: bool
+        :returns: entry id
+        :rtype: int
+        '''
+        ident = len(self.names)
+        self.names.append(name)
+        self.parents.append(parent)
+        self.kinds.append((1 if is_dir else 0) | (2 if is_link else 0))
+        for trigram in trigrams(name.lower()):
+            postings = self.trigrams.get(trigram)
+            if postings is None:
+                postings = self.trigrams[trigram] = array.array('L')
+            postings.append(ident)
+        return ident
+
+    def remove(self, ident):
+        '''
+        Remove entry.
+
+        :param ident: entry id
+        :type ident: int
+        '''
+        if self.names[ident] is None:
+            return
+        self.names[ident] = None
+        self.removed += 1
+
+    def compact(self):
+        '''
+        Drop removed entries, renumbering live ones (keeping their order)
+        and rebuilding trigram arrays.
+
+        :returns: array mapping old entry ids to new ones, -1 for removed
+        :rtype: array.array
+        '''
+        remap = array.array('l')
+        names = []
+        for name in self.names:
+            remap.append(len(names) if name is not None else -1)
+            if name is not None:
+                names.append(name)
+        parents = array.array('l')
+        kinds = bytearray()
+        for ident, parent in enumerate(self.parents):
+            if remap[ident] >= 0:
+                parents.append(remap[parent] if parent >= 0 else -1)
+                kinds.append(self.kinds[ident])
+        compacted = {}
+        for trigram, postings in self.trigrams.items():
+            postings = array.array('L', (
+                remap[ident] for ident in postings if remap[ident] >= 0))
+            if postings:
+                compacted[trigram] = postings
+        self.names = names
+        self.parents = parents
+        self.kinds = kinds
+        self.trigrams = compacted
+        self.removed = 0
+        return remap
+
+    def copy(self):
+        '''
+        Get a copy of this index entries, without trigram arrays, so
+        searching it checks every entry. Meant for searches not using
+        trigrams anyway (see :meth:`indexed`), which can then run without
+        blocking index updates.
+
+        :rtype: NameIndex
+        '''
+        index = self.__class__()
+        index.names = list(self.names)
+        index.parents = self.parents[:]
+        index.kinds = self.kinds[:]
+        index.trigrams = None
+        index.removed = self.removed
+        return index
+
+    def is_dir(self, ident):
+        '''
+        Get whether given entry is (or links to) a directory.
+
+        :param ident: entry id
+        :type ident: int
+        :rtype: bool
+        '''
+        return bool(self.kinds[ident] & 1)
+
+    def is_link(self, ident):
+        '''
+        Get whether given entry is a symlink.
+
+        :param ident: entry id
+        :type ident: int
+        :rtype: bool
+        '''
+        return bool(self.kinds[ident] & 2)
+
+    def path(self, ident):
+        '''
+        Get slash-separated path of given entry, relative to indexed tree.
+
+        :param ident: entry id
+        :type ident: int
+        :rtype: str
+        '''
+        parts = []
+        while ident >= 0:
+            parts.append(self.names[ident])
+            ident = self.parents[ident]
+        return '/'.join(reversed(parts))
+
+    def candidates(self, literals):
+        '''
+        Iterate through ids of entries whose names could contain all given
+        literals, based on their trigrams, or all of them if none is long
+        enough (or this index has no trigram arrays, see :meth:`copy`).
+
+        :param literals: lowercase substrings
+        :type literals: iterable of str
+        :yields: entry ids
+        :ytype: int
+        '''
+        keys = set()
+        for literal in literals:
+            keys.update(trigrams(literal))
+        if not keys or self.trigrams is None:
+            for ident in compat.range(len(self.names)):
+                yield ident
+            return
+        postings = sorted(
+            (self.trigrams.get(key, ()) for key in keys),
+            key=len
+            )
+        first, others = postings[0], postings[1:]
+        for ident in first:
+            for other in others:
+                position = bisect.bisect_left(other, ident)
+                if position == len(other) or other[position] != ident:
+                    break
+            else:
+                yield ident
+
+    def _query(self, query):
+        query = query.lower()
+        head, slash, tail = query.rpartition('/')
+        if any(char in query for char in '*?['):
+            literals = glob_literals(tail)
+
+            def match_name(name):
+                return fnmatch.fnmatchcase(name, tail)
+
+            def match_parent(path):
+                return fnmatch.fnmatchcase(path, head)
+        elif slash:
+            literals = [tail]
+
+            def match_name(name):
+                return name.startswith(tail)
+
+            def match_parent(path):
+                return path.endswith(head)
+        else:
+            literals = [tail]
+            match_parent = None
+
+            def match_name(name):
+                return tail in name
+
+        return literals, match_name, match_parent if slash else None
+
+    def indexed(self, query):
+        '''
+        Get whether searching given query (see :meth:`search`) only checks
+        entries containing its trigrams, instead of every entry, as it
+        happens with queries without literals of three characters or more.
+
+        :param query: substring or glob pattern
+        :type query: str
+        :rtype: bool
+        '''
+        literals, match_name, match_parent = self._query(query)
+        return any(len(literal) > 2 for literal in literals)
+
+    def search(self, query, limit=None):
+        '''
+        Get ids of entries matching given query, case-insensitively.
+
+        Queries containing glob special characters (`*`, `?` and `[`)
+        are glob patterns, any other being a substring, matched against
+        entry names.
+
+        Queries containing slashes are matched against entry paths
+        instead, with their last slash being the one right before entry
+        names: the part after it matches the start of the name (or the
+        whole name, for glob patterns), and the part before it the end
+        of the parent path (or the whole parent path, for glob patterns).
+
+        :param query: substring or glob pattern
+        :type query: str
+        :param limit: maximum number of results, defaults to None
+        :type limit: int or None
+        :returns: entry ids
+        :rtype: list of int
+        '''
+        literals, match_name, match_parent = self._query(query)
+        names = self.names
+        parents = self.parents
+        results = []
+        for ident in self.candidates(literals):
+            name = names[ident]
+            if name is None or not match_name(name.lower()):
+                continue
+            if match_parent and not match_parent(
+                    self.path(parents[ident]).lower()):
+                continue
+            results.append(ident)
+            if len(results) == limit:
+                break
+        return results
+
+
+class FilenameIndex(object):
+    '''
+    Application-wide filename index of `directory_base` (see
+    :class:`NameIndex`), honoring `exclude_fnc`, shared by requests and
+    threads.
+
+    Index is built in background on first use, and refreshed the same way
+    once older than `filename_index_ttl` seconds (app config), searches
+    meanwhile using its current state. Refreshes only relist
+    directories whose modification time changed, so they cost a single
+    stat call per unchanged directory. Directory symlinks are indexed (as
+    directories) but not followed.
+
+    Searches not using trigrams (see :meth:`NameIndex.indexed`) run on a
+    copy of the index, so they do not block index updates.
+
+    This class is a Flask extension, available at
+    `app.extensions['filename_index']` after :meth:`init_app`.
+    '''
+    index_class = NameIndex
+    lock_class = threading.Lock
+    event_class = threading.Event
+    thread_class = threading.Thread
+    clock = staticmethod(time.time)
+    default_ttl = 300
+    racy_seconds = 2  # mtime resolution margin, see :meth:`_crawl`
+
+    @property
+    def config(self):
+        '''
+        App config, or an empty dict if not initialized for any app.
+        '''
+        return self.app.config if self.app else {}
+
+    @property
+    def ttl(self):
+        '''
+        Seconds index is trusted without refreshing, taken from app's
+        `filename_index_ttl` config.
+        '''
+        return self.config.get('filename_index_ttl', self.default_ttl)
+
+    @property
+    def ready(self):
+        '''
+        Whether index was fully built at least once.
+        '''
+        return self._ready.is_set()
+
+    def __init__(self, app=None):
+        '''
+        :param app: optional flask application
+        :type app: flask.Flask
+        '''
+        self.app = None
+        self.index = self.index_class()
+        self.updated = None
+        self._source = None
+        self._directories = {}
+        self._updating = False
+        self._ready = self.event_class()
+        self._lock = self.lock_class()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        '''
+        Initialize this Flask extension for given app.
+        '''
+        self.app = app
+        if not hasattr(app, 'extensions'):
+            app.extensions = {}
+        app.extensions['filename_index'] = self
+
+    def update(self, timeout=None):
+        '''
+        Refresh index in background if it is older than :attr:`ttl`,
+        waiting up to given timeout if it was never built.
+
+        Index is rebuilt from scratch when app's `directory_base` or
+        `exclude_fnc` config changes.
+
+        :param timeout: seconds to wait for first build, defaults to None
+                        (no limit)
+        :type timeout: int, float or None
+        :returns: whether index is ready, see :attr:`ready`
+        :rtype: bool
+        '''
+        config = self.config
+        source = (config.get('directory_base'), config.get('exclude_fnc'))
+        with self._lock:
+            if source != self._source and not self._updating:
+                self.index = self.index_class()
+                self.updated = None
+                self._source = source
+                self._directories = {}
+                self._ready.clear()
+            start = not self._updating and (
+                self.updated is None or
+                self.clock() - self.updated >= self.ttl
+                )
+            if start:
+                self._updating = True
+        if start:
+            thread = self.thread_class(target=self._update, args=source)
+            thread.daemon = True
+            thread.start()
+        return self._ready.wait(timeout)
+
+    def _update(self, base, exclude):
+        try:
+            self._crawl(base, exclude)
+        except Exception:
+            logger.exception('Cannot update filename index')
+        finally:
+            with self._lock:
+                self.updated = self.clock()
+                self._updating = False
+            self._ready.set()
+
+    def _listdir(self, path, exclude):
+        '''
+        Get directory entries, honoring given exclude function.
+
+        :param path: directory path
+        :type path: str
+        :param exclude: optional exclude function
+        :type exclude: callable or None
+        :returns: mapping of entry names and tuples of whether they are
+                  (or link to) directories and whether they are symlinks
+        :rtype: dict
+        '''
+        try:
+            return dict(
+                (entry.name, (entry.is_dir(), entry.is_symlink()))
+                for entry in compat.scandir(path)
+                if not (exclude and exclude(entry.path))
+                )
+        except OSError as e:
+            logger.debug('Cannot list %s: %s', path, e)
+            return {}
+
+    def _crawl(self, base, exclude):
+        '''
+        Walk given directory tree, relisting directories which are new or
+        whose modification time changed, applying their changes to index,
+        compacting it afterwards if needed.
+
+        Modification times too close to listing time are not trusted, as
+        entries could be added within filesystem's time resolution.
+
+        :param base: base directory path
+        :type base: str
+        :param exclude: optional exclude function
+        :type exclude: callable or None
+        '''
+        if not base:
+            return
+        stack = [(base, -1)]
+        while stack:
+            path, parent = stack.pop()
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:  # removed, parent relisting will drop it
+                continue
+            state = self._directories.get(path)
+            if state is None or state.mtime != mtime:
+                listing = self._listdir(path, exclude)
+                if self.clock() - mtime < self.racy_seconds:
+                    mtime = None
+                with self._lock:
+                    state = self._apply(path, parent, state, listing, mtime)
+            for name, (ident, is_dir, is_link) in sorted(
+                    state.children.items(), reverse=True):
+                if is_dir and not is_link:
+                    stack.append((os.path.join(path, name), ident))
+        with self._lock:
+            if self.index.sparse:
+                self._compact()
+
+    def _apply(self, path, parent, state, listing, mtime):
+        old = state.children if state else {}
+        children = {}
+        for name, (is_dir, is_link) in sorted(listing.items()):
+            item = old.get(name)
+            if item is None or item[1:] != (is_dir, is_link):
+                ident = self.index.add(name, parent, is_dir, is_link)
+                item = (ident, is_dir, is_link)
+            children[name] = item
+        for name, (ident, is_dir, is_link) in old.items():
+            if children.get(name) != (ident, is_dir, is_link):
+                if is_dir and not is_link:
+                    self._drop(os.path.join(path, name))
+                self.index.remove(ident)
+        state = self._directories[path] = DirectoryState(mtime, children)
+        return state
+
+    def _drop(self, path):
+        state = self._directories.pop(path, None)
+        if state:
+            for name, (ident, is_dir, is_link) in state.children.items():
+                if is_dir and not is_link:
+                    self._drop(os.path.join(path, name))
+                self.index.remove(ident)
+
+    def _compact(self):
+        '''
+        Compact index (see :meth:`NameIndex.compact`), renumbering entry
+        ids on directory states accordingly.
+        '''
+        remap = self.index.compact()
+        self._directories = dict(
+            (path, DirectoryState(state.mtime, dict(
+                (name, (remap[ident], is_dir, is_link))
+                for name, (ident, is_dir, is_link) in state.children.items()
+                )))
+            for path, state in self._directories.items()
+            )
+
+    def search(self, query, limit=None, timeout=None):
+        '''
+        Get entries matching given query (see :meth:`NameIndex.search`),
+        refreshing index if needed (see :meth:`update`).
+
+        :param query: substring or glob pattern
+        :type query: str
+        :param limit: maximum number of results, defaults to None
+        :type limit: int or None
+        :param timeout: seconds to wait for first build, defaults to None
+                        (no limit)
+        :type timeout: int, float or None
+        :returns: sorted list of slash-separated paths relative to
+                  `directory_base` and whether they are directories
+        :rtype: list of tuple
+        '''
+        self.update(timeout)
+        with self._lock:
+            index = self.index
+            if index.indexed(query):
+                return self._results(index, query, limit)
+            index = index.copy()
+        return self._results(index, query, limit)
+
+    def _results(self, index, query, limit):
+        results = [
+            (index.path(ident), index.is_dir(ident))
+            for ident in index.search(query, limit)
+            ]
+        results.sort()
+        return results
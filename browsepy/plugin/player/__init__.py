@@ -11,7 +11,7 @@ from browsepy import stream_template, get_cookie_browse_sorting, \
 from browsepy.file import OutsideDirectoryBase
 
 from .playable import PlayableFile, PlayableDirectory, \
-                      PlayListFile, detect_playable_mimetype
+                      PlayListFile, PlayableBase
 
 
 __basedir__ = os.path.dirname(os.path.abspath(__file__))
@@ -98,7 +98,7 @@ def register_plugin(manager):
     :type manager: browsepy.manager.PluginManager
     '''
     manager.register_blueprint(player)
-    manager.register_mimetype_function(detect_playable_mimetype)
+    manager.register_mimetype_extensions(PlayableBase.extensions)
 
     # add style tag
     manager.register_widget(
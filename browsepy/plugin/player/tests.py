@@ -22,6 +22,7 @@ class ManagerMock(object):
     def __init__(self):
         self.blueprints = []
         self.mimetype_functions = []
+        self.mimetype_extensions = {}
         self.widgets = []
         self.arguments = []
         self.argument_values = {}
@@ -32,6 +33,9 @@ class ManagerMock(object):
     def register_mimetype_function(self, fnc):
         self.mimetype_functions.append(fnc)
 
+    def register_mimetype_extensions(self, extensions):
+        self.mimetype_extensions.update(extensions)
+
     def register_widget(self, **kwargs):
         self.widgets.append(kwargs)
 
@@ -70,9 +74,9 @@ class TestPlayer(TestPlayerBase):
         self.assertListEqual(self.manager.arguments, [])
 
         self.assertIn(self.module.player, self.manager.blueprints)
-        self.assertIn(
-            self.module.playable.detect_playable_mimetype,
-            self.manager.mimetype_functions
+        self.assertEqual(
+            self.manager.mimetype_extensions,
+            self.module.playable.PlayableBase.extensions
             )
 
         widgets = [
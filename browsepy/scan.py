@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import os.path
+import datetime
+import collections
+
+from . import compat
+from .cache import LRUCache
+
+
+class EntrySnapshot(object):
+    '''
+    Compact summary of a directory entry, as taken by :func:`snapshot`.
+
+    Instances have no `__dict__`, and their `dirname` (the parent directory
+    path) is meant to be shared by all entries of the same listing, so big
+    listings are cheap to keep in memory, sort and cache.
+    '''
+    __slots__ = ('dirname', 'name', 'is_dir', 'size', 'mtime', 'subdirs',
+                 'logs')
+
+    @property
+    def path(self):
+        '''
+        Get entry absolute path.
+
+        :returns: path
+        :rtype: str
+        '''
+        return os.path.join(self.dirname, self.name)
+
+    def __init__(self, dirname, name, is_dir, size, mtime, subdirs, logs):
+        '''
+        :param dirname: parent directory path
+        :type dirname: str
+        :param name: entry name
+        :type name: str
+        :param is_dir: whether entry is a directory (following symlinks)
+        :type is_dir: bool
+        :param size: size in bytes, or None if not stat'able
+        :type size: int or None
+        :param mtime: modification time, or None if not stat'able
+        :type mtime: float or None
+        :param subdirs: number of subdirectories
+        :type subdirs: int
+        :param logs: names of satisfied log rules
+        :type logs: frozenset of str
+        '''
+        self.dirname = dirname
+        self.name = name
+        self.is_dir = is_dir
+        self.size = size
+        self.mtime = mtime
+        self.subdirs = subdirs
+        self.logs = logs
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self.path)
+
+
+LogRule = collections.namedtuple(
+    'LogRule',
+    ('name', 'subpath', 'prefix', 'date_format', 'lookback')
+    )
+LogRule.__new__.__defaults__ = (1,)  # lookback, in days before today
+
+default_log_rules = (
+    LogRule('http', 'data/goprobe', 'httplog_', '%Y-%m-%d'),
+    LogRule('pppauth', 'data/goprobe', 'pppauth_', '%Y-%m-%d'),
+    LogRule('master', 'vpnserver/master/server_log', 'vpn_', '%Y%m%d'),
+    LogRule('cluster', 'vpnserver/cluster/0/server_log', 'vpn_', '%Y%m%d'),
+    )
+
+subdirs_cache = LRUCache(maxsize=4096)  # see :func:`count_subdirs`
+interned_logs = {}  # see :func:`snapshot`
+
+
+def log_rule(rule):
+    '''
+    Get :class:`LogRule` from given rule definition, as found on app's
+    `log_rules` config.
+
+    :param rule: mapping of LogRule fields, or sequence of them
+    :type rule: collections.abc.Mapping or collections.abc.Sequence
+    :returns: log rule
+    :rtype: LogRule
+    '''
+    if isinstance(rule, LogRule):
+        return rule
+    if isinstance(rule, dict):
+        return LogRule(**rule)
+    return LogRule(*rule)
+
+
+def lookback_dates(rule, now=None):
+    '''
+    Get dates inside rule's lookback window, starting from yesterday.
+
+    :param rule: log rule
+    :type rule: LogRule
+    :param now: optional reference datetime, defaults to current one
+    :type now: datetime.datetime or None
+    :returns: dates, nearest first
+    :rtype: list of datetime.date
+    '''
+    today = (now or datetime.datetime.now()).date()
+    return [
+        today - datetime.timedelta(days=days)
+        for days in range(1, max(rule.lookback, 1) + 1)
+        ]
+
+
+def listdir(path):
+    '''
+    Get entry names of given directory, or an empty tuple if it cannot be
+    listed (ie. it does not exist or it is not a directory).
+
+    :param path: absolute path
+    :type path: str
+    :returns: entry names
+    :rtype: list or tuple of str
+    '''
+    try:
+        return os.listdir(path)
+    except OSError:
+        return ()
+
+
+def check_logs(path, names=None, rules=default_log_rules, now=None):
+    '''
+    Get which log rules are satisfied under given directory, that is, which
+    log families have files for any date inside their lookback window.
+
+    Every distinct subpath is listed once, no matter how many rules use it.
+    If `names` (the directory own entry names) is given, subpaths whose
+    first component is not there are skipped without touching disk.
+
+    This is used when no :class:`browsepy.logindex.LogIndex` is available.
+
+    :param path: absolute directory path
+    :type path: str
+    :param names: optional collection of entry names of given directory
+    :type names: collections.abc.Container or None
+    :param rules: iterable of log rules
+    :type rules: iterable of LogRule
+    :param now: optional reference datetime, defaults to current one
+    :type now: datetime.datetime or None
+    :returns: names of satisfied log rules
+    :rtype: frozenset of str
+    '''
+    listings = {}
+    found = set()
+    for rule in rules:
+        if rule.subpath not in listings:
+            components = rule.subpath.split('/')
+            listings[rule.subpath] = (
+                ()
+                if names is not None and components[0] not in names else
+                listdir(os.path.join(path, *components))
+                )
+        dates = [
+            date.strftime(rule.date_format)
+            for date in lookback_dates(rule, now)
+            ]
+        for filename in listings[rule.subpath]:
+            if filename.startswith(rule.prefix) and \
+              any(date in filename for date in dates):
+                found.add(rule.name)
+                break
+    return frozenset(found)
+
+
+def stat_key(path, stats):
+    '''
+    Get cache key identifying given path's current state, made of path,
+    modification time in nanoseconds and inode number.
+
+    :param path: path
+    :type path: str
+    :param stats: path stats
+    :type stats: os.stat_result
+    :returns: cache key
+    :rtype: tuple
+    '''
+    mtime_ns = getattr(stats, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(stats.st_mtime * 1e9)
+    return (path, mtime_ns, stats.st_ino)
+
+
+def scan_subdirs(path):
+    '''
+    Scan directory once, counting its subdirectories using scandir entries'
+    cached type info.
+
+    :param path: directory path
+    :type path: str
+    :returns: tuple of subdirectory count and entry names
+    :rtype: tuple of int and set of str
+    '''
+    subdirs = 0
+    names = set()
+    try:
+        for child in compat.scandir(path):
+            names.add(child.name)
+            if child.is_dir(follow_symlinks=True):
+                subdirs += 1
+    except OSError:
+        pass
+    return subdirs, names
+
+
+def count_subdirs(path, stats=None, cache=subdirs_cache):
+    '''
+    Get number of subdirectories of given directory, cached by path,
+    modification time and inode (see :func:`stat_key`) so directories are
+    only rescanned after being modified.
+
+    :param path: directory path
+    :type path: str
+    :param stats: optional directory stats, to avoid calling :func:`os.stat`
+    :type stats: os.stat_result or None
+    :param cache: cache shared across calls, defaults to
+                  :data:`subdirs_cache`
+    :type cache: browsepy.cache.LRUCache
+    :returns: tuple of subdirectory count and entry names, or None instead
+              of names if count was cached
+    :rtype: tuple of int and set of str or None
+    '''
+    try:
+        key = stat_key(path, stats or os.stat(path))
+    except OSError:
+        return 0, set()
+    subdirs = cache.get(key)
+    if subdirs is not None:
+        return subdirs, None
+    subdirs, names = scan_subdirs(path)
+    cache.set(key, subdirs)
+    return subdirs, names
+
+
+def snapshot(entry, logs_fnc=check_logs, dirname=None):
+    '''
+    Take snapshot of given scandir entry, reusing its cached type and stat
+    info.
+
+    Directories are scanned at most once, with their entries being used for
+    both counting subdirectories and pruning log checks, and not at all if
+    their subdirectory count is cached (see :func:`count_subdirs`).
+
+    Log rule name sets are interned, so snapshots with the same log checks
+    share them.
+
+    :param entry: scandir entry
+    :type entry: os.DirEntry
+    :param logs_fnc: log checking function, receiving both directory path
+                     and its entry names (or None if unknown), defaults to
+                     :func:`check_logs`
+    :type logs_fnc: callable
+    :param dirname: parent directory path, to be shared by snapshots,
+                    defaults to entry's one
+    :type dirname: str or None
+    :returns: entry snapshot, with null size and mtime if not stat'able
+    :rtype: EntrySnapshot
+    '''
+    is_dir = entry.is_dir(follow_symlinks=True)
+    try:
+        stats = entry.stat(follow_symlinks=True)
+        size, mtime = stats.st_size, stats.st_mtime
+    except OSError:  # broken symlink
+        stats = size = mtime = None
+    subdirs = 0
+    logs = frozenset()
+    if is_dir and stats:
+        subdirs, names = count_subdirs(entry.path, stats)
+        logs = logs_fnc(entry.path, names)
+    logs = interned_logs.setdefault(logs, logs)
+    return EntrySnapshot(
+        os.path.dirname(entry.path) if dirname is None else dirname,
+        entry.name, is_dir, size, mtime, subdirs, logs)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import os.path
+import binascii
+import calendar
+import mimetypes
+
+from werkzeug.http import http_date, parse_date, parse_etags, quote_etag
+from werkzeug.wsgi import wrap_file
+
+from .stream import SegmentStream
+
+
+def file_etag(stats):
+    '''
+    Get strong entity tag for file with given stats, made of its inode,
+    modification time in nanoseconds and size.
+
+    :param stats: file stats
+    :type stats: os.stat_result
+    :returns: unquoted entity tag
+    :rtype: str
+    '''
+    mtime_ns = getattr(stats, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(stats.st_mtime * 1e9)
+    return '%x-%x-%x' % (stats.st_ino, mtime_ns, stats.st_size)
+
+
+def parse_ranges(value, size, max_ranges=64):
+    '''
+    Parse HTTP Range header value for a file of given size, into sorted
+    non-overlapping byte ranges (overlapping or adjacent ones are merged).
+
+    Invalid headers, non-byte units and those with more than `max_ranges`
+    ranges are ignored, as RFC 7233 allows.
+
+    :param value: Range header value
+    :type value: str or None
+    :param size: file size
+    :type size: int
+    :param max_ranges: maximum number of ranges, defaults to 64
+    :type max_ranges: int
+    :returns: list of start and stop offsets, empty if none can be
+              satisfied, or None if header must be ignored
+    :rtype: list of tuple of int, or None
+    '''
+    if not value:
+        return None
+    unit, sep, spec = value.partition('=')
+    if not sep or unit.strip().lower() != 'bytes':
+        return None
+    items = [item.strip() for item in spec.split(',') if item.strip()]
+    if not items or len(items) > max_ranges:
+        return None
+    ranges = []
+    for item in items:
+        first, sep, last = item.partition('-')
+        first, last = first.strip(), last.strip()
+        if not sep:
+            return None
+        elif first.isdigit() and (not last or last.isdigit()):
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            stop = int(last) + 1 if last else size
+        elif not first and last.isdigit():  # suffix range
+            start = max(size - int(last), 0)
+            stop = size if int(last) else 0
+        else:
+            return None
+        if start < size and start < stop:
+            ranges.append((start, min(stop, size)))
+    ranges.sort()
+    merged = ranges[:1]
+    for start, stop in ranges[1:]:
+        if start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(stop, merged[-1][1]))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+class FileRangeStream(SegmentStream):
+    '''
+    Stream of given byte ranges of a file, sent as they are when there is
+    only one, or as a `multipart/byteranges` body otherwise.
+
+    See :class:`browsepy.stream.SegmentStream` for how this stream is sent.
+    '''
+
+    def __init__(self, path, ranges, size, mimetype, buffsize=10240):
+        '''
+        :param path: file path
+        :type path: str
+        :param ranges: start and stop offsets, see :func:`parse_ranges`
+        :type ranges: list of tuple of int
+        :param size: file size
+        :type size: int
+        :param mimetype: file mimetype, for multipart bodies
+        :type mimetype: str
+        :param buffsize: read block size on bytes, defaults to 10KiB
+        :type buffsize: int
+        '''
+        self.path = path
+        self.ranges = ranges
+        self.size = size
+        self.buffsize = buffsize
+        self.boundary = binascii.hexlify(os.urandom(16)).decode('ascii')
+        self.mimetype = (
+            'multipart/byteranges; boundary=%s' % self.boundary
+            if len(ranges) > 1 else
+            mimetype
+            )
+        self._part_mimetype = mimetype
+        self.length = sum(
+            len(segment) if isinstance(segment, bytes) else segment[2]
+            for segment in self.segments()
+            )
+
+    @property
+    def content_range(self):
+        '''
+        Content-Range header value for single range streams, or None.
+        '''
+        if len(self.ranges) != 1:
+            return None
+        start, stop = self.ranges[0]
+        return 'bytes %d-%d/%d' % (start, stop - 1, self.size)
+
+    def segments(self):
+        '''
+        Iterate through stream segments, multipart headers and file
+        ranges.
+
+        :yields: bytes or tuple of path, offset and size
+        :ytype: bytes or tuple
+        '''
+        if len(self.ranges) == 1:
+            start, stop = self.ranges[0]
+            yield self.path, start, stop - start
+            return
+        for i, (start, stop) in enumerate(self.ranges):
+            yield (
+                '%s--%s\r\n'
+                'Content-Type: %s\r\n'
+                'Content-Range: bytes %d-%d/%d\r\n'
+                '\r\n' % (
+                    '\r\n' if i else '',
+                    self.boundary,
+                    self._part_mimetype,
+                    start, stop - 1, self.size,
+                    )
+                ).encode('latin-1')
+            yield self.path, start, stop - start
+        yield ('\r\n--%s--\r\n' % self.boundary).encode('latin-1')
+
+
+def not_modified(request, etag, mtime):
+    '''
+    Get whether given request conditions (If-None-Match or, if absent,
+    If-Modified-Since) match a file with given entity tag and modification
+    time, so a 304 response is due.
+
+    :param request: flask request
+    :type request: flask.Request
+    :param etag: unquoted entity tag
+    :type etag: str
+    :param mtime: modification time, in seconds
+    :type mtime: float
+    :rtype: bool
+    '''
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return etags.star_tag or etags.contains_weak(etag)
+    if_modified_since = parse_date(request.headers.get('If-Modified-Since'))
+    return (
+        if_modified_since is not None and
+        int(mtime) <= timegm(if_modified_since)
+        )
+
+
+def range_allowed(request, etag, mtime):
+    '''
+    Get whether Range header must be honored, based on If-Range request
+    condition (either a strong entity tag or a date).
+
+    :param request: flask request
+    :type request: flask.Request
+    :param etag: unquoted entity tag
+    :type etag: str
+    :param mtime: modification time, in seconds
+    :type mtime: float
+    :rtype: bool
+    '''
+    if_range = request.headers.get('If-Range', '').strip()
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == quote_etag(etag)
+    date = parse_date(if_range)
+    return date is not None and int(mtime) == timegm(date)
+
+
+def timegm(date):
+    '''
+    Get epoch seconds of given naive UTC datetime.
+
+    :param date: UTC datetime, as returned by :func:`werkzeug.http.parse_date`
+    :type date: datetime.datetime
+    :rtype: int
+    '''
+    return calendar.timegm(date.utctimetuple())
+
+
+def serve_file(app, request, path, as_attachment=False, buffsize=None):
+    '''
+    Get a Flask Response object serving given file, honoring conditional
+    (If-None-Match, If-Modified-Since and If-Range) and Range (single and
+    multiple) request headers.
+
+    Whole files are sent using `wsgi.file_wrapper` when available (which
+    allows servers to use :func:`os.sendfile`), while ranges are sent using
+    :class:`FileRangeStream`.
+
+    :param app: flask application
+    :type app: flask.Flask
+    :param request: flask request
+    :type request: flask.Request
+    :param path: file path
+    :type path: str
+    :param as_attachment: whether file should be downloaded
+    :type as_attachment: bool
+    :param buffsize: read block size on bytes, defaults to app's
+                     `file_serve_buffsize` config
+    :type buffsize: int or None
+    :returns: Response object
+    :rtype: flask.Response
+    :raises OSError: if file cannot be read
+    '''
+    name = os.path.basename(path)
+    buffsize = buffsize or app.config.get('file_serve_buffsize', 262144)
+    mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    f = open(path, 'rb')
+    try:
+        stats = os.fstat(f.fileno())
+        etag = file_etag(stats)
+        status = 200
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'Last-Modified': http_date(stats.st_mtime),
+            }
+        ranges = None
+        if not_modified(request, etag, stats.st_mtime):
+            f.close()
+            status = 304
+            body = ()
+        else:
+            if range_allowed(request, etag, stats.st_mtime):
+                ranges = parse_ranges(
+                    request.headers.get('Range'), stats.st_size)
+            if ranges is None:
+                body = wrap_file(request.environ, f, buffsize)
+                headers['Content-Length'] = str(stats.st_size)
+            elif not ranges:
+                f.close()
+                status = 416
+                body = ()
+                headers['Content-Range'] = 'bytes */%d' % stats.st_size
+            else:
+                f.close()
+                stream = FileRangeStream(
+                    path, ranges, stats.st_size, mimetype, buffsize)
+                status = 206
+                body = stream.wsgi_iterable(request.environ)
+                mimetype = stream.mimetype
+                headers['Content-Length'] = str(stream.length)
+                if stream.content_range:
+                    headers['Content-Range'] = stream.content_range
+    except BaseException:
+        f.close()
+        raise
+    response = app.response_class(
+        body,
+        status=status,
+        headers=headers,
+        mimetype=mimetype,
+        direct_passthrough=True,
+        )
+    response.set_etag(etag)
+    if as_attachment:
+        response.headers.add(
+            'Content-Disposition', 'attachment', filename=name)
+    max_age = app.get_send_file_max_age(name)
+    response.cache_control.public = True
+    if max_age:
+        response.cache_control.max_age = max_age
+    return response
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+def parse_property(prop):
+    '''
+    Split sorting property (as stored in `browse-sorting` cookie) into
+    attribute name and reverse flag.
+
+    :param prop: sorting property, prefixed with `-` if descending
+    :type prop: str
+    :returns: tuple with attribute name and reverse bool
+    :rtype: tuple of str and bool
+    '''
+    if prop.startswith('-'):
+        return prop[1:], True
+    return prop, False
+
+
+def logs_mask(logs, names):
+    '''
+    Get bitmask of satisfied log rules, with first rule as most significant
+    bit, so masks sort by first rule, then by second and so on.
+
+    :param logs: names of satisfied log rules
+    :type logs: frozenset of str
+    :param names: log rule names, in order
+    :type names: list of str
+    :returns: bitmask
+    :rtype: int
+    '''
+    mask = 0
+    for name in names:
+        mask = (mask << 1) | (name in logs)
+    return mask
+
+
+def snapshot_keyfunc(prop, manager=None, snapshots=None):
+    '''
+    Get function returning raw sorting value of given property for an entry
+    snapshot (see :class:`browsepy.scan.EntrySnapshot`), made of numbers or
+    normalized strings taken from snapshot data only:
+
+    * *text*: lowercase name.
+    * *size*: size in bytes.
+    * *modified*: modification timestamp.
+    * *subdirs*: subdirectory count.
+    * *logcheck*: satisfied log rules bitmask (see :func:`logs_mask`).
+    * *type*: mimetype (requires plugin manager).
+
+    Unknown or missing values (ie. broken symlinks) sort first as -1.
+
+    When snapshots being sorted are given, mimetypes of all of them are
+    resolved at once (see
+    :meth:`browsepy.manager.MimetypePluginManager.get_mimetypes`) instead
+    of once per key call.
+
+    :param prop: attribute name
+    :type prop: str
+    :param manager: optional plugin manager, for log rules and mimetypes
+    :type manager: browsepy.manager.PluginManager or None
+    :param snapshots: optional snapshots to be sorted, for mimetypes
+    :type snapshots: iterable of browsepy.scan.EntrySnapshot or None
+    :returns: key function or None if property is not supported
+    :rtype: callable or None
+    '''
+    if prop == 'text':
+        return lambda x: x.name.lower()
+    if prop in ('size', 'modified'):
+        attr = 'mtime' if prop == 'modified' else 'size'
+        return lambda x: (
+            -1 if getattr(x, attr) is None else getattr(x, attr))
+    if prop == 'subdirs':
+        return lambda x: x.subdirs
+    if manager is None:
+        return None
+    if prop == 'logcheck':
+        names = [rule.name for rule in manager.get_log_rules()]
+        masks = {}  # log sets are interned, see :func:`browsepy.scan.snapshot`
+
+        def logcheck_key(x):
+            mask = masks.get(x.logs)
+            if mask is None:
+                mask = masks[x.logs] = logs_mask(x.logs, names)
+            return mask
+        return logcheck_key
+    if prop == 'type':
+        get_mimetype = manager.get_mimetype
+        paths = [x.path for x in snapshots or () if not x.is_dir]
+        types = dict(zip(paths, (
+            mime.split(';', 1)[0]
+            for mime in manager.get_mimetypes(paths)
+            ))) if paths else {}
+
+        def type_key(x):
+            if x.is_dir:
+                return 'inode/directory'
+            mime = types.get(x.path)
+            if mime is None:
+                mime = types[x.path] = get_mimetype(x.path).split(';', 1)[0]
+            return mime
+        return type_key
+    return None
@@ -1,29 +1,154 @@
 
+import io
 import os
 import os.path
+import stat
 import tarfile
+import zipfile
+import fnmatch
 import functools
 import threading
+import collections
 
+from . import compress
+from .compat import PY_LEGACY
 
-class TarFileStream(object):
+
+class StreamClosedError(IOError):
     '''
-    Tarfile which compresses while reading for streaming.
+    Exception raised on :meth:`ArchiveStream.write` calls after stream being
+    closed by its consumer, aborting archive generation.
+    '''
+    pass
 
-    Buffsize can be provided, it must be 512 multiple (the tar block size) for
-    compression.
+
+class WalkFilter(object):
+    '''
+    Selection of archive members, applied while walking directories so
+    unwanted files are never opened and directories deeper than
+    :attr:`max_depth` are not walked at all.
+
+    Include globs and modification time range apply to non-directory
+    entries only, globs being matched against both entry name and its path
+    relative to archived directory.
+    '''
+    def __init__(self, include=(), since=None, until=None, max_depth=None):
+        '''
+        :param include: glob patterns, any file matching one is included
+        :type include: iterable of str
+        :param since: minimum modification timestamp (inclusive)
+        :type since: float or None
+        :param until: maximum modification timestamp (exclusive)
+        :type until: float or None
+        :param max_depth: maximum entry depth, 1 being directory children
+        :type max_depth: int or None
+        '''
+        self.include = tuple(include)
+        self.since = since
+        self.until = until
+        self.max_depth = max_depth
+
+    def __bool__(self):
+        return bool(self.include) or any(
+            value is not None
+            for value in (self.since, self.until, self.max_depth)
+            )
+
+    __nonzero__ = __bool__
+
+    def match_directory(self, depth):
+        '''
+        Get whether a directory at given depth should be archived.
+
+        :param depth: entry depth
+        :type depth: int
+        :rtype: bool
+        '''
+        return self.max_depth is None or depth <= self.max_depth
+
+    def descend(self, depth):
+        '''
+        Get whether a directory at given depth should be walked.
+
+        :param depth: directory depth
+        :type depth: int
+        :rtype: bool
+        '''
+        return self.max_depth is None or depth < self.max_depth
+
+    def match_file(self, relpath, mtime, depth):
+        '''
+        Get whether a non-directory entry should be archived.
+
+        :param relpath: path relative to archived directory, using slashes
+        :type relpath: str
+        :param mtime: modification timestamp
+        :type mtime: float
+        :param depth: entry depth
+        :type depth: int
+        :rtype: bool
+        '''
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        if self.since is not None and mtime < self.since:
+            return False
+        if self.until is not None and mtime >= self.until:
+            return False
+        if self.include:
+            name = relpath.rpartition('/')[2]
+            return any(
+                fnmatch.fnmatchcase(name, pattern) or
+                fnmatch.fnmatchcase(relpath, pattern)
+                for pattern in self.include
+                )
+        return True
+
+    def match_member(self, member, prefix=''):
+        '''
+        Get whether a tarfile member should be archived.
+
+        :param member: tarfile member, named relative to archived directory
+        :type member: tarfile.TarInfo
+        :param prefix: archive path of archived directory, if any
+        :type prefix: str
+        :rtype: bool
+        '''
+        name = member.name.strip('/')
+        if prefix:
+            name = name[len(prefix.strip('/')):].strip('/')
+        depth = name.count('/') + 1 if name else 0
+        if member.isdir():
+            return self.match_directory(depth)
+        return self.match_file(name, member.mtime, depth)
+
+
+class ArchiveStream(object):
+    '''
+    Base class for archives being generated on a thread while reading for
+    streaming.
+
+    Archive data is kept as a queue of chunks, as written by the archiving
+    thread, bounded to buffsize bytes (plus at most one chunk) so
+    compression can keep going while previous chunks are being sent, and
+    chunks are handed to the consumer without being copied.
+
+    Subclasses must implement :meth:`archive`, and can override :meth:`open`
+    to create their archive objects before the archiving thread starts.
 
     Note on corroutines: this class uses threading by default, but
     corroutine-based applications can change this behavior overriding the
-    :attr:`event_class` and :attr:`thread_class` values.
+    :attr:`condition_class` and :attr:`thread_class` values.
     '''
-    event_class = threading.Event
+    condition_class = threading.Condition
     thread_class = threading.Thread
-    tarfile_class = tarfile.open
+    extension = None
+    length = None  # unknown until generated
+    follow_symlinks = False  # whether symlink targets are archived
 
-    def __init__(self, path, buffsize=10240, exclude=None):
+    def __init__(self, path, buffsize=10240, exclude=None, walk_filter=None,
+                 sources=None):
         '''
-        Internal tarfile object will be created, and compression will start
+        Internal archive objects will be created, and compression will start
         on a thread until buffer became full with writes becoming locked until
         a read occurs.
 
@@ -33,51 +158,75 @@ class TarFileStream(object):
         :type buffsize: int
         :param exclude: path filter function, defaults to None
         :type exclude: callable
+        :param walk_filter: optional member selection
+        :type walk_filter: WalkFilter or None
+        :param sources: optional directories to archive instead of path
+                        (which still names the archive), along with their
+                        archive paths
+        :type sources: iterable of tuple of str and str
         '''
         self.path = path
-        self.name = os.path.basename(path) + ".tgz"
+        self.name = "%s.%s" % (os.path.basename(path), self.extension)
         self.exclude = exclude
+        self.walk_filter = walk_filter or None
+        self.sources = tuple(sources or ((path, ''),))
+        self.buffsize = buffsize
 
-        self._finished = 0
-        self._want = 0
-        self._data = bytes()
-        self._add = self.event_class()
-        self._result = self.event_class()
-        self._tarfile = self.tarfile_class(  # stream write
-            fileobj=self,
-            mode="w|gz",
-            bufsize=buffsize
-            )
+        self._finished = False
+        self._closed = False
+        self._error = None
+        self._queue = collections.deque()
+        self._queued = 0
+        self._condition = self.condition_class()
+        self.open()
         self._th = self.thread_class(target=self.fill)
         self._th.start()
 
+    def open(self):
+        '''
+        Create internal archive objects, called on initialization before
+        archiving thread starts.
+        '''
+        pass
+
+    def archive(self):
+        '''
+        Write the whole archive to current object, using :meth:`write`.
+        '''
+        raise NotImplementedError
+
+    def abort(self):
+        '''
+        Release internal archive objects once stream got closed, without
+        writing anything else.
+        '''
+        pass
+
     def fill(self):
         '''
-        Writes data on internal tarfile instance, which writes to current
-        object, using :meth:`write`.
+        Writes archive data to current object, using :meth:`archive`.
 
         As this method is blocking, it is used inside a thread.
 
         This method is called automatically, on a thread, on initialization,
         so there is little need to call it manually.
+
+        Errors are kept and raised on the consumer side by :meth:`read`,
+        except :class:`StreamClosedError` as it means nobody is reading.
         '''
-        if self.exclude:
-            exclude = self.exclude
-            ap = functools.partial(os.path.join, self.path)
-            self._tarfile.add(
-                self.path, "",
-                filter=lambda info: None if exclude(ap(info.name)) else info
-                )
-        else:
-            self._tarfile.add(self.path, "")
-        self._tarfile.close()  # force stream flush
-        self._finished += 1
-        if not self._result.is_set():
-            self._result.set()
+        try:
+            self.archive()
+        except StreamClosedError:
+            self.abort()
+        except BaseException as e:
+            self._error = e
+        with self._condition:
+            self._finished = True
+            self._condition.notify_all()
 
     def write(self, data):
         '''
-        Write method used by internal tarfile instance to output data.
+        Write method used by internal archive objects to output data.
         This method blocks tarfile execution once internal buffer is full.
 
         As this method is blocking, it is used inside the same thread of
@@ -87,13 +236,57 @@ class TarFileStream(object):
         :type data: bytes
         :returns: number of bytes written
         :rtype: int
+        :raises StreamClosedError: if stream has been closed
+        '''
+        size = len(data)
+        if not size:
+            return 0
+        if not isinstance(data, bytes):
+            data = memoryview(data).tobytes()  # writer could reuse its buffer
+        with self._condition:
+            while self._queued and not self._closed and \
+                    self._queued + size > self.buffsize:
+                self._condition.wait()
+            if self._closed:
+                raise StreamClosedError('Stream closed by consumer')
+            self._queue.append(data)
+            self._queued += size
+            self._condition.notify_all()
+        return size
+
+    def flush(self):
+        pass
+
+    def _pop(self, want=0):
         '''
-        self._add.wait()
-        self._data += data
-        if len(self._data) > self._want:
-            self._add.clear()
-            self._result.set()
-        return len(data)
+        Take queued chunks, waiting for :meth:`write` calls if empty.
+
+        Must be called with :attr:`_condition` acquired.
+
+        :param want: maximum number of bytes, defaults to 0 (all available)
+        :type want: int
+        :returns: list of chunks, empty on EOF
+        :rtype: list of bytes or memoryview
+        '''
+        while not self._queue and not self._finished:
+            self._condition.wait()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        chunks = []
+        taken = 0
+        while self._queue and (not want or taken < want):
+            chunk = self._queue.popleft()
+            if want and taken + len(chunk) > want:
+                view = memoryview(chunk)
+                split = want - taken
+                self._queue.appendleft(view[split:])
+                chunk = view[:split]
+            chunks.append(chunk)
+            taken += len(chunk)
+        self._queued -= taken
+        self._condition.notify_all()
+        return chunks
 
     def read(self, want=0):
         '''
@@ -104,45 +297,507 @@ class TarFileStream(object):
         :meth:`fill`, ie. the main thread, otherwise will deadlock.
 
         The combination of both write and this method running on different
-        threads makes tarfile being streamed on-the-fly, with data chunks being
+        threads makes archive being streamed on-the-fly, with data chunks being
         processed and retrieved on demand.
 
         :param want: number bytes to read, defaults to 0 (all available)
         :type want: int
-        :returns: tarfile data as bytes
+        :returns: archive data as bytes, empty when finished
         :rtype: bytes
         '''
-        if self._finished:
-            if self._finished == 1:
-                self._finished += 1
-                return ""
-            return EOFError("EOF reached")
-
-        # Thread communication
-        self._want = want
-        self._add.set()
-        self._result.wait()
-        self._result.clear()
-
-        if want:
-            data = self._data[:want]
-            self._data = self._data[want:]
-        else:
-            data = self._data
-            self._data = bytes()
-        return data
+        with self._condition:
+            chunks = self._pop(want)
+        if len(chunks) == 1 and isinstance(chunks[0], bytes):
+            return chunks[0]
+        return b''.join(
+            chunk if isinstance(chunk, bytes) else chunk.tobytes()
+            for chunk in chunks
+            )
+
+    def close(self):
+        '''
+        Close stream, aborting archive generation and releasing queued
+        chunks.
+
+        This is called by WSGI servers when response is done, or when client
+        disconnects before that.
+        '''
+        with self._condition:
+            self._closed = True
+            self._queue.clear()
+            self._queued = 0
+            self._condition.notify_all()
+
+    def wsgi_iterable(self, environ):
+        '''
+        Get WSGI iterable for given environ, this very object.
+
+        :param environ: WSGI environ
+        :type environ: dict
+        :returns: WSGI iterable
+        :rtype: iterable
+        '''
+        return self
 
     def __iter__(self):
         '''
-        Iterate through tarfile result chunks.
+        Iterate through archive result chunks, as written.
 
         Similarly to :meth:`read`, this methos must ran on a different thread
         than :meth:`write` calls.
 
-        :yields: data chunks as taken from :meth:`read`.
+        :yields: data chunks
+        :ytype: bytes
+        '''
+        while True:
+            with self._condition:
+                chunks = self._pop()
+            if not chunks:
+                break
+            for chunk in chunks:
+                yield chunk if isinstance(chunk, bytes) else chunk.tobytes()
+
+
+class TarFileStream(ArchiveStream):
+    '''
+    Tarfile which compresses while reading for streaming.
+
+    Buffsize can be provided, it must be 512 multiple (the tar block size) for
+    compression.
+
+    Compression can be either gz (default), bz2, xz or zst (when available,
+    see :data:`browsepy.compress.compressors`) or None for plain tar. When
+    workers are given, gzip compression is parallelized using
+    :class:`browsepy.compress.ParallelGzipWriter`.
+    '''
+    tarfile_class = tarfile.open
+    gzip_class = compress.ParallelGzipWriter
+    compressor_class = compress.CompressorWriter
+    extensions = {
+        None: 'tar',
+        'gz': 'tgz',
+        'bz2': 'tbz2',
+        'xz': 'txz',
+        'zst': 'tzst',
+        }
+
+    def __init__(self, path, buffsize=10240, exclude=None, workers=0,
+                 compression='gz', level=None, walk_filter=None,
+                 sources=None):
+        '''
+        :param path: local path of directory whose content will be compressed.
+        :type path: str
+        :param buffsize: size of internal buffer on bytes, defaults to 10KiB
+        :type buffsize: int
+        :param exclude: path filter function, defaults to None
+        :type exclude: callable
+        :param workers: parallel gzip threads, defaults to 0 (none)
+        :type workers: int
+        :param compression: compression name, defaults to gz
+        :type compression: str or None
+        :param level: compression level, defaults to compression default
+        :type level: int or None
+        :param walk_filter: optional member selection
+        :type walk_filter: WalkFilter or None
+        :param sources: optional directories and archive paths, see
+                        :class:`ArchiveStream`
+        :type sources: iterable of tuple of str and str
+        '''
+        self.workers = workers
+        self.compression = compression
+        self.level = level
+        self.extension = self.extensions[compression]
+        super(TarFileStream, self).__init__(
+            path, buffsize, exclude, walk_filter, sources)
+
+    def open(self):
+        '''
+        Create internal tarfile object, writing to a compression writer.
+        '''
+        if self.compression == 'gz' and self.workers:
+            self._writer = self.gzip_class(
+                self,
+                level=compress.get_level('gz', self.level),
+                workers=self.workers
+                )
+        elif self.compression:
+            self._writer = self.compressor_class(
+                self,
+                compress.get_compressor(self.compression, self.level)
+                )
+        else:
+            self._writer = None
+        self._tarfile = self.tarfile_class(  # stream write
+            fileobj=self._writer or self,
+            mode="w|",
+            bufsize=self.buffsize
+            )
+
+    def archive(self):
+        '''
+        Add directories to internal tarfile instance, which writes to current
+        object, using :meth:`write`.
+        '''
+        for path, prefix in self.sources:
+            self._tarfile.add(
+                path, prefix, filter=self._member_filter(path, prefix))
+        self._tarfile.close()  # force stream flush
+        if self._writer:
+            self._writer.close()
+
+    def _member_filter(self, path, prefix):
+        exclude = self.exclude
+        walk_filter = self.walk_filter
+        if not exclude and not walk_filter:
+            return None
+        ap = functools.partial(os.path.join, path)
+        start = len(prefix.strip('/'))
+
+        def member_filter(info):
+            if exclude and exclude(ap(info.name[start:].lstrip('/'))):
+                return None
+            if walk_filter and not walk_filter.match_member(info, prefix):
+                return None
+            return info
+        return member_filter
+
+    def abort(self):
+        # skip tarfile flushing on garbage collection
+        self._tarfile.closed = self._tarfile.fileobj.closed = True
+
+
+class ZipFileStream(ArchiveStream):
+    '''
+    Zipfile which compresses while reading for streaming.
+
+    Files whose extension is on :attr:`stored_extensions` (already
+    compressed) are stored as they are instead of being deflated again.
+
+    Only regular files and directories are added, following symlinks.
+    '''
+    zipfile_class = zipfile.ZipFile
+    extension = 'zip'
+    follow_symlinks = True
+    stored_extensions = frozenset((
+        'gz', 'tgz', 'bz2', 'tbz2', 'xz', 'txz', 'zst', 'tzst', 'lz4', 'zip',
+        '7z', 'rar', 'jpg', 'jpeg', 'png', 'gif', 'webp', 'mp3', 'ogg',
+        'flac', 'mp4', 'webm',
+        ))
+
+    def __init__(self, path, buffsize=10240, exclude=None, level=None,
+                 walk_filter=None, sources=None):
+        '''
+        :param path: local path of directory whose content will be compressed.
+        :type path: str
+        :param buffsize: size of internal buffer on bytes, defaults to 10KiB
+        :type buffsize: int
+        :param exclude: path filter function, defaults to None
+        :type exclude: callable
+        :param level: deflate level, only honored on python 3.7 and later
+        :type level: int or None
+        :param walk_filter: optional member selection
+        :type walk_filter: WalkFilter or None
+        :param sources: optional directories and archive paths, see
+                        :class:`ArchiveStream`
+        :type sources: iterable of tuple of str and str
+        '''
+        self.level = level
+        super(ZipFileStream, self).__init__(
+            path, buffsize, exclude, walk_filter, sources)
+
+    def open(self):
+        '''
+        Create internal zipfile object, writing entries along with data
+        descriptors as current object is not seekable.
+        '''
+        options = {'allowZip64': True}
+        if self.level is not None:
+            options['compresslevel'] = compress.get_level('gz', self.level)
+        try:
+            self._zipfile = self.zipfile_class(
+                self, 'w', zipfile.ZIP_DEFLATED, **options)
+        except TypeError:  # python < 3.7 lacks compresslevel
+            options.pop('compresslevel')
+            self._zipfile = self.zipfile_class(
+                self, 'w', zipfile.ZIP_DEFLATED, **options)
+
+    def archive(self):
+        '''
+        Walk directories writing their entries to internal zipfile object.
+        '''
+        for path, prefix in self.sources:
+            if prefix:
+                self._zipfile.write(path, prefix)
+            self._archive(path, prefix.strip('/'))
+        self._zipfile.close()
+
+    def _archive(self, root, arcroot):
+        exclude = self.exclude
+        walk_filter = self.walk_filter
+        stored = self.stored_extensions
+        for dirpath, dirnames, filenames in os.walk(root):
+            relpath = os.path.relpath(dirpath, root)
+            relpath = '' if relpath == os.curdir else relpath + os.sep
+            depth = relpath.count(os.sep) + 1
+            prefix = os.path.join(arcroot, relpath) if arcroot else relpath
+            walked = []
+            for name in sorted(dirnames):
+                if exclude and exclude(os.path.join(dirpath, name)):
+                    continue
+                if walk_filter and not walk_filter.match_directory(depth):
+                    continue
+                self._zipfile.write(
+                    os.path.join(dirpath, name), prefix + name)
+                if not walk_filter or walk_filter.descend(depth):
+                    walked.append(name)
+            dirnames[:] = walked
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                if exclude and exclude(path):
+                    continue
+                try:
+                    stats = os.stat(path)
+                except (IOError, OSError):
+                    continue
+                if not stat.S_ISREG(stats.st_mode):
+                    continue
+                if walk_filter and not walk_filter.match_file(
+                        (relpath + name).replace(os.sep, '/'),
+                        stats.st_mtime,
+                        depth):
+                    continue
+                self._zipfile.write(
+                    path,
+                    prefix + name,
+                    zipfile.ZIP_STORED
+                    if name.rpartition('.')[2].lower() in stored else
+                    zipfile.ZIP_DEFLATED
+                    )
+
+    def abort(self):
+        # skip zipfile central directory on garbage collection
+        self._zipfile.fp = None
+
+
+class SegmentStream(object):
+    '''
+    Base class for streams made of in-memory data and file content
+    segments, the latter being read from their file descriptors in blocks
+    of :attr:`buffsize` bytes while iterating, see :meth:`wsgi_iterable`.
+
+    Subclasses must implement :meth:`segments`, and set :attr:`buffsize`
+    and :attr:`length` (if known) on initialization.
+
+    File contents are sent with the sizes given by :meth:`segments`: files
+    growing meanwhile get truncated, shrinking ones zero-padded.
+    '''
+    buffsize = 10240
+    length = None
+
+    def segments(self):
+        '''
+        Iterate through stream segments, either data to be sent as it is or
+        file content references.
+
+        :yields: bytes or tuple of path, offset and size
+        :ytype: bytes or tuple
+        '''
+        raise NotImplementedError
+
+    def _open(self, path):
+        try:
+            return os.open(path, os.O_RDONLY)
+        except (IOError, OSError):
+            return None
+
+    def _zeros(self, size):
+        block = b'\0' * min(size, self.buffsize)
+        while size > len(block):
+            yield block
+            size -= len(block)
+        yield block[:size]
+
+    def _read(self, path, offset, size):
+        fd = None if path is None else self._open(path)
+        if fd is not None:
+            try:
+                if offset:
+                    os.lseek(fd, offset, os.SEEK_SET)
+                while size:
+                    data = os.read(fd, min(size, self.buffsize))
+                    if not data:
+                        break
+                    size -= len(data)
+                    yield data
+            finally:
+                os.close(fd)
+        if size:
+            for data in self._zeros(size):
+                yield data
+
+    def __iter__(self):
+        '''
+        Iterate through stream data, reading file contents in blocks.
+
+        :yields: data chunks
         :ytype: bytes
         '''
-        data = self.read()
-        while data:
-            yield data
-            data = self.read()
+        for segment in self.segments():
+            if isinstance(segment, bytes):
+                if segment:
+                    yield segment
+                continue
+            for data in self._read(*segment):
+                yield data
+
+    def wsgi_iterable(self, environ):
+        '''
+        Get WSGI iterable for given environ, this very object.
+
+        Segments are made of several files (or file ranges) and in-memory
+        data, which `wsgi.file_wrapper` cannot send, as it only takes a
+        whole single file, so file contents always go through python.
+
+        :param environ: WSGI environ
+        :type environ: dict
+        :returns: WSGI iterable
+        :rtype: iterable
+        '''
+        return self
+
+
+class SegmentTarStream(SegmentStream):
+    '''
+    Uncompressed tarfile stream whose headers are generated in python while
+    file contents are read in blocks from their file descriptors, without
+    any archiving thread nor intermediate buffer.
+
+    Directory is walked on initialization (honoring exclude function, like
+    :class:`TarFileStream` does), so archive :attr:`length` is known before
+    streaming. File contents are sent with the sizes they had at that time:
+    files growing meanwhile get truncated, shrinking ones zero-padded.
+
+    See :class:`SegmentStream` for how archive is streamed.
+    '''
+    extension = 'tar'
+    tar_format = tarfile.DEFAULT_FORMAT
+
+    def __init__(self, path, buffsize=10240, exclude=None, level=None,
+                 walk_filter=None, sources=None):
+        '''
+        :param path: local path of directory whose content will be archived.
+        :type path: str
+        :param buffsize: read block size on bytes, defaults to 10KiB
+        :type buffsize: int
+        :param exclude: path filter function, defaults to None
+        :type exclude: callable
+        :param level: ignored, as there is no compression
+        :type level: None
+        :param walk_filter: optional member selection
+        :type walk_filter: WalkFilter or None
+        :param sources: optional directories and archive paths, see
+                        :class:`ArchiveStream`
+        :type sources: iterable of tuple of str and str
+        '''
+        self.path = path
+        self.name = "%s.%s" % (os.path.basename(path), self.extension)
+        self.exclude = exclude
+        self.walk_filter = walk_filter or None
+        self.sources = tuple(sources or ((path, ''),))
+        self.buffsize = buffsize
+        self._tarfile = tarfile.TarFile(
+            fileobj=io.BytesIO(), mode='w', format=self.tar_format)
+        self.members = [
+            item
+            for root, prefix in self.sources
+            for item in self._walk(root, prefix.strip('/'), 0, prefix)
+            ]
+        self.length = sum(
+            len(self._header(member)) + self._payload_size(member)
+            for path, member in self.members
+            )
+        self.length += tarfile.BLOCKSIZE * 2
+        self.length += -self.length % tarfile.RECORDSIZE
+
+    def _walk(self, path, arcname, depth, prefix=''):
+        '''
+        Walk directory tree as :meth:`tarfile.TarFile.add` does.
+
+        :yields: path and member tuples
+        :ytype: tuple of str and tarfile.TarInfo
+        '''
+        try:
+            member = self._tarfile.gettarinfo(path, arcname)
+        except (IOError, OSError):
+            return
+        if member is None:  # unsupported file type (ie. socket)
+            return
+        walk_filter = self.walk_filter
+        if walk_filter and not walk_filter.match_member(member, prefix):
+            return
+        yield path, member
+        if member.isdir() and (not walk_filter or walk_filter.descend(depth)):
+            exclude = self.exclude
+            try:
+                names = sorted(os.listdir(path))
+            except (IOError, OSError):
+                names = ()
+            for name in names:
+                subpath = os.path.join(path, name)
+                if exclude and exclude(subpath):
+                    continue
+                subname = os.path.join(arcname, name)
+                for item in self._walk(subpath, subname, depth + 1, prefix):
+                    yield item
+
+    def _header(self, member):
+        return member.tobuf(
+            self._tarfile.format,
+            self._tarfile.encoding,
+            self._tarfile.errors
+            )
+
+    def _payload_size(self, member):
+        return member.size + -member.size % tarfile.BLOCKSIZE
+
+    def segments(self):
+        '''
+        Iterate through archive segments, either data to be sent as it is or
+        file content references.
+
+        :yields: bytes or tuple of path, offset and size
+        :ytype: bytes or tuple
+        '''
+        written = 0
+        for path, member in self.members:
+            header = self._header(member)
+            written += len(header) + self._payload_size(member)
+            if member.isreg() and member.size:
+                yield header
+                yield path, 0, member.size
+                yield tarfile.NUL * (-member.size % tarfile.BLOCKSIZE)
+            else:
+                yield header
+        yield tarfile.NUL * (self.length - written)
+
+
+ArchiveFormat = collections.namedtuple(
+    'ArchiveFormat', ('mimetype', 'stream_class', 'options'))
+
+archive_formats = collections.OrderedDict(
+    (TarFileStream.extensions[compression], ArchiveFormat(
+        mimetype, TarFileStream, {'compression': compression}))
+    for compression, mimetype in (
+        ('gz', 'application/gzip'),
+        (None, 'application/x-tar'),
+        ('bz2', 'application/x-bzip2'),
+        ('xz', 'application/x-xz'),
+        ('zst', 'application/zstd'),
+        )
+    if compression is None or compression in compress.compressors
+    )
+archive_formats['tar'] = ArchiveFormat(
+    'application/x-tar', SegmentTarStream, {})
+if not PY_LEGACY:  # python 2 zipfile cannot write to unseekable streams
+    archive_formats['zip'] = ArchiveFormat(
+        'application/zip', ZipFileStream, {})
@@ -23,6 +23,36 @@ class TestApp(unittest.TestCase):
         finally:
             os.remove(name)
 
+    def test_get_browse_window(self):
+        fnc = self.module.get_browse_window
+        with self.app.test_request_context('/'):
+            self.assertEqual(fnc(25, 10), (1, 3, 0, 10))
+            self.assertEqual(fnc(0, 10), (1, 1, 0, 10))
+            self.assertEqual(fnc(25, 0), (1, 1, 0, None))
+        with self.app.test_request_context('/?page=3'):
+            self.assertEqual(fnc(25, 10), (3, 3, 20, 10))
+            self.assertEqual(fnc(25, 20), (2, 2, 20, 20))
+        with self.app.test_request_context('/?page=x&limit=5'):
+            self.assertEqual(fnc(25, 10), (1, 5, 0, 5))
+        with self.app.test_request_context('/?offset=7&limit=5'):
+            self.assertEqual(fnc(25, 10), (2, 5, 7, 5))
+
+    def test_get_walk_filter(self):
+        fnc = self.module.get_walk_filter
+        with self.app.test_request_context('/'):
+            self.assertFalse(fnc())
+        with self.app.test_request_context(
+                '/?include=a*&include=b*&since=100&until=2017-01-01&depth=2'):
+            walk_filter = fnc()
+            self.assertEqual(walk_filter.include, ('a*', 'b*'))
+            self.assertEqual(walk_filter.since, 100)
+            self.assertEqual(
+                walk_filter.until,
+                self.module.parse_timestamp('2017-01-01T00:00'))
+            self.assertEqual(walk_filter.max_depth, 2)
+        with self.app.test_request_context('/?since=yesterday'):
+            self.assertRaises(ValueError, fnc)
+
 
 class TestConfig(unittest.TestCase):
     pwd = os.path.dirname(os.path.abspath(__file__))
@@ -0,0 +1,241 @@
+
+import os
+import os.path
+import time
+import unittest
+import tempfile
+import shutil
+import threading
+
+import browsepy.archivecache
+
+
+class AppMock(object):
+    def __init__(self, **config):
+        self.config = config
+
+
+class StreamMock(object):
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+
+class TestTreeSignature(unittest.TestCase):
+    module = browsepy.archivecache
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.workbench, 'dir'))
+        for name in ('a', os.path.join('dir', 'b'), 'c.exc'):
+            with open(os.path.join(self.workbench, name), 'w') as f:
+                f.write('data')
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def test_signature(self):
+        exclude = lambda path: path.endswith('.exc')  # noqa
+        path = os.path.join(self.workbench, 'dir', 'b')
+        signature, newest = self.module.tree_signature(self.workbench)
+        self.assertEqual(
+            self.module.tree_signature(self.workbench),
+            (signature, newest)
+            )
+        self.assertNotEqual(
+            self.module.tree_signature(self.workbench, exclude)[0],
+            signature
+            )
+        mtime = time.time() + 60
+        os.utime(path, (mtime, mtime))
+        self.assertNotEqual(
+            self.module.tree_signature(self.workbench),
+            (signature, newest)
+            )
+        self.assertEqual(
+            self.module.tree_signature(self.workbench)[1],
+            os.stat(path).st_mtime
+            )
+
+    @unittest.skipIf(not hasattr(os, 'symlink'), 'symlinks not supported')
+    def test_symlinks(self):
+        signature, newest = self.module.tree_signature(self.workbench)
+        os.symlink(self.workbench, os.path.join(self.workbench, 'dir', 'loop'))
+        result = self.module.tree_signature(self.workbench)
+        self.assertIsNotNone(result)
+        self.assertNotEqual(result[0], signature)
+
+        outside = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside)
+        target = os.path.join(outside, 'a')
+        with open(target, 'w') as f:
+            f.write('data')
+        os.symlink(target, os.path.join(self.workbench, 'dir', 'link'))
+        fnc = self.module.tree_signature
+        plain = fnc(self.workbench)
+        followed = fnc(self.workbench, follow_symlinks=True)
+        mtime = time.time() + 60
+        os.utime(target, (mtime, mtime))
+        self.assertEqual(fnc(self.workbench)[0], plain[0])
+        result = fnc(self.workbench, follow_symlinks=True)
+        self.assertNotEqual(result[0], followed[0])
+        self.assertEqual(result[1], os.stat(target).st_mtime)
+        with open(target, 'w') as f:
+            f.write('changed')  # same mtime, different size
+        os.utime(target, (mtime, mtime))
+        self.assertNotEqual(
+            fnc(self.workbench, follow_symlinks=True)[0], result[0])
+        os.remove(target)  # broken symlink
+        self.assertIsNotNone(fnc(self.workbench, follow_symlinks=True))
+
+    def test_max_entries(self):
+        fnc = self.module.tree_signature
+        self.assertIsNotNone(fnc(self.workbench, None, 4))
+        self.assertIsNone(fnc(self.workbench, None, 3))
+
+
+class TestArchiveCache(unittest.TestCase):
+    module = browsepy.archivecache
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+        self.directory = os.path.join(self.workbench, 'cache')
+        self.cache = self.module.ArchiveCache(AppMock(
+            archive_cache_dir=self.directory,
+            archive_cache_bytes=1024,
+            archive_cache_min_age=60,
+            ))
+        self.threads = []
+        self.cache.thread_class = self.thread_class
+        self.data = os.path.join(self.workbench, 'data')
+        os.mkdir(self.data)
+        open(os.path.join(self.data, 'file'), 'w').close()
+        self.age(os.path.join(self.data, 'file'))
+        self.age(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def age(self, path, seconds=3600):
+        mtime = time.time() - seconds
+        os.utime(path, (mtime, mtime))
+
+    def thread_class(self, **kwargs):
+        thread = threading.Thread(**kwargs)
+        self.threads.append(thread)
+        return thread
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+    def store(self, key, chunks):
+        reader = self.cache.store(key, StreamMock(chunks))
+        data = b''.join(reader)
+        reader.close()
+        self.join()
+        return data
+
+    def test_key(self):
+        key = self.cache.key(self.data, 'tgz')
+        self.assertTrue(key.endswith('.tgz'))
+        self.assertEqual(self.cache.key(self.data, 'tgz'), key)
+        self.assertNotEqual(self.cache.key(self.data, 'tgz', 1), key)
+        self.assertNotEqual(self.cache.key(self.data, 'zip'), key)
+
+        target = os.path.join(self.workbench, 'target')
+        open(target, 'w').close()
+        self.age(target)
+        link = os.path.join(self.data, 'link')
+        os.symlink(target, link)
+        mtime = time.time() - 3600
+        os.utime(link, (mtime, mtime), follow_symlinks=False)
+        self.age(self.data)
+        key = self.cache.key(self.data, 'tgz')
+        zip_key = self.cache.key(self.data, 'zip', None, True)
+        with open(target, 'w') as f:
+            f.write('changed')
+        self.age(target)
+        self.assertEqual(self.cache.key(self.data, 'tgz'), key)
+        self.assertNotEqual(self.cache.key(self.data, 'zip', None, True),
+                            zip_key)
+
+        self.age(os.path.join(self.data, 'file'), 0)
+        self.assertIsNone(self.cache.key(self.data, 'tgz'))  # too recent
+
+        self.assertIsNone(self.cache.key(self.data + '.missing', 'tgz'))
+
+        self.age(os.path.join(self.data, 'file'))
+        self.cache.app.config['archive_cache_max_entries'] = 0
+        self.assertIsNone(self.cache.key(self.data, 'tgz'))  # too big
+        self.cache.app.config['archive_cache_max_entries'] = 2
+        self.assertIsNotNone(self.cache.key(self.data, 'tgz'))
+
+        self.cache.app.config['archive_cache_dir'] = None
+        self.assertFalse(self.cache.enabled)
+        self.assertIsNone(self.cache.key(self.data, 'tgz'))
+
+    def test_store(self):
+        key = self.cache.key(self.data, 'tgz')
+        self.assertIsNone(self.cache.open(key))
+        self.assertEqual(self.store(key, [b'a' * 10, b'b' * 10]),
+                         b'a' * 10 + b'b' * 10)
+        self.assertEqual(os.listdir(self.directory), [key])
+        with self.cache.open(key) as f:
+            self.assertEqual(f.read(), b'a' * 10 + b'b' * 10)
+
+    def test_shared_build(self):
+        key = self.cache.key(self.data, 'tgz')
+        build = self.module.ArchiveBuild(
+            os.path.join(self.workbench, 'tmp'),
+            os.path.join(self.workbench, 'target'),
+            )
+        open(build.path, 'wb').close()
+        self.cache._builds[key] = build
+        stream = StreamMock([b'unused'])
+        reader = self.cache.store(key, stream)
+        self.assertTrue(stream.closed)
+        self.assertIs(reader.build, build)
+
+        with open(build.path, 'ab') as f:
+            f.write(b'data')
+        build.progress(4)
+        build.finish()
+        self.assertEqual(b''.join(reader), b'data')
+        reader.close()
+
+    def test_error(self):
+        key = self.cache.key(self.data, 'tgz')
+
+        def chunks():
+            yield b'data'
+            raise OSError('broken')
+
+        reader = self.cache.store(key, chunks())
+        self.assertRaises(IOError, b''.join, reader)
+        reader.close()
+        self.join()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_evict(self):
+        first = self.cache.key(self.data, 'tgz')
+        second = self.cache.key(self.data, 'zip')
+        self.store(first, [b'a' * 600])
+        self.age(os.path.join(self.directory, first))
+        self.store(second, [b'b' * 600])
+        self.assertEqual(os.listdir(self.directory), [second])
+
+        orphan = os.path.join(
+            self.directory, self.cache.temp_prefix + 'orphan')
+        open(orphan, 'w').close()
+        self.cache.evict()
+        self.assertTrue(os.path.exists(orphan))
+        self.age(orphan, self.cache.stale_seconds + 60)
+        self.cache.evict()
+        self.assertFalse(os.path.exists(orphan))
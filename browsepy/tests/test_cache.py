@@ -0,0 +1,70 @@
+import unittest
+import threading
+
+import browsepy.cache
+
+
+class TestLRUCache(unittest.TestCase):
+    module = browsepy.cache
+
+    def test_lru(self):
+        cache = self.module.LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)  # a becomes most recent
+        cache.set('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('b', 0), 0)
+        self.assertEqual(cache.items(), [('a', 1), ('c', 3)])
+        self.assertEqual(cache.get('a'), 1)  # items did not reorder
+        self.assertEqual(cache.pop('a'), 1)
+        self.assertEqual(len(cache), 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_threads(self):
+        cache = self.module.LRUCache(maxsize=10)
+
+        def worker(offset):
+            for i in range(1000):
+                cache.set(offset + i, i)
+                cache.get(offset + i - 1)
+
+        threads = [
+            threading.Thread(target=worker, args=(n * 1000,))
+            for n in range(4)
+            ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(cache), 10)
+
+    def test_maxbytes(self):
+        cache = self.module.LRUCache(maxsize=10, maxbytes=10)
+        cache.set('a', 1, 4)
+        cache.set('b', 2, 4)
+        cache.set('c', 3, 4)
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.bytes, 8)
+        cache.set('d', 4, 11)  # too big
+        self.assertNotIn('d', cache)
+        self.assertEqual(cache.pop('b'), 2)
+        self.assertEqual(cache.bytes, 4)
+        cache.clear()
+        self.assertEqual(cache.bytes, 0)
+
+    def test_ttl(self):
+        now = [0]
+        cache = self.module.LRUCache(ttl=10)
+        cache.clock = lambda: now[0]
+        cache.set('a', 1, 5)
+        now[0] = 9
+        self.assertEqual(cache.get('a'), 1)
+        now[0] = 10
+        self.assertIsNone(cache.get('a'))
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.bytes, 0)
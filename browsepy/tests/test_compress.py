@@ -0,0 +1,91 @@
+import io
+import os
+import zlib
+import gzip
+import unittest
+
+import browsepy.compress
+
+from browsepy.compat import PY_LEGACY
+
+
+class TestParallelGzipWriter(unittest.TestCase):
+    module = browsepy.compress
+
+    def compress(self, data, chunk_size=1000, **kwargs):
+        output = io.BytesIO()
+        writer = self.module.ParallelGzipWriter(output, **kwargs)
+        for start in range(0, len(data), chunk_size):
+            writer.write(data[start:start + chunk_size])
+        writer.close()
+        writer.close()  # second call does nothing
+        return output.getvalue()
+
+    def decompress(self, data):
+        with gzip.GzipFile(fileobj=io.BytesIO(data)) as f:
+            return f.read()
+
+    def test_roundtrip(self):
+        for size in (0, 1, 4095, 4096, 4097, 40000):
+            data = (os.urandom(size // 2) + b'browsepy' * size)[:size]
+            for workers in (1, 3):
+                compressed = self.compress(
+                    data, workers=workers, block_size=4096)
+                self.assertEqual(self.decompress(compressed), data)
+
+    @unittest.skipIf(PY_LEGACY, 'preset dictionaries require python 3.3')
+    def test_dictionary(self):
+        data = os.urandom(2048) * 8
+        self.assertLess(
+            len(self.compress(data, block_size=2048)),
+            len(data) // 2
+            )
+
+    def test_deflate_block(self):
+        data = b'browsepy' * 100
+        block = self.module.deflate_block(data, 6, last=True)
+        self.assertEqual(zlib.decompress(block, -zlib.MAX_WBITS), data)
+
+
+class TestCompressors(unittest.TestCase):
+    module = browsepy.compress
+
+    def decompress(self, data):
+        with gzip.GzipFile(fileobj=io.BytesIO(data)) as f:
+            return f.read()
+
+    def test_get_level(self):
+        self.assertEqual(self.module.get_level('gz'), 6)
+        self.assertEqual(self.module.get_level('gz', 12), 9)
+        self.assertEqual(self.module.get_level('gz', -1), 0)
+        self.assertRaises(KeyError, self.module.get_level, 'rar')
+
+    def test_get_compressor(self):
+        data = b'browsepy' * 100
+        compressor = self.module.get_compressor('gz', 9)
+        compressed = compressor.compress(data) + compressor.flush()
+        self.assertEqual(self.decompress(compressed), data)
+
+    def test_compressor_writer(self):
+        output = io.BytesIO()
+        writer = self.module.CompressorWriter(
+            output, self.module.get_compressor('gz'))
+        writer.write(b'browsepy')
+        writer.close()
+        writer.close()
+        self.assertEqual(self.decompress(output.getvalue()), b'browsepy')
+
+    def test_iter_decompress(self):
+        data = b'browsepy' * 1000
+        for name in self.module.decompressors:
+            members = []
+            for part in (data[:3000], data[3000:]):
+                compressor = self.module.get_compressor(name)
+                members.append(compressor.compress(part) + compressor.flush())
+            compressed = b''.join(members)
+            chunks = self.module.iter_decompress(
+                io.BytesIO(compressed), name, 100)
+            self.assertEqual(b''.join(chunks), data, name)
+            chunks = self.module.iter_decompress(
+                io.BytesIO(compressed[:-100]), name, 100)
+            self.assertTrue(data.startswith(b''.join(chunks)), name)
@@ -9,6 +9,7 @@ import stat
 import browsepy
 import browsepy.file
 import browsepy.compat
+import browsepy.mimetype
 import browsepy.tests.utils as test_utils
 
 
@@ -54,6 +55,29 @@ class TestFile(unittest.TestCase):
         self.assertEqual(content[0].size, '1 B')
         self.assertEqual(content[0].path, tmp_txt)
 
+    def test_snapshots(self):
+        directory = self.module.Directory(path=self.workbench, app=self.app)
+        self.textfile('b.txt', 'bb')
+        self.textfile('a.txt', 'a')
+        os.mkdir(os.path.join(self.workbench, 'dir'))
+
+        snapshots = directory.snapshots(
+            sortkey=lambda x: (not x.is_dir, x.name))
+        self.assertEqual(
+            [snapshot.name for snapshot in snapshots],
+            ['dir', 'a.txt', 'b.txt']
+            )
+        self.assertFalse(hasattr(snapshots[0], '__dict__'))
+        self.assertEqual(snapshots[2].path, self.textfile('b.txt', 'bb'))
+
+        nodes = directory.iter_listdir(
+            sortkey=lambda x: (x.is_dir, x.size), reverse=True)
+        node = next(nodes)
+        self.assertIsInstance(node, self.module.Directory)
+        self.assertIs(node.parent, directory)
+        self.assertEqual(next(nodes).name, 'b.txt')
+        self.assertEqual(directory.subdirs_count, 1)
+
     def test_check_forbidden_filename(self):
         cff = self.module.check_forbidden_filename
         self.assertFalse(cff('myfilename', destiny_os='posix'))
@@ -85,19 +109,18 @@ class TestFile(unittest.TestCase):
         tmp_txt = self.textfile('ascii_text_file', 'ascii text')
         tmp_err = os.path.join(self.workbench, 'nonexisting_file')
 
-        # test file command
-        if browsepy.compat.which('file'):
-            f = self.module.File(tmp_txt, app=self.app)
-            self.assertEqual(f.mimetype, 'text/plain; charset=us-ascii')
-            self.assertEqual(f.type, 'text/plain')
-            self.assertEqual(f.encoding, 'us-ascii')
+        # test content sniffing
+        f = self.module.File(tmp_txt, app=self.app)
+        self.assertEqual(f.mimetype, 'text/plain; charset=us-ascii')
+        self.assertEqual(f.type, 'text/plain')
+        self.assertEqual(f.encoding, 'us-ascii')
 
-            f = self.module.File(tmp_err, app=self.app)
-            self.assertEqual(f.mimetype, 'application/octet-stream')
-            self.assertEqual(f.type, 'application/octet-stream')
-            self.assertEqual(f.encoding, 'default')
+        f = self.module.File(tmp_err, app=self.app)
+        self.assertEqual(f.mimetype, 'application/octet-stream')
+        self.assertEqual(f.type, 'application/octet-stream')
+        self.assertEqual(f.encoding, 'default')
 
-        # test non-working file command
+        # test non-working file command, not used by default
         bad_path = os.path.join(self.workbench, 'path')
         os.mkdir(bad_path)
 
@@ -111,7 +134,8 @@ class TestFile(unittest.TestCase):
 
         try:
             f = self.module.File(tmp_txt, app=self.app)
-            self.assertEqual(f.mimetype, 'application/octet-stream')
+            self.assertEqual(f.mimetype, 'text/plain; charset=us-ascii')
+            self.assertIsNone(browsepy.mimetype.by_file(tmp_txt))
         finally:
             os.environ['PATH'] = old_path
 
@@ -223,6 +247,20 @@ class TestFileFunctions(unittest.TestCase):
         for n, unit in enumerate(self.module.standard_units):
             self.assertEqual(fnc(1000**n, False), (1, unit))
 
+    def test_sorted_window(self):
+        fnc = self.module.sorted_window
+        items = [(n % 3, n) for n in range(10)]
+        key = (lambda x: x[0])
+        for reverse in (False, True):
+            expected = sorted(items, key=key, reverse=reverse)
+            self.assertEqual(fnc(items, key, reverse), expected)
+            for offset, limit in ((0, 3), (2, 4), (8, 5), (12, 1)):
+                self.assertEqual(
+                    fnc(items, key, reverse, offset, limit),
+                    expected[offset:offset + limit]
+                    )
+        self.assertEqual(fnc(items, None, True, 1, 2), [items[8], items[7]])
+
     def test_secure_filename(self):
         self.assertEqual(self.module.secure_filename('/path'), 'path')
         self.assertEqual(self.module.secure_filename('..'), '')
@@ -0,0 +1,155 @@
+
+import os
+import os.path
+import time
+import unittest
+import tempfile
+import shutil
+
+import browsepy.follow
+
+
+class TestFormatEvent(unittest.TestCase):
+    module = browsepy.follow
+
+    def test_format(self):
+        format_event = self.module.format_event
+        self.assertEqual(format_event('a'), 'data: a\n\n')
+        self.assertEqual(
+            format_event('a\r\nb\rc\n', 'rotate', '1:2'),
+            'event: rotate\nid: 1:2\ndata: a\ndata: b\ndata: c\ndata: \n\n'
+            )
+
+    def test_parse_event_id(self):
+        self.assertEqual(self.module.parse_event_id('12:34'), (12, 34))
+        self.assertRaises(ValueError, self.module.parse_event_id, '12')
+        self.assertRaises(ValueError, self.module.parse_event_id, 'a:b')
+
+
+class TestFileFollower(unittest.TestCase):
+    module = browsepy.follow
+    timeout = 5
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+        self.path = os.path.join(self.workbench, 'file.log')
+        self.write(b'first\n', 'wb')
+        self.manager = self.module.FollowManager()
+        self.manager.default_interval = 0.01
+        self.subscriptions = []
+
+    def tearDown(self):
+        for subscription in self.subscriptions:
+            subscription.close()
+        for follower in list(self.manager.followers.values()):
+            if follower._thread:
+                follower._thread.join(self.timeout)
+        shutil.rmtree(self.workbench)
+
+    def write(self, data, mode='ab'):
+        with open(self.path, mode) as f:
+            f.write(data)
+
+    def subscribe(self, *args):
+        subscription = self.manager.subscribe(self.path, *args)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def receive(self, subscription, size):
+        events = []
+        data = b''
+        while len(data) < size:
+            items = subscription.pop(self.timeout)
+            self.assertTrue(items, 'timeout waiting for data')
+            for event, ident, chunk in items:
+                if event is None:
+                    data += chunk
+                else:
+                    events.append((event, chunk))
+        return data, events
+
+    def test_shared(self):
+        a = self.subscribe()
+        b = self.subscribe(0)
+        self.assertEqual(len(self.manager.followers), 1)
+        follower = self.manager.followers[self.path]
+        self.assertIs(a.follower, follower)
+        self.assertIs(b.follower, follower)
+        self.assertEqual(self.receive(b, 6), (b'first\n', []))
+        self.write(b'second\n')
+        self.assertEqual(self.receive(a, 7), (b'second\n', []))
+        self.assertEqual(self.receive(b, 7), (b'second\n', []))
+
+    def test_offset(self):
+        subscription = self.subscribe(-3)
+        self.assertEqual(self.receive(subscription, 3), (b'st\n', []))
+        inode = os.stat(self.path).st_ino
+        subscription = self.subscribe(2, inode)
+        self.assertEqual(self.receive(subscription, 4), (b'rst\n', []))
+        subscription = self.subscribe(2, inode + 1)  # rotated meanwhile
+        self.assertEqual(self.receive(subscription, 6), (b'first\n', []))
+
+    def test_rotate(self):
+        subscription = self.subscribe(0)
+        self.assertEqual(self.receive(subscription, 6), (b'first\n', []))
+        self.write(b'last\n')
+        os.rename(self.path, self.path + '.1')
+        self.write(b'new\n', 'wb')
+        data, events = self.receive(subscription, 9)
+        self.assertEqual(data, b'last\nnew\n')
+        self.assertEqual([event for event, _ in events], ['rotate'])
+
+        self.write(b'x\n', 'wb')  # truncation
+        data, events = self.receive(subscription, 2)
+        self.assertEqual(data, b'x\n')
+        self.assertEqual([event for event, _ in events], ['rotate'])
+
+    def test_missing(self):
+        os.remove(self.path)
+        self.manager.default_interval = 0.1
+        subscription = self.subscribe()
+        follower = subscription.follower
+        polls = []
+        poll = follower.poll
+        follower.poll = lambda *args: polls.append(args) or poll(*args)
+        time.sleep(0.3)
+        self.assertLess(len(polls), 10)  # waits interval between failures
+        self.write(b'', 'wb')
+        time.sleep(0.3)
+        self.write(b'created\n')
+        self.assertEqual(self.receive(subscription, 8), (b'created\n', []))
+
+    def test_skip(self):
+        subscription = self.module.Subscription(None, max_bytes=10)
+        subscription.push(None, '1:6', b'abcdef')
+        subscription.push('rotate', '2:0')
+        subscription.push(None, '2:6', b'ghijkl')
+        self.assertEqual(
+            subscription.pop(0),
+            [('rotate', '2:0', b''), ('skip', '2:6', b'12')]
+            )
+
+    def test_stop(self):
+        subscription = self.subscribe()
+        follower = subscription.follower
+        subscription.close()
+        follower._thread.join(self.timeout)
+        self.assertFalse(follower.alive)
+        self.assertEqual(self.manager.followers, {})
+        self.assertIsNot(self.subscribe().follower, follower)
+
+    def test_iter(self):
+        subscription = self.subscribe(0)
+        subscription.heartbeat = 0.01
+        events = iter(subscription)
+        self.assertEqual(next(events), b'retry: 3000\n\n')
+        inode = os.stat(self.path).st_ino
+        event = next(events)
+        while event == b':\n\n':
+            event = next(events)
+        self.assertEqual(
+            event.decode('utf-8'),
+            'id: %d:6\ndata: first\ndata: \n\n' % inode
+            )
+        events.close()
+        self.assertTrue(subscription.closed)
@@ -0,0 +1,258 @@
+
+import os
+import os.path
+import gzip
+import json
+import unittest
+import tempfile
+import shutil
+
+import browsepy.grep
+import browsepy.stream
+
+
+class TestMatcher(unittest.TestCase):
+    module = browsepy.grep
+
+    def test_required_literal(self):
+        required = self.module.required_literal
+        self.assertEqual(required(br'10\.0\.0\.7$'), b'10.0.0.7')
+        self.assertEqual(required(br'^GET /(a|b) HTTP/1'), b' HTTP/1')
+        self.assertEqual(required(br'ab*cd'), b'cd')
+        self.assertIsNone(required(br'a|b'))
+        self.assertIsNone(required(br'[ab]+'))
+
+    def test_iter_lines(self):
+        data = b'alpha\nbeta\ngamma\nBETA\n'
+
+        def lines(*args, **kwargs):
+            matcher = self.module.Matcher(*args, **kwargs)
+            return [
+                data[start:end]
+                for start, end in matcher.iter_lines(data, 0, len(data))
+                ]
+
+        self.assertEqual(lines('beta'), [b'beta'])
+        self.assertEqual(lines('beta', ignore_case=True), [b'beta', b'BETA'])
+        self.assertEqual(lines('a$'), [b'alpha', b'beta', b'gamma'])
+        self.assertEqual(lines('^.e'), [b'beta'])
+        self.assertEqual(lines('a.', literal=True), [])
+        self.assertEqual(lines('(?i)ETA'), [b'beta', b'BETA'])
+
+        matcher = self.module.Matcher('a.p')
+        self.assertEqual(matcher.literal, b'a')
+        matcher = self.module.Matcher('a.p', literal=True)
+        self.assertEqual(matcher.literal, b'a.p')
+        self.assertIsNone(matcher.regex)
+
+
+class TestGrepFile(unittest.TestCase):
+    module = browsepy.grep
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+        self.data = b''.join(
+            b'line %d from 10.0.0.%d\r\n' % (n, n % 256)
+            for n in range(1, 2001)
+            )
+        self.expected = [
+            (n, b'line %d from 10.0.0.7\r' % n)
+            for n in range(7, 2001, 256)
+            ]
+        self.matcher = self.module.Matcher(r'10\.0\.0\.7\s*$')
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def test_buffer(self):
+        for buffsize in (10, 100, 1048576):
+            self.assertEqual(
+                self.module.grep_buffer(self.data, self.matcher, buffsize),
+                self.expected
+                )
+        self.assertEqual(
+            self.module.grep_buffer(self.data, self.matcher, max_matches=2),
+            self.expected[:2]
+            )
+        self.assertEqual(
+            self.module.grep_buffer(
+                self.data, self.matcher, deadline=1, clock=lambda: 2),
+            []
+            )
+
+    def test_chunks(self):
+        for size in (1, 7, 100, len(self.data)):
+            chunks = [
+                self.data[i:i + size]
+                for i in range(0, len(self.data), size)
+                ]
+            self.assertEqual(
+                self.module.grep_chunks(chunks, self.matcher),
+                self.expected
+                )
+        matches = self.module.grep_chunks(
+            [self.data], self.matcher, max_line=4)
+        self.assertEqual(matches[0], (7, b'line'))
+        matcher = self.module.Matcher('last')
+        self.assertEqual(
+            self.module.grep_chunks([b'a\nla', b'st'], matcher),
+            [(2, b'last')]
+            )
+
+    def test_file(self):
+        path = os.path.join(self.workbench, 'file.log')
+        with open(path, 'wb') as f:
+            f.write(self.data)
+        self.assertEqual(
+            self.module.grep_file(path, self.matcher, 100),
+            (path, self.expected)
+            )
+
+        path = os.path.join(self.workbench, 'file.log.gz')
+        with gzip.open(path, 'wb') as f:
+            f.write(self.data)
+        self.assertEqual(
+            self.module.grep_file(path, self.matcher, 100),
+            (path, self.expected)
+            )
+
+        path = os.path.join(self.workbench, 'empty.log')
+        open(path, 'wb').close()
+        self.assertEqual(
+            self.module.grep_file(path, self.matcher), (path, []))
+
+        path = os.path.join(self.workbench, 'missing.log')
+        self.assertEqual(
+            self.module.grep_file(path, self.matcher), (path, []))
+
+        for ext in ('gz', 'bz2', 'xz'):
+            path = os.path.join(self.workbench, 'bogus.log.' + ext)
+            with open(path, 'wb') as f:
+                f.write(self.data)  # not actually compressed
+            self.assertEqual(
+                self.module.grep_file(path, self.matcher), (path, []))
+
+
+class TestGrepSearch(unittest.TestCase):
+    module = browsepy.grep
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+        self.base = os.path.join(self.workbench, 'base')
+        self.outside = os.path.join(self.workbench, 'outside')
+        for name in ('host0', 'host1', 'excluded'):
+            os.makedirs(os.path.join(self.base, name, 'logs'))
+            self.write(os.path.join(name, 'logs', 'app.log'), b'a\nhit\n')
+            self.write(os.path.join(name, 'logs', 'app.txt'), b'hit\n')
+        os.makedirs(self.outside)
+        with open(os.path.join(self.outside, 'secret.log'), 'wb') as f:
+            f.write(b'hit\n')
+        os.symlink(
+            os.path.join(self.outside, 'secret.log'),
+            os.path.join(self.base, 'host0', 'secret.log'))
+        os.symlink(self.outside, os.path.join(self.base, 'host0', 'outside'))
+        os.symlink(
+            os.path.join(self.base, 'host1', 'logs', 'app.log'),
+            os.path.join(self.base, 'host0', 'link.log'))
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def write(self, relpath, data):
+        with open(os.path.join(self.base, relpath), 'wb') as f:
+            f.write(data)
+
+    def search(self, path='', **kwargs):
+        kwargs.setdefault('exclude', lambda path: path.endswith('excluded'))
+        search = self.module.GrepSearch(
+            os.path.join(self.base, path),
+            self.module.Matcher('hit'),
+            base=self.base,
+            **kwargs
+            )
+        return search, sorted(
+            (os.path.relpath(match.path, self.base), match.line)
+            for match in search
+            )
+
+    def test_search(self):
+        search, matches = self.search()
+        self.assertIsNone(search.stopped)
+        self.assertEqual(matches, [
+            ('host0/link.log', 2),
+            ('host0/logs/app.log', 2),
+            ('host0/logs/app.txt', 1),
+            ('host1/logs/app.log', 2),
+            ('host1/logs/app.txt', 1),
+            ])
+
+        search, matches = self.search(
+            'host0',
+            walk_filter=browsepy.stream.WalkFilter(include=['*.log']),
+            workers=2,
+            )
+        self.assertEqual(matches, [
+            ('host0/link.log', 2),
+            ('host0/logs/app.log', 2),
+            ])
+
+        search, matches = self.search('host0/logs/app.txt')
+        self.assertEqual(matches, [('host0/logs/app.txt', 1)])
+
+    def test_corrupt(self):
+        for ext in ('gz', 'bz2', 'xz'):
+            self.write('host0/logs/bogus.log.' + ext, b'hit\n')
+        for workers in (0, 2):
+            search, matches = self.search('host0/logs', workers=workers)
+            self.assertIsNone(search.stopped)
+            self.assertEqual(matches, [
+                ('host0/logs/app.log', 2),
+                ('host0/logs/app.txt', 1),
+                ])
+
+    def test_limits(self):
+        search, matches = self.search(max_matches=2)
+        self.assertEqual(len(matches), 2)
+        self.assertEqual(search.stopped, 'matches')
+
+        search, matches = self.search(max_matches=2, workers=2)
+        self.assertEqual(len(matches), 2)
+        self.assertEqual(search.stopped, 'matches')
+
+        search, matches = self.search(timeout=-1)
+        self.assertEqual(matches, [])
+        self.assertEqual(search.stopped, 'time')
+
+    @unittest.skipIf(
+        browsepy.grep.resource is None or browsepy.grep.futures is None,
+        'cpu limits not supported')
+    def test_cpu_limit(self):
+        self.write('slow.log', b'c' + b'a' * 40 + b'!\n')
+        search = self.module.GrepSearch(
+            self.base,
+            self.module.Matcher('(a+)+c'),  # catastrophic backtracking
+            workers=1,
+            cpu_time=1,
+            )
+        self.assertEqual(list(search), [])
+        self.assertEqual(search.stopped, 'cpu')
+
+    def test_serialize(self):
+        search = self.module.GrepSearch(
+            os.path.join(self.base, 'host1', 'logs', 'app.log'),
+            self.module.Matcher('hit'),
+            )
+        self.assertEqual(
+            ''.join(self.module.iter_text(search, self.base)),
+            'host1/logs/app.log:2:hit\n'
+            )
+        self.assertEqual(
+            json.loads(''.join(self.module.iter_json(search, self.base))),
+            [{'path': 'host1/logs/app.log', 'line': 2, 'text': 'hit'}]
+            )
+        search.max_matches = 1
+        self.write(os.path.join('host1', 'logs', 'app.log'), b'hit\nhit\n')
+        self.assertEqual(
+            ''.join(self.module.iter_text(search, self.base)),
+            'host1/logs/app.log:1:hit\n--\nstopped: matches limit reached\n'
+            )
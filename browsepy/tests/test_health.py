@@ -0,0 +1,83 @@
+import os
+import os.path
+import unittest
+import tempfile
+import shutil
+import json
+import base64
+import datetime
+
+import browsepy
+import browsepy.health
+import browsepy.tests.utils as test_utils
+
+
+class TestHealth(unittest.TestCase):
+    module = browsepy.health
+
+    def setUp(self):
+        self.app = browsepy.app
+        self.base = tempfile.mkdtemp()
+        self.original_config = dict(
+            (key, self.app.config[key])
+            for key in ('directory_base', 'exclude_fnc', 'log_rules')
+            )
+        self.app.config.update(
+            directory_base=self.base,
+            exclude_fnc=lambda path: path.endswith('excluded'),
+            log_rules=(('log', 'logs', 'log_', '%Y%m%d'),)
+            )
+        self.app.extensions['log_index'].clear()
+        date = datetime.date.today() - datetime.timedelta(days=1)
+        for name in ('good', 'bad', 'excluded'):
+            os.makedirs(os.path.join(self.base, name, 'logs'))
+        open(os.path.join(self.base, 'file'), 'w').close()
+        open(
+            os.path.join(self.base, 'good', 'logs',
+                         'log_%s' % date.strftime('%Y%m%d')),
+            'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.base)
+        self.app.config.update(self.original_config)
+        self.app.extensions['log_index'].clear()
+        test_utils.clear_flask_context()
+
+    def test_iter_health(self):
+        results = sorted(self.module.iter_health(self.base, self.app, 2))
+        self.assertEqual(
+            [(r.urlpath, r.ok, dict(r.logs)) for r in results],
+            [('bad', False, {'log': False}), ('good', True, {'log': True})]
+            )
+        results = list(
+            self.module.iter_health(self.base, self.app, 2, failing=True))
+        self.assertEqual([r.urlpath for r in results], ['bad'])
+
+    def test_serialize(self):
+        results = sorted(self.module.iter_health(self.base, self.app))
+        data = json.loads(''.join(self.module.iter_json(results)))
+        self.assertEqual(
+            data,
+            [
+                {'path': 'bad', 'ok': False, 'logs': {'log': False}},
+                {'path': 'good', 'ok': True, 'logs': {'log': True}},
+            ]
+            )
+        self.assertEqual(
+            ''.join(self.module.iter_csv(results, ['log'])).splitlines(),
+            ['path,ok,log', 'bad,0,0', 'good,1,1']
+            )
+        self.assertEqual(''.join(self.module.iter_json(())), '[\n]\n')
+
+    def test_endpoint(self):
+        credentials = base64.b64encode(b'admin:password').decode('ascii')
+        headers = {'Authorization': 'Basic %s' % credentials}
+        with self.app.test_client() as client:
+            response = client.get('/health.csv?failing=yes', headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                response.data.decode('utf-8').splitlines(),
+                ['path,ok,log', 'bad,0,0']
+                )
+            response = client.get('/health', headers=headers)
+            self.assertEqual(len(json.loads(response.data.decode())), 2)
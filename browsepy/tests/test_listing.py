@@ -0,0 +1,70 @@
+import os
+import os.path
+import time
+import unittest
+import tempfile
+import shutil
+
+import browsepy.listing
+import browsepy.scan
+import browsepy.compat
+
+
+class TestListingCache(unittest.TestCase):
+    module = browsepy.listing
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+        self.cache = self.module.ListingCache()
+        open(os.path.join(self.workbench, 'file'), 'w').close()
+        self.age(self.workbench)
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def age(self, path, seconds=60):
+        mtime = time.time() - seconds
+        os.utime(path, (mtime, mtime))
+
+    def snapshots(self):
+        return tuple(
+            browsepy.scan.snapshot(entry)
+            for entry in browsepy.compat.scandir(self.workbench)
+            )
+
+    def test_cache(self):
+        stats = os.stat(self.workbench)
+        snapshots = self.snapshots()
+        self.cache.set(self.workbench, snapshots, stats)
+        self.assertIs(self.cache.get(self.workbench), snapshots)
+
+        self.cache.invalidate(self.workbench)
+        self.assertIsNone(self.cache.get(self.workbench))
+
+        self.cache.set(self.workbench, snapshots, stats)
+        os.mkdir(os.path.join(self.workbench, 'dir'))
+        self.age(self.workbench, 30)
+        self.assertIsNone(self.cache.get(self.workbench))  # mtime changed
+
+    def test_racy(self):
+        self.age(self.workbench, 0)
+        stats = os.stat(self.workbench)
+        self.cache.set(self.workbench, self.snapshots(), stats)
+        self.assertIsNone(self.cache.get(self.workbench))
+
+    def test_disabled(self):
+        self.cache.app = type('App', (object,), {
+            'config': {'listing_cache_size': 0},
+            })
+        stats = os.stat(self.workbench)
+        self.cache.set(self.workbench, self.snapshots(), stats)
+        self.assertIsNone(self.cache.get(self.workbench))
+        self.assertFalse(self.cache.enabled)
+
+    def test_snapshots_size(self):
+        snapshots = self.snapshots()
+        self.assertGreater(self.module.snapshots_size(snapshots), 0)
+        self.assertGreater(
+            self.module.snapshots_size(snapshots + snapshots),
+            self.module.snapshots_size(snapshots)
+            )
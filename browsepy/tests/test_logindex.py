@@ -0,0 +1,112 @@
+import os
+import os.path
+import unittest
+import tempfile
+import shutil
+import datetime
+
+import browsepy.logindex
+import browsepy.scan
+
+
+class AppMock(object):
+    def __init__(self, **config):
+        self.config = config
+        self.extensions = {}
+
+
+class TestLogIndex(unittest.TestCase):
+    module = browsepy.logindex
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+        self.now = 1000000000.
+        self.index = self.module.LogIndex()
+        self.index.clock = lambda: self.now
+        self.yesterday = (
+            datetime.datetime.fromtimestamp(self.now) -
+            datetime.timedelta(days=1)
+            ).date()
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def touch(self, *parts):
+        path = os.path.join(self.workbench, *parts)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        open(path, 'w').close()
+        return path
+
+    def test_date_regex(self):
+        regex = self.module.date_regex('%Y-%m-%d')
+        self.assertTrue(regex.search('httplog_2026-10-15.log'))
+        self.assertFalse(regex.search('httplog_20261015.log'))
+
+    def test_parse_dates(self):
+        dates = self.module.parse_dates(
+            ('vpn_20261015', 'vpn_20261014.gz', 'vpn_2026101', 'x_20261013'),
+            'vpn_', '%Y%m%d')
+        self.assertEqual(
+            dates,
+            frozenset((
+                datetime.date(2026, 10, 15),
+                datetime.date(2026, 10, 14),
+                ))
+            )
+
+    def test_check(self):
+        host = os.path.join(self.workbench, 'host')
+        date = self.yesterday.strftime('%Y-%m-%d')
+        self.touch('host', 'data', 'goprobe', 'httplog_%s.log' % date)
+
+        self.assertEqual(self.index.check(host), frozenset(('http',)))
+        self.assertTrue(self.index.has(host, 'http'))
+        self.assertFalse(self.index.has(host, 'pppauth'))
+        self.assertEqual(self.index.missing('http'), [])
+        self.assertEqual(self.index.missing('master'), [host])
+
+        self.assertEqual(
+            self.index.check(host, names=('vpnserver',)),
+            frozenset(('http',))  # cached
+            )
+
+    def test_rules(self):
+        rule = browsepy.scan.LogRule(
+            'weekly', 'logs', 'weekly_', '%Y%m%d', lookback=7)
+        index = self.module.LogIndex(rules=(rule,))
+        index.clock = self.index.clock
+        host = os.path.join(self.workbench, 'host')
+        date = self.yesterday - datetime.timedelta(days=5)
+        self.touch('host', 'logs', 'weekly_%s' % date.strftime('%Y%m%d'))
+        self.assertEqual(index.check(host), frozenset(('weekly',)))
+        self.assertTrue(index.has(host, 'weekly'))
+        self.assertFalse(index.has(host, 'weekly', self.yesterday))
+        self.assertEqual(index.dates(host, 'weekly'), frozenset((date,)))
+        self.assertRaises(KeyError, index.has, host, 'http')
+
+    def test_refresh(self):
+        host = os.path.join(self.workbench, 'host')
+        date = self.yesterday.strftime('%Y-%m-%d')
+        self.touch('host', 'data', 'goprobe', 'other')
+        self.assertFalse(self.index.has(host, 'http'))
+
+        self.touch('host', 'data', 'goprobe', 'httplog_%s.log' % date)
+        self.assertFalse(self.index.has(host, 'http'))  # within ttl
+
+        self.now += self.index.ttl
+        self.assertTrue(self.index.has(host, 'http'))
+
+        self.index.clear()
+        self.assertEqual(self.index.missing('http'), [])
+
+    def test_size(self):
+        rule = browsepy.scan.LogRule('http', 'logs', 'http_', '%Y%m%d')
+        index = self.module.LogIndex(AppMock(log_index_size=2), (rule,))
+        index.clock = self.index.clock
+        hosts = [os.path.join(self.workbench, 'host%d' % i) for i in range(3)]
+        for host in hosts:
+            self.touch(host, 'logs', 'other')
+            index.check(host)
+        self.assertEqual(len(index._state), 2)
+        self.assertEqual(index.missing('http'), hosts[1:])  # host0 evicted
@@ -0,0 +1,96 @@
+import os
+import os.path
+import time
+import unittest
+import tempfile
+import shutil
+
+import browsepy.appconfig
+import browsepy.manager
+import browsepy.mimetype
+import browsepy.mimecache
+
+
+class TestMimetypeCache(unittest.TestCase):
+    module = browsepy.mimecache
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+        self.path = os.path.join(self.workbench, 'file')
+        with open(self.path, 'w') as f:
+            f.write('text')
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def test_file_key(self):
+        key = self.module.file_key(self.path, 'ns')
+        self.assertTrue(key.startswith('ns:'))
+        self.assertEqual(key, self.module.file_key(self.path, 'ns'))
+        self.assertNotEqual(key, self.module.file_key(self.path, 'other'))
+
+        mtime = time.time() - 10
+        os.utime(self.path, (mtime, mtime))
+        self.assertNotEqual(key, self.module.file_key(self.path, 'ns'))
+        self.assertIsNone(self.module.file_key(self.path + '.missing'))
+
+    def test_memory(self):
+        cache = self.module.MimetypeCache(maxsize=10)
+        keys = cache.keys([self.path, self.path + '.missing'])
+        self.assertIsNone(keys[1])
+        self.assertEqual(cache.get_many(keys), [None, None])
+        cache.set_many(zip(keys, ['text/plain', 'text/plain']))
+        self.assertEqual(cache.get_many(keys), ['text/plain', None])
+
+    def test_store(self):
+        directory = os.path.join(self.workbench, 'cache')
+        cache = self.module.MimetypeCache(directory=directory)
+        keys = cache.keys([self.path])
+        cache.set_many(zip(keys, ['text/plain']))
+        self.assertTrue(os.path.isfile(
+            os.path.join(directory, cache.store_filename)))
+
+        cache = self.module.MimetypeCache(directory=directory)
+        self.assertEqual(cache.get_many(keys), ['text/plain'])
+        cache = self.module.MimetypeCache(directory=directory, namespace='x')
+        self.assertEqual(cache.get_many(cache.keys([self.path])), [None])
+
+    def test_manager(self):
+        app = browsepy.appconfig.Flask('test_mimecache')
+        app.config.update(
+            plugin_modules=(),
+            mimetype_cache_size=10,
+            mimetype_cache_dir=os.path.join(self.workbench, 'cache'),
+            )
+        calls = []
+
+        def mimetype_fnc(path):
+            calls.append(path)
+            return 'text/x-test'
+
+        manager = browsepy.manager.MimetypePluginManager(app)
+        manager.register_mimetype_function(mimetype_fnc)
+        for i in range(3):
+            self.assertEqual(manager.get_mimetype(self.path), 'text/x-test')
+        self.assertEqual(calls, [self.path])
+
+        manager.reload()  # memory is cleared
+        manager.register_mimetype_function(mimetype_fnc)
+        self.assertEqual(manager.get_mimetype(self.path), 'text/x-test')
+        self.assertEqual(calls, [self.path])
+
+    def test_manager_fallback(self):
+        app = browsepy.appconfig.Flask('test_mimecache')
+        app.config.update(plugin_modules=(), mimetype_cache_size=10)
+        detected = []
+
+        def mimetype_fnc(path):
+            return detected[0] if detected else None
+
+        manager = browsepy.manager.MimetypePluginManager(app)
+        manager.register_mimetype_function(mimetype_fnc)
+        manager._mimetype_functions.remove(browsepy.mimetype.by_magic)
+        self.assertEqual(
+            manager.get_mimetype(self.path), 'application/octet-stream')
+        detected.append('text/x-test')  # ie. file got readable
+        self.assertEqual(manager.get_mimetype(self.path), 'text/x-test')
@@ -0,0 +1,125 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import os.path
+import gzip
+import unittest
+import tempfile
+import shutil
+
+import browsepy.appconfig
+import browsepy.manager
+import browsepy.mimetype
+
+
+class TestMimetype(unittest.TestCase):
+    module = browsepy.mimetype
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def write(self, name, data):
+        path = os.path.join(self.workbench, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_sniff_signature(self):
+        fnc = self.module.sniff_signature
+        self.assertEqual(
+            fnc(b'\x1f\x8b\x08\x00'),
+            'application/gzip; charset=binary'
+            )
+        self.assertEqual(
+            fnc(b'\0' * 257 + b'ustar\x0000'),
+            'application/x-tar; charset=binary'
+            )
+        self.assertIsNone(fnc(b'plain text'))
+
+    def test_sniff_text(self):
+        fnc = self.module.sniff_text
+        text = u'ñandú'
+        self.assertEqual(fnc(b'log line\n'), 'text/plain; charset=us-ascii')
+        self.assertEqual(
+            fnc(text.encode('utf-8')),
+            'text/plain; charset=utf-8'
+            )
+        self.assertEqual(
+            fnc(text.encode('utf-8')[:-1]),  # truncated sequence
+            'text/plain; charset=utf-8'
+            )
+        self.assertEqual(
+            fnc(text.encode('latin-1')),
+            'text/plain; charset=iso-8859-1'
+            )
+        self.assertEqual(
+            fnc(b'  <?XML version="1.0"?>'),
+            'text/xml; charset=us-ascii'
+            )
+        self.assertIsNone(fnc(b'\x00\x01\x02'))
+        self.assertIsNone(fnc(b'\x7f\x03abc'))
+
+    def test_by_magic(self):
+        self.check_by_magic()
+
+    def test_by_magic_without_libmagic(self):
+        libmagic = self.module.libmagic
+        try:
+            self.module.libmagic = None
+            self.check_by_magic()
+        finally:
+            self.module.libmagic = libmagic
+
+    def check_by_magic(self):
+        fnc = self.module.by_magic
+        path = os.path.join(self.workbench, 'httplog_2026-10-15')
+        with gzip.open(path, 'wb') as f:
+            f.write(b'data')
+        self.assertEqual(fnc(path), 'application/gzip; charset=binary')
+        self.assertEqual(
+            fnc(self.write('vpn_20261015', b'ascii log\n')),
+            'text/plain; charset=us-ascii'
+            )
+        self.assertEqual(
+            fnc(self.write('empty', b'')),
+            'inode/x-empty; charset=binary'
+            )
+        self.assertIsNone(fnc(self.write('binary', b'\x00\x01\x02\x03')))
+        self.assertIsNone(fnc(self.workbench))
+        self.assertIsNone(fnc(os.path.join(self.workbench, 'missing')))
+        if hasattr(os, 'mkfifo'):
+            fifo = os.path.join(self.workbench, 'fifo')
+            os.mkfifo(fifo)
+            self.assertEqual(fnc(fifo), 'inode/fifo; charset=binary')
+
+    def test_batch(self):
+        paths = [
+            self.write('a.txt', b'text'),
+            self.write('b.txt', b'text'),
+            self.write('log_20261015', b'text'),
+            self.write('log.tar.gz', b'\x1f\x8b\x08\x00'),
+            ]
+        self.assertEqual(
+            self.module.by_python.batch(paths),
+            list(map(self.module.by_python, paths))
+            )
+        self.assertEqual(
+            self.module.by_magic.batch(paths * 4, workers=2),
+            list(map(self.module.by_magic, paths * 4))
+            )
+        self.assertEqual(
+            self.module.by_file.batch(paths, size=3),
+            list(map(self.module.by_file, paths))
+            )
+
+    def test_file_command(self):
+        app = browsepy.appconfig.Flask('test_mimetype')
+        app.config['plugin_modules'] = ()
+        manager = browsepy.manager.MimetypePluginManager(app)
+        self.assertNotIn(self.module.by_file, manager._mimetype_functions)
+        app.config['mimetype_file_command'] = True
+        manager.reload()
+        self.assertIn(self.module.by_file, manager._mimetype_functions)
@@ -5,6 +5,7 @@ import unittest
 import re
 import os
 import os.path
+import json
 import shutil
 import tempfile
 import tarfile
@@ -335,6 +336,103 @@ class TestApp(unittest.TestCase):
             self.get, 'open', path='../shall_not_pass.txt'
         )
 
+    def test_text(self):
+        content = b'hello\nworld\n'
+        with open(os.path.join(self.start, 'testfile3.txt'), 'wb') as f:
+            f.write(content)
+
+        page = self.get('text', path='start/testfile3.txt')
+        self.assertEqual(page.data, content)
+
+        page = self.get('text', path='start/testfile3.txt', lines=1)
+        self.assertEqual(page.data, b'world\n')
+
+        page = self.get('text', path='start/testfile3.txt', offset=2,
+                        length=3)
+        self.assertEqual(page.data, b'llo')
+
+        self.assertRaises(
+            Page400Exception,
+            self.get, 'text', path='start/testfile3.txt', lines=0
+        )
+
+        self.assertRaises(
+            Page404Exception,
+            self.get, 'text', path='exclude/testfile.txt'
+        )
+
+        with open(os.path.join(self.start, 'testfile3.txt.gz'), 'wb') as f:
+            f.write(content)  # not actually compressed
+        for args in ({}, {'lines': 2}, {'offset': 2, 'length': 3}):
+            self.assertRaises(
+                Page404Exception,
+                self.get, 'text', path='start/testfile3.txt.gz', **args
+            )
+
+        os.chmod(os.path.join(self.start, 'testfile3.txt'), 0)
+        if not os.access(os.path.join(self.start, 'testfile3.txt'), os.R_OK):
+            self.assertRaises(
+                Page404Exception,
+                self.get, 'text', path='start/testfile3.txt'
+            )
+
+    def test_grep(self):
+        with open(os.path.join(self.start, 'testfile3.txt'), 'wb') as f:
+            f.write(b'hello\nworld\n')
+        with open(os.path.join(self.exclude, 'testfile.txt'), 'wb') as f:
+            f.write(b'world\n')
+
+        page = self.get('grep_files', path='start', pattern='w.rld')
+        self.assertEqual(page.data, b'start/testfile3.txt:2:world\n')
+
+        page = self.get('grep_files', pattern='world', literal='1',
+                        extension='json')
+        self.assertEqual(
+            json.loads(page.data.decode('utf-8')),
+            [{'path': 'start/testfile3.txt', 'line': 2, 'text': 'world'}]
+        )
+
+        self.assertRaises(
+            Page400Exception,
+            self.get, 'grep_files', path='start', pattern='('
+        )
+
+        self.assertRaises(
+            Page404Exception,
+            self.get, 'grep_files', path='exclude', pattern='world'
+        )
+
+    def test_search(self):
+        open(os.path.join(self.start, 'testfile3.txt'), 'w').close()
+
+        page = self.get('search', q='testfile')
+        data = json.loads(page.data.decode('utf-8'))
+        self.assertTrue(data['complete'])
+        self.assertFalse(data['truncated'])
+        paths = [result['path'] for result in data['results']]
+        self.assertIn('start/testfile3.txt', paths)
+        self.assertNotIn('exclude/testfile.txt', paths)
+
+        page = self.get('search', q='start/*3.txt')
+        data = json.loads(page.data.decode('utf-8'))
+        self.assertEqual(
+            data['results'],
+            [{'path': 'start/testfile3.txt', 'directory': False}]
+        )
+
+        self.assertRaises(Page400Exception, self.get, 'search')
+
+    def test_tail(self):
+        self.assertRaises(
+            Page400Exception,
+            self.get, 'tail', path='start/testfile3.txt', offset='a'
+        )
+
+        self.assertRaises(
+            Page404Exception,
+            self.get, 'tail', path='exclude/testfile.txt'
+        )
+
     def test_remove(self):
         open(os.path.join(self.remove, 'testfile2.txt'), 'w').close()
         page = self.get('remove', path='remove/testfile2.txt')
@@ -455,6 +553,49 @@ class TestApp(unittest.TestCase):
             self.get, 'download_directory', path='exclude'
         )
 
+    def test_download_batch(self):
+        config = self.app.config
+        self.addCleanup(config.update, {
+            key: config.get(key)
+            for key in ('directory_downloadable', 'archive_cache_dir')
+            })
+        config.update(directory_downloadable=True, archive_cache_dir=None)
+
+        def tarball_files(**kwargs):
+            page = self.get('download_batch', extension='tgz', **kwargs)
+            iodata = io.BytesIO(page.data)
+            with tarfile.open('p.tgz', mode="r:gz", fileobj=iodata) as tgz:
+                return sorted(member.name for member in tgz.getmembers())
+
+        self.assertEqual(
+            tarball_files(path=['start', 'remove']),
+            ['remove', 'remove/testfile.txt', 'start', 'start/testfile.txt']
+        )
+        self.assertEqual(
+            tarball_files(glob='*', path='start'),
+            ['remove', 'remove/testfile.txt', 'start', 'start/testfile.txt',
+             'upload']
+        )
+
+        invalid = (
+            {},
+            {'path': 'exclude'},
+            {'path': 'start/testfile.txt'},
+            {'path': '../../shall_not_pass'},
+            {'glob': '../*'},
+        )
+        for kwargs in invalid:
+            self.assertRaises(
+                Page404Exception,
+                self.get, 'download_batch', extension='tgz', **kwargs
+            )
+
+        config['directory_downloadable'] = False
+        self.assertRaises(
+            Page404Exception,
+            self.get, 'download_batch', extension='tgz', path='start'
+        )
+
     def test_upload(self):
         def genbytesio(nbytes, encoding):
             c = unichr if PY_LEGACY else chr  # noqa
@@ -0,0 +1,269 @@
+
+import os
+import os.path
+import unittest
+import tempfile
+import shutil
+import threading
+import time
+
+import browsepy.nameindex
+
+
+class TestNameIndex(unittest.TestCase):
+    module = browsepy.nameindex
+
+    def setUp(self):
+        self.index = self.module.NameIndex()
+        self.host = self.index.add('Host0', is_dir=True)
+        self.logs = self.index.add('logs', self.host, True)
+        self.files = [
+            self.index.add(name, self.logs)
+            for name in ('app.log', 'app.log.1.gz', 'Error.log', 'x')
+            ]
+
+    def search(self, query, limit=None):
+        return sorted(
+            self.index.path(ident)
+            for ident in self.index.search(query, limit)
+            )
+
+    def test_glob_literals(self):
+        self.assertEqual(
+            self.module.glob_literals('app*.log.[0-9]?gz'),
+            ['app', '.log.', 'gz']
+            )
+
+    def test_search(self):
+        self.assertEqual(self.search('error'), ['Host0/logs/Error.log'])
+        self.assertEqual(self.search('.log'), [
+            'Host0/logs/Error.log',
+            'Host0/logs/app.log',
+            'Host0/logs/app.log.1.gz',
+            ])
+        self.assertEqual(self.search('x'), ['Host0/logs/x'])
+        self.assertEqual(self.search('*.gz'), ['Host0/logs/app.log.1.gz'])
+        self.assertEqual(self.search('?pp.lo[g]'), ['Host0/logs/app.log'])
+        self.assertEqual(self.search('host0'), ['Host0'])
+        self.assertEqual(self.search('0/logs/app'), [
+            'Host0/logs/app.log',
+            'Host0/logs/app.log.1.gz',
+            ])
+        self.assertEqual(self.search('host*/*/e*'), ['Host0/logs/Error.log'])
+        self.assertEqual(self.search('host0/'), ['Host0/logs'])
+        self.assertEqual(self.search('/app.log'), [
+            'Host0/logs/app.log',
+            'Host0/logs/app.log.1.gz',
+            ])
+        self.assertEqual(self.search('missing'), [])
+        self.assertEqual(len(self.search('log', 2)), 2)
+        self.assertTrue(self.index.is_dir(self.logs))
+        self.assertFalse(self.index.is_dir(self.files[0]))
+        link = self.index.add('link', self.host, True, True)
+        self.assertTrue(self.index.is_dir(link))
+        self.assertTrue(self.index.is_link(link))
+        self.assertFalse(self.index.is_link(self.logs))
+
+    def test_copy(self):
+        self.assertTrue(self.index.indexed('app'))
+        self.assertTrue(self.index.indexed('*.gz'))
+        self.assertFalse(self.index.indexed('x'))
+        self.assertFalse(self.index.indexed('ab/cd'))
+        index = self.index.copy()
+        self.assertIsNone(index.trigrams)
+        for query in ('x', 'app', 'lo*/*.gz'):
+            self.assertEqual(
+                index.search(query), self.index.search(query))
+        self.index.remove(self.files[-1])
+        self.index.add('xx', self.logs)
+        self.index.compact()
+        self.assertEqual(
+            [index.path(ident) for ident in index.search('x')],
+            ['Host0/logs/x']
+            )
+
+    def test_search_path(self):
+        ab = self.index.add('ab', is_dir=True)
+        ghijk = self.index.add('ghijk', ab, True)
+        self.index.add('x', ghijk)
+        self.index.add('ghij', self.index.add('cab', is_dir=True))
+        # last query slash is the one right before entry names
+        self.assertEqual(self.search('ab/ghij'), ['ab/ghijk', 'cab/ghij'])
+        self.assertEqual(self.search('ab/ghijk/'), ['ab/ghijk/x'])
+        self.assertEqual(self.search('ab/hij'), [])
+        self.assertEqual(self.search('ab/gh*'), ['ab/ghijk'])
+        self.assertEqual(self.search('*b/gh*'), ['ab/ghijk', 'cab/ghij'])
+        self.assertEqual(self.search('ab/*'), ['ab/ghijk'])
+        self.assertEqual(self.search('ab*'), ['ab'])
+
+    def test_remove(self):
+        self.index.remove(self.files[0])
+        self.index.remove(self.files[0])
+        self.assertEqual(self.index.removed, 1)
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(self.search('app'), ['Host0/logs/app.log.1.gz'])
+        for ident in self.files[1:] + [self.logs]:
+            self.index.remove(ident)
+        self.assertEqual(len(self.index), 1)
+        self.assertTrue(self.index.sparse)
+        self.assertEqual(self.search('o'), ['Host0'])
+
+    def test_compact(self):
+        for ident in [self.logs] + self.files:
+            self.index.remove(ident)
+        logs = self.index.add('logs', self.host, True)
+        self.index.add('new.log', logs)
+        remap = self.index.compact()
+        self.assertEqual(list(remap), [0, -1, -1, -1, -1, -1, 1, 2])
+        self.assertEqual(self.index.removed, 0)
+        self.assertFalse(self.index.sparse)
+        self.assertEqual(len(self.index.names), 3)
+        self.assertEqual(len(self.index.parents), 3)
+        self.assertEqual(len(self.index.kinds), 3)
+        self.assertNotIn('app', self.index.trigrams)
+        self.assertEqual(self.search('log'), [
+            'Host0/logs',
+            'Host0/logs/new.log',
+            ])
+        self.assertTrue(self.index.is_dir(1))
+
+
+class TestFilenameIndex(unittest.TestCase):
+    module = browsepy.nameindex
+
+    class app(object):
+        config = {}
+
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+        for name in ('host0', 'host1', 'excluded'):
+            os.makedirs(os.path.join(self.base, name, 'logs'))
+            self.touch(name, 'logs', 'app.log')
+        self.now = time.time()
+        self.threads = []
+        self.app.config = {
+            'directory_base': self.base,
+            'exclude_fnc': lambda path: path.endswith('excluded'),
+            'filename_index_ttl': 60,
+            }
+        self.index = self.module.FilenameIndex(self.app)
+        self.index.clock = lambda: self.now
+        self.index.thread_class = self.thread
+
+    def tearDown(self):
+        for thread in self.threads:
+            thread.join()
+        shutil.rmtree(self.base)
+
+    def thread(self, **kwargs):
+        thread = threading.Thread(**kwargs)
+        self.threads.append(thread)
+        return thread
+
+    def touch(self, *parts):
+        open(os.path.join(self.base, *parts), 'w').close()
+
+    def refresh(self):
+        self.now += 3600
+        self.index.update()
+        for thread in self.threads:
+            thread.join()
+
+    def test_search(self):
+        self.assertFalse(self.index.ready)
+        self.assertEqual(self.index.search('app'), [
+            ('host0/logs/app.log', False),
+            ('host1/logs/app.log', False),
+            ])
+        self.assertTrue(self.index.ready)
+        self.assertEqual(self.index.search('host'), [
+            ('host0', True),
+            ('host1', True),
+            ])
+        self.assertEqual(self.index.search('log', 1), [('host0/logs', True)])
+        self.assertEqual(len(self.threads), 1)
+        self.assertIs(self.app.extensions['filename_index'], self.index)
+
+    @unittest.skipIf(not hasattr(os, 'symlink'), 'symlinks not supported')
+    def test_symlinks(self):
+        os.symlink(
+            os.path.join(self.base, 'host1'),
+            os.path.join(self.base, 'host0', 'link'))
+        self.assertEqual(self.index.search('link'), [('host0/link', True)])
+        self.assertEqual(len(self.index.search('app')), 2)  # not followed
+        self.assertEqual(self.index.search('li'), [('host0/link', True)])
+
+    def test_unindexed(self):
+        self.index.update()
+        self.threads[-1].join()
+        locked = []
+        index = self.index.index
+        copy = index.copy
+
+        def copy_index():
+            result = copy()
+            search = result.search
+            result.search = lambda *args: (
+                locked.append(self.index._lock.locked()) or search(*args))
+            return result
+
+        index.copy = copy_index
+        self.assertEqual(self.index.search('lo'), [
+            ('host0/logs', True),
+            ('host0/logs/app.log', False),
+            ('host1/logs', True),
+            ('host1/logs/app.log', False),
+            ])
+        self.assertEqual(locked, [False])  # full scan without lock
+        self.index.search('app')
+        self.assertEqual(locked, [False])  # indexed, no copy
+
+    def test_refresh(self):
+        self.index.update()
+        self.touch('host0', 'logs', 'new.log')
+        shutil.rmtree(os.path.join(self.base, 'host1'))
+        self.assertEqual(self.index.search('new'), [])  # still fresh
+        self.refresh()
+        self.assertEqual(self.index.search('new'), [
+            ('host0/logs/new.log', False)])
+        self.assertEqual(self.index.search('host1'), [])
+        self.assertEqual(len(self.index.index), 4)
+
+        self.app.config['exclude_fnc'] = None
+        self.index.update()
+        self.threads[-1].join()
+        self.assertEqual(len(self.index.search('app')), 2)
+
+        listed = []
+        listdir = self.index._listdir
+        self.index._listdir = lambda *args: listed.append(args) or listdir(
+            *args)
+        self.refresh()
+        self.assertEqual(listed, [])  # no directory changed
+
+    def test_compact(self):
+        self.index.update()
+        self.threads[-1].join()
+        for name in ('host0', 'host1'):
+            shutil.rmtree(os.path.join(self.base, name))
+        os.makedirs(os.path.join(self.base, 'host2', 'logs'))
+        self.touch('host2', 'logs', 'app.log')
+        self.refresh()
+        index = self.index.index
+        self.assertEqual(index.removed, 0)
+        self.assertEqual(len(index.names), 3)
+        self.assertEqual(self.index.search('app'), [
+            ('host2/logs/app.log', False)])
+
+        listed = []
+        listdir = self.index._listdir
+        self.index._listdir = lambda *args: listed.append(args) or listdir(
+            *args)
+        self.touch('host2', 'logs', 'new.log')
+        self.refresh()
+        self.assertEqual(len(listed), 1)  # only changed directory
+        self.assertEqual(self.index.search('log'), [
+            ('host2/logs', True),
+            ('host2/logs/app.log', False),
+            ('host2/logs/new.log', False),
+            ])
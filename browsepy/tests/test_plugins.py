@@ -4,6 +4,8 @@ import flask
 
 import browsepy
 import browsepy.manager
+import browsepy.scan
+import browsepy.mimetype
 import browsepy.tests.utils as test_utils
 
 from browsepy.plugin.player.tests import *  # noqa
@@ -39,6 +41,72 @@ class TestMimetypePluginManager(unittest.TestCase):
             'application/xml'
             )
 
+    def test_mimetypes(self):
+        manager = self.module.MimetypePluginManager()
+        calls = []
+
+        def batch(paths):
+            calls.append(paths)
+            return ['application/xml' if x == 'b' else None for x in paths]
+
+        manager.register_mimetype_function(
+            browsepy.mimetype.batch(batch)(lambda x: None))
+        self.assertEqual(
+            manager.get_mimetypes(['a.txt', 'b', 'c']),
+            ['text/plain', 'application/xml', 'application/octet-stream']
+            )
+        self.assertEqual(calls, [['a.txt', 'b', 'c']])
+
+        manager.register_mimetype_function(
+            lambda x: 'text/x-c' if x == 'c' else None)
+        self.assertEqual(
+            manager.get_mimetypes(['c', 'd.txt']),
+            ['text/x-c', 'text/plain']
+            )
+        self.assertEqual(calls[-1], ['d.txt'])
+
+    def test_mimetype_extensions(self):
+        manager = self.module.MimetypePluginManager()
+        manager.register_mimetype_function(lambda x: 'text/x-fnc')
+        manager.register_mimetype_extensions({
+            'mp3': 'audio/x-test',
+            '.tar.gz': 'application/x-test-tgz',
+            })
+        self.assertEqual(
+            manager.get_mimetypes([
+                'a.mp3', 'b.MP3', 'c.tar.gz', 'd.gz', 'e.txt', '.mp3', 'f',
+                '/x.y/.g.tar.gz',
+                ]),
+            [
+                'audio/x-test', 'audio/x-test', 'application/x-test-tgz',
+                'text/x-fnc', 'text/x-fnc', 'text/x-fnc', 'text/x-fnc',
+                'application/x-test-tgz',
+                ]
+            )
+        self.assertIsNone(manager.get_extension_mimetype('f'))
+        manager.clear()
+        self.assertIsNone(manager.get_extension_mimetype('a.tar.gz'))
+
+
+class TestLogRulePluginManager(unittest.TestCase):
+    module = browsepy.manager
+
+    def test_log_rules(self):
+        manager = self.module.LogRulePluginManager()
+        self.assertEqual(
+            manager.get_log_rules(),
+            browsepy.scan.default_log_rules
+            )
+        rule = manager.register_log_rule(
+            'http', 'logs', 'http_', '%Y%m%d', lookback=2)
+        manager.register_log_rule('mail', 'logs', 'mail_', '%Y%m%d')
+        self.assertEqual(
+            [r.name for r in manager.get_log_rules()],
+            ['http', 'pppauth', 'master', 'cluster', 'mail']
+            )
+        self.assertIn(rule, manager.get_log_rules())
+        self.assertEqual(manager.get_log_rules()[-1].lookback, 1)
+
 
 class TestPlugins(unittest.TestCase):
     app_module = browsepy
@@ -0,0 +1,126 @@
+import os
+import os.path
+import unittest
+import tempfile
+import shutil
+import datetime
+
+import browsepy.scan
+import browsepy.cache
+import browsepy.compat
+
+
+class TestScan(unittest.TestCase):
+    module = browsepy.scan
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+        self.now = datetime.datetime(2026, 10, 16, 12)
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def touch(self, *parts):
+        path = os.path.join(self.workbench, *parts)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        open(path, 'w').close()
+        return path
+
+    def entry(self, name):
+        for entry in browsepy.compat.scandir(self.workbench):
+            if entry.name == name:
+                return entry
+        raise AssertionError('%r not found' % name)
+
+    def test_check_logs(self):
+        host = os.path.join(self.workbench, 'host')
+        self.touch('host', 'data', 'goprobe', 'httplog_2026-10-15.log')
+        self.touch('host', 'data', 'goprobe', 'pppauth_2026-10-14.log')
+        self.touch(
+            'host', 'vpnserver', 'master', 'server_log', 'vpn_20261015')
+        self.assertEqual(
+            self.module.check_logs(host, now=self.now),
+            frozenset(('http', 'master'))
+            )
+        self.assertEqual(
+            self.module.check_logs(host, names=('data',), now=self.now),
+            frozenset(('http',))
+            )
+        self.assertEqual(
+            self.module.check_logs(self.workbench, now=self.now),
+            frozenset()
+            )
+
+        rules = (self.module.LogRule('http', 'data/goprobe', 'httplog_',
+                                     '%Y-%m-%d', lookback=2),)
+        self.touch('other', 'data', 'goprobe', 'httplog_2026-10-14.log')
+        other = os.path.join(self.workbench, 'other')
+        self.assertEqual(
+            self.module.check_logs(other, rules=rules, now=self.now),
+            frozenset(('http',))
+            )
+        self.assertEqual(
+            self.module.check_logs(other, now=self.now),
+            frozenset()
+            )
+
+    def test_log_rule(self):
+        rule = self.module.log_rule(('a', 'b', 'c', '%Y'))
+        self.assertEqual(rule.lookback, 1)
+        rule = self.module.log_rule({
+            'name': 'a', 'subpath': 'b', 'prefix': 'c',
+            'date_format': '%Y', 'lookback': 7})
+        self.assertEqual(rule.lookback, 7)
+        self.assertIs(self.module.log_rule(rule), rule)
+
+    def test_snapshot(self):
+        with open(self.touch('file.txt'), 'w') as f:
+            f.write('a')
+        self.touch('host', 'data', 'goprobe', 'httplog_x')
+        self.touch('host', 'other')
+
+        snapshot = self.module.snapshot(self.entry('file.txt'))
+        self.assertFalse(snapshot.is_dir)
+        self.assertEqual(snapshot.size, 1)
+        self.assertEqual(snapshot.subdirs, 0)
+        self.assertEqual(snapshot.logs, frozenset())
+
+        snapshot = self.module.snapshot(self.entry('host'))
+        self.assertTrue(snapshot.is_dir)
+        self.assertEqual(snapshot.subdirs, 1)
+        self.assertEqual(snapshot.name, 'host')
+
+    def test_snapshot_broken_symlink(self):
+        if not hasattr(os, 'symlink'):
+            self.skipTest('symlinks not supported')
+        os.symlink(
+            os.path.join(self.workbench, 'missing'),
+            os.path.join(self.workbench, 'link')
+            )
+        snapshot = self.module.snapshot(self.entry('link'))
+        self.assertFalse(snapshot.is_dir)
+        self.assertIsNone(snapshot.size)
+        self.assertIsNone(snapshot.mtime)
+
+    def test_count_subdirs(self):
+        cache = browsepy.cache.LRUCache()
+        self.touch('a', 'file')
+        self.touch('b', 'file')
+        count, names = self.module.count_subdirs(self.workbench, cache=cache)
+        self.assertEqual(count, 2)
+        self.assertEqual(names, set(('a', 'b')))
+
+        count, names = self.module.count_subdirs(self.workbench, cache=cache)
+        self.assertEqual(count, 2)
+        self.assertIsNone(names)  # cached
+
+        stats = os.stat(self.workbench)
+        os.mkdir(os.path.join(self.workbench, 'c'))
+        os.utime(self.workbench, (stats.st_atime, stats.st_mtime + 10))
+        count, names = self.module.count_subdirs(self.workbench, cache=cache)
+        self.assertEqual(count, 3)
+        self.assertEqual(len(cache), 2)
+
+        missing = os.path.join(self.workbench, 'missing')
+        self.assertEqual(self.module.count_subdirs(missing), (0, set()))
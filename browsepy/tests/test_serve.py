@@ -0,0 +1,141 @@
+
+import os
+import os.path
+import unittest
+import tempfile
+import shutil
+
+import flask
+
+import browsepy.serve
+
+
+class TestParseRanges(unittest.TestCase):
+    module = browsepy.serve
+
+    def test_parse(self):
+        parse = self.module.parse_ranges
+        self.assertEqual(parse('bytes=0-9', 100), [(0, 10)])
+        self.assertEqual(parse('bytes=90-', 100), [(90, 100)])
+        self.assertEqual(parse('bytes=-10', 100), [(90, 100)])
+        self.assertEqual(parse('bytes=-1000', 100), [(0, 100)])
+        self.assertEqual(parse('bytes=95-200', 100), [(95, 100)])
+        self.assertEqual(
+            parse('bytes=50-59, 0-9,5-14,15-19', 100),
+            [(0, 20), (50, 60)]
+            )
+        self.assertEqual(parse('bytes=100-', 100), [])
+        self.assertEqual(parse('bytes=-0', 100), [])
+
+    def test_ignored(self):
+        parse = self.module.parse_ranges
+        for value in (None, '', 'bytes', 'lines=0-1', 'bytes=5-1',
+                      'bytes=a-1', 'bytes=1', 'bytes=-', 'bytes=,'):
+            self.assertIsNone(parse(value, 100), value)
+        self.assertIsNone(parse('bytes=' + ','.join(['0-1'] * 3), 100, 2))
+
+
+class TestFileRangeStream(unittest.TestCase):
+    module = browsepy.serve
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+        self.path = os.path.join(self.workbench, 'file')
+        self.data = os.urandom(10000)
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def test_single(self):
+        stream = self.module.FileRangeStream(
+            self.path, [(10, 20)], len(self.data), 'text/plain', 4)
+        self.assertEqual(b''.join(stream), self.data[10:20])
+        self.assertEqual(stream.length, 10)
+        self.assertEqual(stream.mimetype, 'text/plain')
+        self.assertEqual(stream.content_range, 'bytes 10-19/10000')
+
+    def test_multiple(self):
+        stream = self.module.FileRangeStream(
+            self.path, [(0, 5), (9000, 10000)], len(self.data), 'text/plain')
+        data = b''.join(stream)
+        self.assertEqual(len(data), stream.length)
+        self.assertIsNone(stream.content_range)
+        self.assertTrue(stream.mimetype.startswith('multipart/byteranges'))
+        boundary = stream.boundary.encode('ascii')
+        parts = data.split(b'--' + boundary)
+        self.assertEqual(len(parts), 4)
+        self.assertEqual(parts[3], b'--\r\n')
+        headers, body = parts[2].split(b'\r\n\r\n', 1)
+        self.assertIn(b'Content-Range: bytes 9000-9999/10000', headers)
+        self.assertEqual(body, self.data[9000:] + b'\r\n')
+
+
+class TestServeFile(unittest.TestCase):
+    module = browsepy.serve
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+        self.path = os.path.join(self.workbench, 'file.txt')
+        self.data = os.urandom(10000)
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+        self.app = flask.Flask(__name__)
+        self.app.add_url_rule('/file', 'file', self.view)
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def view(self):
+        return self.module.serve_file(
+            self.app, flask.request, self.path, as_attachment=True)
+
+    def get(self, **headers):
+        with self.app.test_client() as client:
+            return client.get('/file', headers=headers)
+
+    def test_serve(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.data)
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        self.assertEqual(response.mimetype, 'text/plain')
+        self.assertIn('attachment', response.headers['Content-Disposition'])
+        etag = response.headers['ETag']
+        last_modified = response.headers['Last-Modified']
+        self.assertEqual(
+            etag, '"%s"' % self.module.file_etag(os.stat(self.path)))
+
+        response = self.get(**{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        response = self.get(**{'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.get(**{'If-None-Match': '"other"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_range(self):
+        response = self.get(Range='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, self.data[100:200])
+        self.assertEqual(
+            response.headers['Content-Range'], 'bytes 100-199/10000')
+
+        response = self.get(Range='bytes=0-0,-1')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.mimetype, 'multipart/byteranges')
+        self.assertEqual(response.content_length, len(response.data))
+
+        response = self.get(Range='bytes=10000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.headers['Content-Range'], 'bytes */10000')
+
+        etag = self.get().headers['ETag']
+        response = self.get(Range='bytes=0-9', **{'If-Range': etag})
+        self.assertEqual(response.status_code, 206)
+        response = self.get(Range='bytes=0-9', **{'If-Range': '"other"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, self.data)
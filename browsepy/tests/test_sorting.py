@@ -0,0 +1,110 @@
+import os
+import os.path
+import unittest
+import tempfile
+import shutil
+
+import browsepy
+import browsepy.file
+import browsepy.scan
+import browsepy.sorting
+
+
+class TestSorting(unittest.TestCase):
+    module = browsepy.sorting
+
+    def setUp(self):
+        self.app = browsepy.app
+        self.manager = self.app.extensions['plugin_manager']
+        self.workbench = tempfile.mkdtemp()
+        self.rules = [rule.name for rule in self.manager.get_log_rules()]
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def snapshot(self, name, is_dir=False, size=0, mtime=0, subdirs=0,
+                 logs=()):
+        return browsepy.scan.EntrySnapshot(
+            self.workbench, name, is_dir, size, mtime, subdirs,
+            frozenset(logs))
+
+    def test_parse_property(self):
+        self.assertEqual(self.module.parse_property('size'), ('size', False))
+        self.assertEqual(self.module.parse_property('-size'), ('size', True))
+
+    def test_logs_mask(self):
+        names = ['a', 'b', 'c']
+        self.assertEqual(self.module.logs_mask(frozenset(), names), 0)
+        self.assertEqual(self.module.logs_mask(frozenset('a'), names), 4)
+        self.assertEqual(self.module.logs_mask(frozenset('bc'), names), 3)
+
+    def test_snapshot_keyfunc(self):
+        fnc = self.module.snapshot_keyfunc
+        a = self.snapshot('B', size=1, mtime=5, subdirs=3,
+                          logs=self.rules[:1])
+        b = self.snapshot('a', size=None, mtime=None, subdirs=1,
+                          logs=self.rules[1:])
+        self.assertLess(fnc('text')(b), fnc('text')(a))
+        self.assertLess(fnc('size')(b), fnc('size')(a))
+        self.assertLess(fnc('modified')(b), fnc('modified')(a))
+        self.assertLess(fnc('subdirs')(b), fnc('subdirs')(a))
+        self.assertIsNone(fnc('logcheck'))
+        self.assertIsNone(fnc('unknown', self.manager))
+
+        key = fnc('logcheck', self.manager)
+        self.assertLess(key(b), key(a))
+
+        self.assertEqual(
+            fnc('type', self.manager)(self.snapshot('a', is_dir=True)),
+            'inode/directory'
+            )
+
+    def test_snapshot_keyfunc_type(self):
+        calls = []
+
+        class ManagerMock(object):
+            def get_mimetype(self, path):
+                calls.append([path])
+                return 'text/plain'
+
+            def get_mimetypes(self, paths):
+                calls.append(list(paths))
+                return ['%s; charset=binary' % (
+                    'image/png' if path.endswith('.png') else 'text/plain')
+                    for path in paths]
+
+        snapshots = [
+            self.snapshot('b.txt'),
+            self.snapshot('a.png'),
+            self.snapshot('dir', is_dir=True),
+            ]
+        key = self.module.snapshot_keyfunc('type', ManagerMock(), snapshots)
+        self.assertEqual(
+            [x.name for x in sorted(snapshots, key=key)],
+            ['a.png', 'dir', 'b.txt']
+            )
+        self.assertEqual(calls, [[snapshots[0].path, snapshots[1].path]])
+        self.assertEqual(key(self.snapshot('c')), 'text/plain')
+        self.assertEqual(len(calls), 2)  # unknown snapshot
+
+    def test_browse_sortkey_reverse(self):
+        for name in ('a', 'b', 'c'):
+            os.mkdir(os.path.join(self.workbench, name))
+            for n in range(ord(name) - ord('a')):
+                os.mkdir(os.path.join(self.workbench, name, str(n)))
+        directory = browsepy.file.Directory(self.workbench, app=self.app)
+
+        key, reverse = browsepy.browse_snapshot_sortkey_reverse(
+            '-subdirs', directory)
+        self.assertTrue(reverse)
+        self.assertEqual(
+            [x.name for x in directory.snapshots(key, reverse)],
+            ['c', 'b', 'a']
+            )
+
+        key, reverse = browsepy.browse_sortkey_reverse('subdirs')
+        self.assertFalse(reverse)
+        self.assertEqual(
+            [x.name for x in directory.listdir(key, reverse)],
+            ['a', 'b', 'c']
+            )
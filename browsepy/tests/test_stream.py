@@ -0,0 +1,268 @@
+import io
+import os
+import os.path
+import unittest
+import tempfile
+import tarfile
+import zipfile
+import shutil
+
+import browsepy.stream
+
+from browsepy.compat import PY_LEGACY
+
+
+class TestWalkFilter(unittest.TestCase):
+    module = browsepy.stream
+
+    def test_filter(self):
+        walk_filter = self.module.WalkFilter(
+            include=('httplog_*', 'data/*.csv'),
+            since=100,
+            until=200,
+            max_depth=2
+            )
+        self.assertTrue(walk_filter)
+        self.assertFalse(self.module.WalkFilter())
+        self.assertTrue(walk_filter.match_file('a/httplog_1', 100, 2))
+        self.assertTrue(walk_filter.match_file('data/x.csv', 150, 2))
+        self.assertFalse(walk_filter.match_file('other/x.csv', 150, 2))
+        self.assertFalse(walk_filter.match_file('a/httplog_1', 200, 2))
+        self.assertFalse(walk_filter.match_file('a/httplog_1', 99, 2))
+        self.assertFalse(walk_filter.match_file('a/b/httplog_1', 150, 3))
+        self.assertTrue(walk_filter.match_directory(2))
+        self.assertFalse(walk_filter.match_directory(3))
+        self.assertTrue(walk_filter.descend(1))
+        self.assertFalse(walk_filter.descend(2))
+
+    def test_match_member(self):
+        walk_filter = self.module.WalkFilter(include=('*.log',), max_depth=1)
+        member = tarfile.TarInfo('a.log')
+        self.assertTrue(walk_filter.match_member(member))
+        member.name = 'dir/a.log'
+        self.assertFalse(walk_filter.match_member(member))
+        member.type = tarfile.DIRTYPE
+        member.name = 'dir'
+        self.assertTrue(walk_filter.match_member(member))
+        member.name = ''
+        self.assertTrue(walk_filter.match_member(member))
+        member.type = tarfile.REGTYPE
+        member.name = 'root/a.log'
+        self.assertTrue(walk_filter.match_member(member, 'root'))
+        self.assertFalse(walk_filter.match_member(member))
+
+
+class TestTarFileStream(unittest.TestCase):
+    module = browsepy.stream
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+        for name in ('a.bin', 'b.bin', 'c.exc'):
+            with open(os.path.join(self.workbench, name), 'wb') as f:
+                f.write(os.urandom(64 * 1024))
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def members(self, data):
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            return sorted(member.name for member in tar if member.name)
+
+    def test_iter(self):
+        stream = self.module.TarFileStream(
+            self.workbench,
+            buffsize=1024,
+            exclude=lambda path: path.endswith('.exc')
+            )
+        chunks = list(stream)
+        self.assertTrue(all(isinstance(chunk, bytes) for chunk in chunks))
+        self.assertEqual(self.members(b''.join(chunks)), ['a.bin', 'b.bin'])
+        self.assertEqual(stream.read(), b'')
+
+    def test_read(self):
+        stream = self.module.TarFileStream(self.workbench, buffsize=1024)
+        chunks = []
+        data = stream.read(100)
+        while data:
+            self.assertLessEqual(len(data), 100)
+            chunks.append(data)
+            data = stream.read(100)
+        self.assertEqual(
+            self.members(b''.join(chunks)),
+            ['a.bin', 'b.bin', 'c.exc']
+            )
+
+    def test_close(self):
+        stream = self.module.TarFileStream(self.workbench, buffsize=512)
+        self.assertTrue(stream.read(10))
+        stream.close()
+        stream._th.join(5)
+        self.assertFalse(stream._th.is_alive())
+        self.assertEqual(stream.read(), b'')
+
+    def test_error(self):
+        stream = self.module.TarFileStream(
+            os.path.join(self.workbench, 'missing'))
+        self.assertRaises(OSError, stream.read)
+
+    def test_workers(self):
+        stream = self.module.TarFileStream(
+            self.workbench, buffsize=1024, workers=2)
+        data = b''.join(stream)
+        self.assertEqual(self.members(data), ['a.bin', 'b.bin', 'c.exc'])
+
+    def test_walk_filter(self):
+        os.mkdir(os.path.join(self.workbench, 'dir'))
+        open(os.path.join(self.workbench, 'dir', 'd.bin'), 'w').close()
+        walk_filter = self.module.WalkFilter(include=('*.bin',), max_depth=1)
+        stream_classes = (
+            self.module.TarFileStream,
+            self.module.SegmentTarStream,
+            )
+        for stream_class in stream_classes:
+            stream = stream_class(self.workbench, walk_filter=walk_filter)
+            self.assertEqual(
+                self.members(b''.join(stream)), ['a.bin', 'b.bin', 'dir'])
+
+    def test_sources(self):
+        other = os.path.join(self.workbench, 'other')
+        os.mkdir(other)
+        for name in ('d.bin', 'e.exc'):
+            open(os.path.join(other, name), 'w').close()
+        sources = (
+            (self.workbench, 'first'),
+            (other, 'second/other'),
+            )
+        walk_filter = self.module.WalkFilter(max_depth=1)
+        stream_classes = (
+            self.module.TarFileStream,
+            self.module.SegmentTarStream,
+            )
+        for stream_class in stream_classes:
+            stream = stream_class(
+                self.workbench,
+                exclude=lambda path: path.endswith('.exc'),
+                walk_filter=walk_filter,
+                sources=sources,
+                )
+            self.assertEqual(
+                self.members(b''.join(stream)),
+                ['first', 'first/a.bin', 'first/b.bin', 'first/other',
+                 'second/other', 'second/other/d.bin']
+                )
+        if not PY_LEGACY:
+            stream = self.module.ZipFileStream(
+                self.workbench,
+                exclude=lambda path: path.endswith('.exc'),
+                sources=sources,
+                )
+            with zipfile.ZipFile(io.BytesIO(b''.join(stream))) as archive:
+                self.assertEqual(
+                    sorted(info.filename for info in archive.infolist()),
+                    ['first/', 'first/a.bin', 'first/b.bin', 'first/other/',
+                     'first/other/d.bin', 'second/other/',
+                     'second/other/d.bin']
+                    )
+
+    def test_compressions(self):
+        for compression in (None, 'xz', 'bz2'):
+            stream = self.module.TarFileStream(
+                self.workbench, compression=compression, level=1)
+            self.assertEqual(
+                stream.name,
+                '%s.%s' % (
+                    os.path.basename(self.workbench),
+                    stream.extensions[compression]
+                    )
+                )
+            with tarfile.open(fileobj=io.BytesIO(b''.join(stream))) as tar:
+                self.assertEqual(
+                    sorted(member.name for member in tar if member.name),
+                    ['a.bin', 'b.bin', 'c.exc']
+                    )
+
+    @unittest.skipIf(PY_LEGACY, 'python 2 zipfile requires seekable files')
+    def test_zip(self):
+        os.mkdir(os.path.join(self.workbench, 'dir'))
+        with open(os.path.join(self.workbench, 'dir', 'd.gz'), 'wb') as f:
+            f.write(b'\x1f\x8b' + b'0' * 1000)
+        stream = self.module.ZipFileStream(
+            self.workbench,
+            exclude=lambda path: path.endswith('.exc')
+            )
+        data = b''.join(stream)
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertEqual(
+                sorted(info.filename for info in archive.infolist()),
+                ['a.bin', 'b.bin', 'dir/', 'dir/d.gz']
+                )
+            self.assertEqual(
+                archive.getinfo('dir/d.gz').compress_type,
+                zipfile.ZIP_STORED
+                )
+            self.assertEqual(
+                archive.getinfo('a.bin').compress_type,
+                zipfile.ZIP_DEFLATED
+                )
+            self.assertEqual(archive.read('dir/d.gz')[-4:], b'0000')
+
+    def test_archive_formats(self):
+        formats = self.module.archive_formats
+        self.assertEqual(list(formats)[:2], ['tgz', 'tar'])
+        self.assertIs(
+            formats['tar'].stream_class, self.module.SegmentTarStream)
+        self.assertEqual(formats['tgz'].options['compression'], 'gz')
+
+
+class TestSegmentTarStream(unittest.TestCase):
+    module = browsepy.stream
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+        self.data = os.urandom(64 * 1024 + 1)
+        os.mkdir(os.path.join(self.workbench, 'dir'))
+        for name in ('a.bin', 'c.exc', os.path.join('dir', 'b.bin')):
+            with open(os.path.join(self.workbench, name), 'wb') as f:
+                f.write(self.data)
+        self.stream = self.module.SegmentTarStream(
+            self.workbench,
+            buffsize=4096,
+            exclude=lambda path: path.endswith('.exc')
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def check(self, data):
+        self.assertEqual(len(data), self.stream.length)
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            self.assertEqual(
+                [member.name for member in tar],
+                ['', 'a.bin', 'dir', 'dir/b.bin']
+                )
+            self.assertEqual(tar.extractfile('dir/b.bin').read(), self.data)
+
+    def test_iter(self):
+        self.check(b''.join(self.stream))
+
+    def test_changed(self):
+        with open(os.path.join(self.workbench, 'a.bin'), 'ab') as f:
+            f.write(b'grown')
+        os.remove(os.path.join(self.workbench, 'dir', 'b.bin'))
+        data = b''.join(self.stream)
+        self.assertEqual(len(data), self.stream.length)
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            self.assertEqual(tar.extractfile('a.bin').read(), self.data)
+            self.assertEqual(
+                tar.extractfile('dir/b.bin').read(),
+                b'\0' * len(self.data)
+                )
+
+    def test_wsgi_iterable(self):
+        self.assertIs(self.stream.wsgi_iterable({}), self.stream)
+        self.assertIs(
+            self.stream.wsgi_iterable({
+                'wsgi.file_wrapper': lambda f, size: (f, size),
+                }),
+            self.stream
+            )
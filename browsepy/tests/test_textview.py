@@ -0,0 +1,134 @@
+
+import io
+import os
+import os.path
+import gzip
+import unittest
+import tempfile
+import shutil
+
+import browsepy.textview
+import browsepy.compress
+
+
+class TestTail(unittest.TestCase):
+    module = browsepy.textview
+
+    def test_last_lines(self):
+        last_lines = self.module.last_lines
+        self.assertEqual(last_lines(b'a\nb\nc\n', 2), b'b\nc\n')
+        self.assertEqual(last_lines(b'a\nb\nc', 2), b'b\nc')
+        self.assertEqual(last_lines(b'a\nb\n', 5), b'a\nb\n')
+        self.assertEqual(last_lines(b'', 5), b'')
+
+    def test_tail_lines(self):
+        data = b''.join(b'line %d\n' % i for i in range(1000))
+        for buffsize in (1, 7, 4096):
+            self.assertEqual(
+                self.module.tail_lines(io.BytesIO(data), 2, buffsize),
+                b'line 998\nline 999\n'
+                )
+            self.assertEqual(
+                self.module.tail_lines_stream(
+                    [data[i:i + buffsize]
+                     for i in range(0, len(data), buffsize)],
+                    2
+                    ),
+                b'line 998\nline 999\n'
+                )
+        self.assertEqual(
+            self.module.tail_lines(io.BytesIO(data), 2, 16, max_bytes=5),
+            b' 999\n'
+            )
+        self.assertEqual(
+            self.module.tail_lines_stream([data], 100, max_bytes=5),
+            b' 999\n'
+            )
+
+    def test_iter_window(self):
+        chunks = [b'abc', b'def', b'ghi']
+        window = self.module.iter_window
+        self.assertEqual(b''.join(window(chunks, 2, 5)), b'cdefg')
+        self.assertEqual(b''.join(window(chunks, 0, None)), b'abcdefghi')
+        self.assertEqual(b''.join(window(chunks, 20, 5)), b'')
+        self.assertEqual(b''.join(window(chunks, -4, None)), b'fghi')
+        self.assertEqual(b''.join(window(chunks, -4, 2)), b'fg')
+        self.assertEqual(b''.join(window(chunks, -20, 2)), b'ab')
+
+
+class TestFiles(unittest.TestCase):
+    module = browsepy.textview
+
+    def setUp(self):
+        self.workbench = tempfile.mkdtemp()
+        self.data = b''.join(b'line %d\n' % i for i in range(10000))
+        self.plain = os.path.join(self.workbench, 'file.log')
+        self.compressed = os.path.join(self.workbench, 'file.log.gz')
+        with open(self.plain, 'wb') as f:
+            f.write(self.data)
+        with gzip.open(self.compressed, 'wb') as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.workbench)
+
+    def test_get_compression(self):
+        self.assertIsNone(self.module.get_compression(self.plain))
+        self.assertEqual(self.module.get_compression(self.compressed), 'gz')
+        self.assertEqual(self.module.get_compression('a.LOG.GZ'), 'gz')
+
+    def test_iter_file(self):
+        for path in (self.plain, self.compressed):
+            self.assertEqual(
+                b''.join(self.module.iter_file(path, buffsize=100)),
+                self.data
+                )
+            self.assertEqual(
+                b''.join(self.module.iter_file(path, 7, 7, buffsize=3)),
+                b'line 1\n'
+                )
+            self.assertEqual(
+                b''.join(self.module.iter_file(path, -10, buffsize=3)),
+                b'line 9999\n'
+                )
+        self.assertRaises(
+            IOError,
+            self.module.iter_file,  # not on iteration
+            self.plain + '.missing'
+            )
+
+    def test_iter_file_errors(self):
+        bogus = os.path.join(self.workbench, 'bogus.log.gz')
+        with open(bogus, 'wb') as f:
+            f.write(self.data)  # not actually compressed
+        self.assertRaises(
+            browsepy.compress.decompress_errors,
+            self.module.iter_file,  # not on iteration
+            bogus
+            )
+        self.assertRaises(
+            browsepy.compress.decompress_errors,
+            self.module.read_tail,
+            bogus, 2
+            )
+
+        truncated = os.path.join(self.workbench, 'truncated.log.gz')
+        with open(self.compressed, 'rb') as f:
+            data = f.read()
+        with open(truncated, 'wb') as f:
+            f.write(data + b'garbage' * 100)  # corrupt after first block
+        chunks = self.module.iter_file(truncated, buffsize=len(data))
+        self.assertEqual(b''.join(chunks), self.data)
+
+        chunks = self.module.iter_file(self.plain, buffsize=100)
+        f = chunks.gi_frame.f_locals['f']
+        self.assertFalse(f.closed)
+        chunks.close()  # never iterated
+        self.assertTrue(f.closed)
+
+    def test_read_tail(self):
+        for path in (self.plain, self.compressed):
+            self.assertEqual(
+                self.module.read_tail(path, 2, 100),
+                b'line 9998\nline 9999\n'
+                )
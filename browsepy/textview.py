@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import logging
+import collections
+
+from . import compress
+
+logger = logging.getLogger(__name__)
+
+# file extension: compression name, see :func:`get_compression`
+compressed_extensions = {
+    'gz': 'gz',
+    'bz2': 'bz2',
+    'xz': 'xz',
+    }
+
+
+def get_compression(path):
+    '''
+    Get compression name of given file, based on its extension, if
+    available.
+
+    :param path: file path
+    :type path: str
+    :returns: compression name or None
+    :rtype: str or None
+    '''
+    name = compressed_extensions.get(path.rpartition('.')[2].lower())
+    return name if name in compress.decompressors else None
+
+
+def last_lines(data, lines):
+    '''
+    Get last lines of given data, ignoring its trailing newline.
+
+    :param data: text data
+    :type data: bytes
+    :param lines: number of lines
+    :type lines: int
+    :returns: data from the start of the first of those lines
+    :rtype: bytes
+    '''
+    start = len(data) - 1 if data.endswith(b'\n') else len(data)
+    for i in range(lines):
+        start = data.rfind(b'\n', 0, start)
+        if start < 0:
+            return data
+    return data[start + 1:]
+
+
+def tail_lines(fileobj, lines, buffsize=65536, max_bytes=None):
+    '''
+    Get last lines of given seekable file object, reading blocks backwards
+    from its end until enough lines (or `max_bytes`) are found.
+
+    :param fileobj: seekable file object
+    :type fileobj: file
+    :param lines: number of lines
+    :type lines: int
+    :param buffsize: read block size on bytes, defaults to 64KiB
+    :type buffsize: int
+    :param max_bytes: maximum size of result, defaults to None (unlimited)
+    :type max_bytes: int or None
+    :returns: data from the start of the first of those lines
+    :rtype: bytes
+    '''
+    fileobj.seek(0, os.SEEK_END)
+    position = fileobj.tell()
+    blocks = []
+    size = newlines = 0
+    while position and newlines <= lines and (
+            max_bytes is None or size < max_bytes):
+        step = min(buffsize, position)
+        position -= step
+        fileobj.seek(position)
+        block = fileobj.read(step)
+        blocks.append(block)
+        size += len(block)
+        newlines += block.count(b'\n')
+    data = last_lines(b''.join(reversed(blocks)), lines)
+    return data[-max_bytes:] if max_bytes else data
+
+
+def tail_lines_stream(chunks, lines, max_bytes=None):
+    '''
+    Get last lines of given data chunks, keeping only those lines in
+    memory (or `max_bytes` of a longer one) while iterating.
+
+    :param chunks: data chunks
+    :type chunks: iterable of bytes
+    :param lines: number of lines
+    :type lines: int
+    :param max_bytes: maximum size of result, defaults to None (unlimited)
+    :type max_bytes: int or None
+    :returns: data from the start of the first of those lines
+    :rtype: bytes
+    '''
+    tail = collections.deque()
+    size = 0
+    pending = b''
+    for chunk in chunks:
+        parts = (pending + chunk).split(b'\n')
+        pending = parts.pop()
+        if max_bytes and len(pending) > max_bytes:
+            pending = pending[-max_bytes:]
+        for part in parts:
+            tail.append(part)
+            size += len(part) + 1
+        while tail and (
+                len(tail) > lines + 1 or
+                max_bytes and size - len(tail[0]) - 1 >= max_bytes):
+            size -= len(tail.popleft()) + 1
+    tail.append(pending)
+    data = last_lines(b'\n'.join(tail), lines)
+    return data[-max_bytes:] if max_bytes else data
+
+
+def iter_window(chunks, offset, length):
+    '''
+    Iterate through the given byte window of given data chunks.
+
+    :param chunks: data chunks
+    :type chunks: iterable of bytes
+    :param offset: window start, negative meaning from data end
+    :type offset: int
+    :param length: window size, None meaning until data end
+    :type length: int or None
+    :yields: data chunks
+    :ytype: bytes
+    '''
+    if offset < 0:
+        window = collections.deque()
+        size = 0
+        for chunk in chunks:
+            window.append(chunk)
+            size += len(chunk)
+            while size - len(window[0]) >= -offset:
+                size -= len(window.popleft())
+        data = b''.join(window)[offset:]
+        yield data[:length] if length is not None else data
+        return
+    for chunk in chunks:
+        if offset >= len(chunk):
+            offset -= len(chunk)
+            continue
+        chunk = chunk[offset:] if offset else chunk
+        offset = 0
+        if length is not None:
+            chunk = chunk[:length]
+            length -= len(chunk)
+        yield chunk
+        if length == 0:
+            break
+
+
+def iter_file(path, offset=0, length=None, buffsize=65536):
+    '''
+    Get iterator through decompressed content of given file (see
+    :func:`get_compression`), optionally limited to a byte window.
+
+    Plain files are read from the window start on, seeking there
+    directly, while compressed ones are decompressed incrementally, only
+    the window being kept.
+
+    File is opened, and its first block read (and decompressed), right
+    away, so errors are raised by this function instead of on iteration,
+    while later ones just end iteration, being logged. File is closed once
+    iteration ends or iterator gets closed (as WSGI servers do with
+    response bodies, even if never iterated).
+
+    :param path: file path
+    :type path: str
+    :param offset: window start, negative meaning from content end
+    :type offset: int
+    :param length: window size, None meaning until content end
+    :type length: int or None
+    :param buffsize: read block size on bytes, defaults to 64KiB
+    :type buffsize: int
+    :returns: iterator of data chunks
+    :rtype: generator of bytes
+    :raises Exception: if file cannot be opened or read, see
+                       :data:`browsepy.compress.decompress_errors`
+    '''
+    f = open(path, 'rb')
+    chunks = _iter_file(f, get_compression(path), offset, length, buffsize)
+    next(chunks)  # read first block
+    return chunks
+
+
+def _iter_file(f, compression, offset, length, buffsize):
+    with f:
+        chunks = _read_file(f, compression, offset, length, buffsize)
+        chunk = next(chunks, None)
+        yield  # first block is read, see :func:`iter_file`
+        while chunk is not None:
+            yield chunk
+            try:
+                chunk = next(chunks, None)
+            except compress.decompress_errors as e:
+                logger.warning('Cannot read %s: %s', f.name, e)
+                break
+
+
+def _read_file(f, compression, offset, length, buffsize):
+    if compression:
+        chunks = compress.iter_decompress(f, compression, buffsize)
+        for chunk in iter_window(chunks, offset, length):
+            yield chunk
+        return
+    if offset < 0:
+        offset = max(os.fstat(f.fileno()).st_size + offset, 0)
+    f.seek(offset)
+    while length is None or length > 0:
+        data = f.read(buffsize if length is None else min(buffsize, length))
+        if not data:
+            break
+        if length is not None:
+            length -= len(data)
+        yield data
+
+
+def read_tail(path, lines, buffsize=65536, max_bytes=None):
+    '''
+    Get last lines of given file's decompressed content (see
+    :func:`get_compression`), reading plain files backwards from their
+    end, see :func:`tail_lines` and :func:`tail_lines_stream`.
+
+    :param path: file path
+    :type path: str
+    :param lines: number of lines
+    :type lines: int
+    :param buffsize: read block size on bytes, defaults to 64KiB
+    :type buffsize: int
+    :param max_bytes: maximum size of result, defaults to None (unlimited)
+    :type max_bytes: int or None
+    :returns: data from the start of the first of those lines
+    :rtype: bytes
+    :raises Exception: if file cannot be opened or read, see
+                       :data:`browsepy.compress.decompress_errors`
+    '''
+    compression = get_compression(path)
+    with open(path, 'rb') as f:
+        if compression:
+            chunks = compress.iter_decompress(f, compression, buffsize)
+            return tail_lines_stream(chunks, lines, max_bytes)
+        return tail_lines(f, lines, buffsize, max_bytes)